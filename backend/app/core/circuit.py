@@ -0,0 +1,172 @@
+"""
+Phyto — per-upstream circuit breakers.
+
+When Bhuvan, Bhoonidhi, Agmarknet, the weather API or Gemini is down,
+every request would otherwise wait out the full client timeout before
+falling back. Each
+upstream gets a breaker that watches the outcome of its last CIRCUIT_WINDOW
+calls:
+
+- closed:    calls go through; once the failure rate over the window
+             reaches CIRCUIT_FAILURE_RATE (with at least CIRCUIT_MIN_CALLS
+             calls) the breaker opens.
+- open:      `allow()` is False, so callers serve their fallback (edge
+             bundle, corpus, seasonal estimate) immediately.
+- half-open: after CIRCUIT_OPEN_SECONDS, up to CIRCUIT_HALF_OPEN_PROBES
+             probe calls go through. A success closes the breaker with a
+             fresh window; a failure re-opens it for another period.
+
+Usage at a call site:
+
+    breaker = get_breaker("bhuvan")
+    if not breaker.allow():
+        return fallback
+    try:
+        ...call...
+        breaker.success()
+    except Exception:
+        breaker.failure()
+
+Breakers are per process, like the metrics registry; state and recent
+transitions are served on /health/upstreams.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from app.core.config import (
+    CIRCUIT_WINDOW, CIRCUIT_MIN_CALLS, CIRCUIT_FAILURE_RATE, CIRCUIT_OPEN_SECONDS, CIRCUIT_HALF_OPEN_PROBES,
+)
+from app.core.metrics import record_circuit
+
+logger = logging.getLogger("phyto.circuit")
+
+UPSTREAMS = ("bhuvan", "bhoonidhi", "agmarknet", "weather", "gemini")
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_LEVELS = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    def __init__(
+        self, name: str, window: int = CIRCUIT_WINDOW, min_calls: int = CIRCUIT_MIN_CALLS,
+        failure_rate: float = CIRCUIT_FAILURE_RATE, open_seconds: float = CIRCUIT_OPEN_SECONDS,
+        half_open_probes: int = CIRCUIT_HALF_OPEN_PROBES,
+    ):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._outcomes: deque[bool] = deque(maxlen=window)   # True = failure
+        self._opened_at = 0.0
+        self._probes: deque[float] = deque()                  # start times of in-flight probes
+        self._transitions: deque[dict] = deque(maxlen=20)
+        self._short_circuited = 0
+        record_circuit(name, CLOSED, 0)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow(self) -> bool:
+        """True if the caller may make the upstream call now."""
+        with self._lock:
+            now = time.monotonic()
+            if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+                self._transition(HALF_OPEN, "open period elapsed")
+            if self._state == HALF_OPEN:
+                # A probe whose caller never reported back (cancelled) frees its slot after a period
+                while self._probes and now - self._probes[0] >= self.open_seconds:
+                    self._probes.popleft()
+                if len(self._probes) < self.half_open_probes:
+                    self._probes.append(now)
+                    return True
+            elif self._state == CLOSED:
+                return True
+            self._short_circuited += 1
+            return False
+
+    def success(self):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._outcomes.clear()
+                self._probes.clear()
+                self._transition(CLOSED, "probe succeeded")
+            else:
+                self._outcomes.append(False)
+
+    def failure(self):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes.clear()
+                self._open("probe failed")
+                return
+            self._outcomes.append(True)
+            failures = sum(self._outcomes)
+            if (
+                self._state == CLOSED
+                and len(self._outcomes) >= self.min_calls
+                and failures >= self.failure_rate * len(self._outcomes)
+            ):
+                self._open(f"{failures}/{len(self._outcomes)} recent calls failed")
+
+    def _open(self, reason: str):
+        self._opened_at = time.monotonic()
+        self._transition(OPEN, reason)
+
+    def _transition(self, state: str, reason: str):
+        self._transitions.append({
+            "from": self._state,
+            "to": state,
+            "reason": reason,
+            "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        })
+        self._state = state
+        record_circuit(self.name, state, _LEVELS[state])
+        logger.warning("%s: %s -> %s (%s)", self.name, self._transitions[-1]["from"], state, reason,
+                       extra={"upstream": self.name, "state": state})
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            failures = sum(self._outcomes)
+            retry_in = max(self.open_seconds - (time.monotonic() - self._opened_at), 0.0) if self._state == OPEN else None
+            return {
+                "state": self._state,
+                "recent_calls": len(self._outcomes),
+                "recent_failures": failures,
+                "failure_rate": round(failures / len(self._outcomes), 3) if self._outcomes else 0.0,
+                "retry_in_seconds": round(retry_in, 1) if retry_in is not None else None,
+                "short_circuited": self._short_circuited,
+                "transitions": list(self._transitions),
+            }
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(upstream: str) -> CircuitBreaker:
+    """The process-wide breaker for an upstream, created on first use."""
+    breaker = _breakers.get(upstream)
+    if breaker is None:
+        with _registry_lock:
+            breaker = _breakers.get(upstream)
+            if breaker is None:
+                breaker = _breakers[upstream] = CircuitBreaker(upstream)
+    return breaker
+
+
+def snapshot() -> dict:
+    """State of every upstream's breaker, for /health/upstreams."""
+    for name in UPSTREAMS:
+        get_breaker(name)
+    with _registry_lock:
+        breakers = dict(_breakers)
+    return {name: breaker.snapshot() for name, breaker in sorted(breakers.items())}
@@ -3,13 +3,29 @@ Phyto — centralised configuration.
 All Supabase keys, model paths, and CORS origins live here.
 """
 
+import json
+import logging
 import os
 from pathlib import Path
 from dotenv import load_dotenv
 
+from app.core import log
+
 BASE_DIR = Path(__file__).resolve().parent.parent.parent   # backend/
 load_dotenv(BASE_DIR / ".env")
 
+# ── Logging ────────────────────────────────────────────
+# JSON lines on stderr, written by a background thread (see app/core/log.py).
+# DEBUG records are kept for LOG_DEBUG_SAMPLE_RATE of requests, at most
+# LOG_DEBUG_MAX_PER_SECOND; LOG_FORMAT=text is easier to read in a terminal.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.01"))
+LOG_DEBUG_MAX_PER_SECOND = float(os.getenv("LOG_DEBUG_MAX_PER_SECOND", "50"))
+log.configure(LOG_LEVEL, LOG_FORMAT, LOG_QUEUE_SIZE, LOG_DEBUG_SAMPLE_RATE, LOG_DEBUG_MAX_PER_SECOND)
+logger = logging.getLogger("phyto.config")
+
 MODEL_DIR = BASE_DIR / "models"
 DATA_DIR = BASE_DIR / "data"
 
@@ -22,10 +38,22 @@ MODEL_PATH_CHILI = MODEL_DIR / "chili" / "vggnet.pth"
 REMEDIES_PATH = DATA_DIR / "remedies.json"
 HSV_VALUES_PATH = DATA_DIR / "hsv_new_value.csv"
 JUGAAD_REMEDIES_PATH = DATA_DIR / "jugaad_remedies.json"
+ADVISORY_CORPUS_PATH = DATA_DIR / "advisory_corpus.json"
 
 # ── Gemini LLM ─────────────────────────────────────────
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
-print(f"[config] Loaded Gemini API key: {'YES' if GEMINI_API_KEY else 'NO'}")
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "")   # override for local stand-ins (load tests)
+logger.info("Loaded Gemini API key: %s", "YES" if GEMINI_API_KEY else "NO")
+
+# Pregenerated advisories (scripts/pregenerate_advisories.py) are served for
+# known labels at or above this confidence; anything else goes to Gemini live.
+ADVISORY_SEVERITY_BANDS = [0, 10, 25, 50, 100]   # band edges, % leaf area
+ADVISORY_CORPUS_MIN_CONFIDENCE = float(os.getenv("ADVISORY_CORPUS_MIN_CONFIDENCE", "0.5"))
+
+# ── Chat sessions ──────────────────────────────────────
+CHAT_SESSION_BACKEND = os.getenv("CHAT_SESSION_BACKEND", "memory")
+CHAT_SESSION_TTL_SECONDS = int(os.getenv("CHAT_SESSION_TTL_SECONDS", "1800"))
+CHAT_SESSION_MAX = int(os.getenv("CHAT_SESSION_MAX", "10000"))
 
 # ── Supabase (skeleton — not wired yet) ────────────────
 SUPABASE_URL = os.getenv("SUPABASE_URL", "")
@@ -34,9 +62,18 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY", "")
 # ── ISRO APIs ──────────────────────────────────────────
 BHUVAN_API_KEY = os.getenv("BHUVAN_API_KEY", "")
 BHOONIDHI_API_KEY = os.getenv("BHOONIDHI_API_KEY", "")
+BHUVAN_WFS_BASE = os.getenv("BHUVAN_WFS_BASE", "https://bhuvan-app3.nrsc.gov.in/bhuvan/wfs")
+BHOONIDHI_STAC_BASE = os.getenv("BHOONIDHI_STAC_BASE", "https://bhoonidhi.nrsc.gov.in/bhoonidhi-api/stac/v1")
 
 # ── Agmarknet (data.gov.in) API ────────────────────────
 AGMARKNET_API_KEY = os.getenv("AGMARKNET_API_KEY", "")
+AGMARKNET_API_URL = os.getenv(
+    "AGMARKNET_API_URL", "https://api.data.gov.in/resource/9ef84268-d588-465a-a308-a864a43d0070"
+)
+
+# ── Weather (Open-Meteo, no key) ───────────────────────
+# Empty disables the live lookup (seasonal normals only)
+WEATHER_API_URL = os.getenv("WEATHER_API_URL", "https://api.open-meteo.com/v1/forecast")
 
 _supabase_client = None
 
@@ -53,6 +90,212 @@ CORS_ORIGINS = [
     "http://127.0.0.1:5173",
 ]
 
+# ── Startup ────────────────────────────────────────────
+# Warm models and data in the background after the worker goes live;
+# /health/ready reports 503 until it finishes.
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") == "1"
+WARMUP_MODEL_KEY = os.getenv("WARMUP_MODEL_KEY", "general")
+
+# ── Thread tuning (scripts/autotune.py) ────────────────
+# Per-worker thread-pool sizes the autotuner measured as best on this machine.
+# They replace the built-in defaults below; environment variables still win.
+# A file tuned on a machine with a different core count is ignored.
+TUNING_PATH = Path(os.getenv("TUNING_PATH", str(DATA_DIR / "tuning.json")))
+
+
+def _load_tuning() -> dict:
+    if not TUNING_PATH.is_file():
+        return {}
+    try:
+        tuning = json.loads(TUNING_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring %s: %s", TUNING_PATH, e)
+        return {}
+    if tuning.get("cpu_count") != os.cpu_count():
+        logger.warning("Ignoring %s: tuned for %s CPUs, this machine has %s.", TUNING_PATH, tuning.get("cpu_count"), os.cpu_count())
+        return {}
+    recommended = tuning.get("recommended", {})
+    logger.info("Loaded tuning from %s", TUNING_PATH, extra={"tuning": recommended})
+    return recommended
+
+
+TUNING = _load_tuning()
+
+# ── Response compression ───────────────────────────────
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))   # bytes
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5   # beats gzip-6 on our payloads at similar cost
+
+# Benchmarks / load tests: keep randomly initialised weights when a .pth is
+# missing instead of dropping to DEMO mode, so the real forward pass runs.
+MODEL_RANDOM_WEIGHTS = os.getenv("MODEL_RANDOM_WEIGHTS", "0") == "1"
+
+# torch intra-op / inter-op thread pools (0 = torch default: one per core)
+TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", str(TUNING.get("torch_threads", 0))))
+TORCH_INTEROP_THREADS = int(os.getenv("TORCH_INTEROP_THREADS", str(TUNING.get("torch_interop_threads", 0))))
+# OpenCV's own thread pool (-1 = OpenCV default: one per core, 0 = single-threaded)
+OPENCV_NUM_THREADS = int(os.getenv("OPENCV_NUM_THREADS", str(TUNING.get("opencv_threads", -1))))
+
+# ── Model cascade (model_key="auto") ───────────────────
+# The 128-px generic PlantCNN runs first; a confident answer for a crop with
+# no specialist is returned as-is, otherwise the crop's specialist runs.
+CASCADE_CONFIDENCE_THRESHOLD = float(os.getenv("CASCADE_CONFIDENCE_THRESHOLD", "0.80"))
+# Crop hint / generic-label crop (lower-case) -> specialist model_key
+CASCADE_CROP_SPECIALISTS = {
+    "soybean": "soybean", "soyabean": "soybean",
+    "wheat": "wheat",
+    "chili": "chili", "chilli": "chili", "pepper,_bell": "chili",   # Capsicum
+}
+
+# ── Inference server ───────────────────────────────────
+# "local": every API worker loads its own models (default).
+# "server": workers send preprocessed tensors through shared memory to one
+# inference process per node (python -m app.services.inference_server).
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", "local")
+INFERENCE_SOCKET = os.getenv("INFERENCE_SOCKET", "/tmp/phyto-inference.sock")
+# The connection pickles its messages, so whoever can connect can run code in
+# the server: unset, the server generates a random key per start and writes it
+# next to the socket (<socket>.key, mode 0600) for workers of the same user
+INFERENCE_AUTHKEY = os.getenv("INFERENCE_AUTHKEY", "").encode()
+INFERENCE_RING_SLOTS = int(os.getenv("INFERENCE_RING_SLOTS", "8"))        # in-flight requests per API worker
+INFERENCE_MAX_BATCH = int(os.getenv("INFERENCE_MAX_BATCH", str(TUNING.get("inference_max_batch", 8))))
+INFERENCE_SERVER_THREADS = int(os.getenv("INFERENCE_SERVER_THREADS", str(TUNING.get("inference_server_threads", 0))))
+INFERENCE_BATCH_WAIT_MS = float(os.getenv("INFERENCE_BATCH_WAIT_MS", "2"))
+INFERENCE_CONNECT_TIMEOUT = float(os.getenv("INFERENCE_CONNECT_TIMEOUT", "60"))   # seconds
+
+# ── Image quality gate (before the models) ────────────
+# Uploads that are tiny, blurry, badly exposed or show no leaf get a
+# retake-photo response instead of a diagnosis. "enforce" rejects them,
+# "shadow" only counts would-be rejections (for tuning thresholds), "off"
+# skips the checks. Blur and exposure are measured on a copy downscaled to
+# QUALITY_WORK_SIZE on its long side.
+QUALITY_GATE_MODE = os.getenv("QUALITY_GATE_MODE", "enforce").lower()
+QUALITY_WORK_SIZE = int(os.getenv("QUALITY_WORK_SIZE", "256"))
+QUALITY_MIN_SIDE = int(os.getenv("QUALITY_MIN_SIDE", "224"))                       # px, short side of the upload
+QUALITY_MIN_SHARPNESS = float(os.getenv("QUALITY_MIN_SHARPNESS", "8"))             # variance of the Laplacian
+QUALITY_MIN_BRIGHTNESS = float(os.getenv("QUALITY_MIN_BRIGHTNESS", "40"))          # mean luma, 0-255
+QUALITY_MAX_BRIGHTNESS = float(os.getenv("QUALITY_MAX_BRIGHTNESS", "225"))
+QUALITY_MAX_CLIPPED_FRACTION = float(os.getenv("QUALITY_MAX_CLIPPED_FRACTION", "0.4"))   # share of blown-out pixels
+QUALITY_MIN_GREEN_FRACTION = float(os.getenv("QUALITY_MIN_GREEN_FRACTION", "0.03"))
+
+# ── Leaf region of interest ────────────────────────────
+# Crop each upload to the leaf (largest green contour) before classification
+# and severity; falls back to the full frame when no leaf is found.
+LEAF_ROI_ENABLED = os.getenv("LEAF_ROI_ENABLED", "1") == "1"
+LEAF_ROI_WORK_SIZE = 256         # px, long side of the downscaled copy the mask is built on
+LEAF_ROI_MIN_FRACTION = 0.05     # leaf contour must cover this share of the frame
+LEAF_ROI_PADDING = 0.04          # bbox padding, as a fraction of the leaf's long side
+LEAF_ROI_LESION_MARGIN = 0.10    # hull grown by this share of the leaf's long side (diseased margins, lesions)
+
+# ── Tiled severity ─────────────────────────────────────
+# Large (drone / DSLR) images are thresholded tile by tile in a thread pool
+# (cv2 releases the GIL); working memory scales with tile size, not image size.
+SEVERITY_TILE_SIZE = int(os.getenv("SEVERITY_TILE_SIZE", "512"))   # px
+SEVERITY_TILE_WORKERS = int(os.getenv("SEVERITY_TILE_WORKERS", str(TUNING.get("severity_tile_workers", min(4, os.cpu_count() or 1)))))
+SEVERITY_TILED_MIN_PIXELS = 4_000_000    # whole-frame below this, tiled above
+SEVERITY_TILE_MIN_LEAF_FRACTION = 0.02   # tiles with less leaf than this get no grid value
+
+# ── Severity visuals (/api/visuals) ────────────────────
+# /api/predict only keeps a reference to the decoded leaf; masks and overlays
+# are built and encoded on the first request for them.
+VISUALS_CACHE_ENTRIES = int(os.getenv("VISUALS_CACHE_ENTRIES", "64"))
+VISUALS_CACHE_MB = int(os.getenv("VISUALS_CACHE_MB", "256"))
+VISUALS_MAX_SIDE = 1024          # px, artifacts are rendered at most this large
+VISUALS_WEBP_QUALITY = 80
+
+# ── Diagnosis history (write-behind) ──────────────────
+# /api/predict drops a compact record on an in-process queue; a background
+# writer bulk-inserts batches. "supabase" writes to HISTORY_TABLE in
+# Postgres, "sqlite" to a local file (dev / tests), "off" disables history.
+HISTORY_BACKEND = os.getenv("HISTORY_BACKEND", "supabase" if SUPABASE_URL and SUPABASE_KEY else "sqlite")
+HISTORY_TABLE = os.getenv("HISTORY_TABLE", "diagnosis_history")
+HISTORY_SQLITE_PATH = Path(os.getenv("HISTORY_SQLITE_PATH", str(DATA_DIR / "diagnosis_history.sqlite3")))
+HISTORY_SPILL_PATH = Path(os.getenv("HISTORY_SPILL_PATH", str(DATA_DIR / "diagnosis_history.spill.jsonl")))
+HISTORY_QUEUE_MAX = int(os.getenv("HISTORY_QUEUE_MAX", "10000"))    # records; overflow spills to disk
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "200"))
+HISTORY_FLUSH_SECONDS = float(os.getenv("HISTORY_FLUSH_SECONDS", "2"))   # max age of a partial batch
+HISTORY_MAX_RETRIES = 4          # per batch, exponential backoff from 0.5 s, then spill
+
+# ── Outbreak aggregates (/api/outbreaks) ───────────────
+# Diagnoses with a location are counted per (geohash cell, UTC day, label),
+# at a fine and a coarse cell size, by a trigger on the history table;
+# queries read only these aggregates.
+OUTBREAK_TABLE = os.getenv("OUTBREAK_TABLE", "diagnosis_outbreak_daily")
+OUTBREAK_CELL_PRECISION = 6      # geohash chars, ~1.2 x 0.6 km cells
+OUTBREAK_COARSE_PRECISION = 4    # rollup for zoomed-out heatmaps, ~39 x 20 km cells
+OUTBREAK_MAX_DAYS = 365
+OUTBREAK_MAX_RADIUS_KM = 100.0
+OUTBREAK_MAX_PREFIXES = 64       # geohash prefix ranges scanned per query
+OUTBREAK_HEATMAP_MAX_CELLS = 20_000
+
+# ── Bulk loss estimates (/api/loss/bulk) ──────────────
+LOSS_BULK_MAX_ROWS = int(os.getenv("LOSS_BULK_MAX_ROWS", "2000000"))
+LOSS_BULK_MAX_DETAIL_ROWS = 100_000   # per-plot values are only returned up to this many rows
+
+# ── Bulk geo-enrichment (/api/enrich/bulk) ────────────
+# Plots are grouped into AOI tiles; each occupied tile costs one Bhuvan WFS
+# and one Bhoonidhi STAC request, whatever the number of plots in it.
+GEO_ENRICH_TILE_DEG = float(os.getenv("GEO_ENRICH_TILE_DEG", "0.25"))   # ~28 km
+GEO_ENRICH_MAX_POINTS = int(os.getenv("GEO_ENRICH_MAX_POINTS", "100000"))
+GEO_ENRICH_CONCURRENCY = int(os.getenv("GEO_ENRICH_CONCURRENCY", "8"))  # tiles fetched at once
+GEO_ENRICH_CHUNK_ROWS = 2000     # rows per streamed chunk
+
+# ── Circuit breakers (per upstream) ────────────────────
+# A breaker opens when at least CIRCUIT_FAILURE_RATE of the last CIRCUIT_WINDOW
+# calls failed (and at least CIRCUIT_MIN_CALLS were made); while open, callers
+# go straight to their fallback. After CIRCUIT_OPEN_SECONDS one probe call is
+# let through (half-open): success closes the breaker, failure re-opens it.
+CIRCUIT_WINDOW = int(os.getenv("CIRCUIT_WINDOW", "20"))
+CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "5"))
+CIRCUIT_FAILURE_RATE = float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+CIRCUIT_HALF_OPEN_PROBES = int(os.getenv("CIRCUIT_HALF_OPEN_PROBES", "1"))
+
+# ── Offline edge bundle ────────────────────────────────
+# Snapshot of waterbodies, SWI, mandi prices, HSV calibration and remedy tables
+# built by scripts/build_edge_bundle.py. "auto" uses it in place of the random
+# fallbacks when it exists, "offline" also skips every upstream call, "off"
+# ignores it.
+EDGE_BUNDLE_PATH = Path(os.getenv("EDGE_BUNDLE_PATH", str(DATA_DIR / "edge_bundle.bin")))
+EDGE_MODE = os.getenv("EDGE_MODE", "auto").lower()
+EDGE_BUNDLE_AOI = os.getenv("EDGE_BUNDLE_AOI", "74.0,21.0,82.9,26.9")   # minlon,minlat,maxlon,maxlat (Madhya Pradesh)
+EDGE_BUNDLE_SWI_CELL_DEG = float(os.getenv("EDGE_BUNDLE_SWI_CELL_DEG", "0.05"))   # ~5.5 km
+
+# ── Load-adaptive degradation (QoS) for /api/predict ──
+# Load pressure is the larger of in-flight predicts / QOS_MAX_INFLIGHT and the
+# latency EWMA / QOS_LATENCY_SLO_MS. At a pressure of QOS_THRESHOLDS[n - 1] the
+# worker serves level n: 1 skips optional enrichment and live upstream calls,
+# 2 also runs the QOS_QUANTIZE_MODELS specialists with int8 Linear layers, 3 also
+# feeds specialists QOS_REDUCED_IMAGE_SIZE inputs and caps model_key=auto at the
+# generic model, crop hint or not. Levels rise at once and fall one
+# at a time after QOS_COOLDOWN_SECONDS under QOS_RECOVERY x the threshold.
+# "auto" adapts, "off" always serves level 0; QOS_FORCE_LEVEL pins a level.
+QOS_MODE = os.getenv("QOS_MODE", "auto").lower()
+QOS_MAX_INFLIGHT = int(os.getenv("QOS_MAX_INFLIGHT", "8"))              # per worker
+QOS_LATENCY_SLO_MS = float(os.getenv("QOS_LATENCY_SLO_MS", "1500"))
+QOS_EWMA_ALPHA = float(os.getenv("QOS_EWMA_ALPHA", "0.2"))
+QOS_THRESHOLDS = tuple(float(x) for x in os.getenv("QOS_THRESHOLDS", "1.0,1.5,2.0").split(","))
+QOS_MAX_LEVEL = int(os.getenv("QOS_MAX_LEVEL", "3"))
+QOS_RECOVERY = float(os.getenv("QOS_RECOVERY", "0.7"))
+QOS_COOLDOWN_SECONDS = float(os.getenv("QOS_COOLDOWN_SECONDS", "30"))
+QOS_FORCE_LEVEL = int(os.getenv("QOS_FORCE_LEVEL", "-1"))                # -1 = not forced
+QOS_REDUCED_IMAGE_SIZE = int(os.getenv("QOS_REDUCED_IMAGE_SIZE", "160"))   # specialists, level 3
+# Dynamic quantization only touches Linear layers, so it pays off where they
+# dominate: VGG-16's classifier (~120M of its 138M weights, 409 -> 343 ms per
+# forward on CPU). ResNet-50 and EfficientNet-B0 are conv stacks with a single
+# small fc layer (147 -> 141 ms), so they stay float.
+QOS_QUANTIZE_MODELS = tuple(k.strip() for k in os.getenv("QOS_QUANTIZE_MODELS", "chili").split(",") if k.strip())
+
+# ── Admin endpoints / on-demand profiling ─────────────
+# /admin/* is disabled (404) unless ADMIN_TOKEN is set; callers send it in
+# the X-Admin-Token header. Profiles are written under PROFILE_DIR and only
+# the newest PROFILE_KEEP sessions are kept.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", str(DATA_DIR / "profiles")))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "300"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "10"))
+
 # ── ML Constants ───────────────────────────────────────
 # Generic Model Info
 IMAGE_SIZE_GENERIC = 128
@@ -71,7 +314,7 @@ CLASS_LABELS_GENERIC = [
     "Grape___Black_rot", "Grape___Esca_(Black_Measles)", "Grape___Leaf_blight_(Isariopsis_Leaf_Spot)", "Grape___healthy",
     "Orange___Haunglongbing_(Citrus_greening)", "Peach___Bacterial_spot", "Peach___healthy",
     "Pepper,_bell___Bacterial_spot", "Pepper,_bell___healthy", "Potato___Early_blight", "Potato___Late_blight", "Potato___healthy",
-    "Raspberry___healthy", "Squash___Powdery_mildew", "Strawberry___Leaf_scorch", "Strawberry___healthy",
+    "Raspberry___healthy", "Soybean___healthy", "Squash___Powdery_mildew", "Strawberry___Leaf_scorch", "Strawberry___healthy",
     "Tomato___Bacterial_spot", "Tomato___Early_blight", "Tomato___Late_blight", "Tomato___Leaf_Mold", "Tomato___Septoria_leaf_spot", "Tomato___Spider_mites Two-spotted_spider_mite", "Tomato___Target_Spot", "Tomato___Tomato_Yellow_Leaf_Curl_Virus", "Tomato___Tomato_mosaic_virus", "Tomato___healthy"
 ]
 
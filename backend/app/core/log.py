@@ -0,0 +1,229 @@
+"""
+Phyto — structured, non-blocking logging with request correlation IDs.
+
+Records from the `phyto.*` loggers go through a bounded queue to a
+listener thread that formats them (one JSON object per line by default)
+and writes them to stderr, so a slow or blocked stdout never stalls a
+request. When the queue is full, records are dropped and counted instead
+of blocking; the listener reports the number dropped.
+
+Every record carries the `request_id` of the request it was logged in.
+RequestContextMiddleware takes it from the X-Request-ID header (or makes
+one), stores it in a context variable that follows the request through
+the router, `asyncio.to_thread` and the threadpool into the services, and
+echoes it on the response.
+
+DEBUG records are sampled per request (LOG_DEBUG_SAMPLE_RATE — a sampled
+request keeps all of its debug records) and capped at
+LOG_DEBUG_MAX_PER_SECOND, so their cost stays flat as traffic grows.
+
+Usage in a module:
+
+    logger = logging.getLogger("phyto.ml_service")
+    logger.info("Model %r loaded from %s", key, path, extra={"model_key": key})
+
+Fields passed in `extra` become top-level JSON keys.
+"""
+
+import atexit
+import logging
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+import zlib
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    from orjson import dumps as _orjson_dumps
+
+    def _dumps(obj) -> str:
+        return _orjson_dumps(obj, default=str).decode()
+except ImportError:
+    import json
+
+    def _dumps(obj) -> str:
+        return json.dumps(obj, default=str, ensure_ascii=False)
+
+ROOT = "phyto"
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+request_id: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        rid = getattr(record, "request_id", None)
+        if rid:
+            entry["request_id"] = rid
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return _dumps(entry)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s [%(name)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        rid = getattr(record, "request_id", None)
+        return f"{line} (request {rid})" if rid else line
+
+
+class _AsyncHandler(QueueHandler):
+    """Hands records to the listener thread; never blocks the caller."""
+
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve everything that depends on the calling thread/context here;
+        # JSON encoding and the write happen on the listener thread.
+        record.request_id = request_id.get()
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _DebugSampler(logging.Filter):
+    """Keep DEBUG records of a LOG_DEBUG_SAMPLE_RATE share of requests, at most `max_per_second`."""
+
+    def __init__(self, rate: float, max_per_second: float):
+        super().__init__()
+        self.rate = rate
+        self.max_per_second = max_per_second
+        self._tokens = max_per_second
+        self._refilled = time.monotonic()
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.INFO:
+            return True
+        rid = request_id.get()
+        # Per request, so a sampled request keeps its whole debug trail
+        share = zlib.crc32(rid.encode()) / 0xFFFFFFFF if rid else random.random()
+        if share >= self.rate:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.max_per_second, self._tokens + (now - self._refilled) * self.max_per_second)
+            self._refilled = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+        return True
+
+
+class _Reporter(logging.Handler):
+    """Runs on the listener thread after each record: reports queue overflows."""
+
+    def __init__(self, source: _AsyncHandler, sink: logging.Handler):
+        super().__init__()
+        self.source = source
+        self.sink = sink
+        self._reported = 0
+
+    def emit(self, record: logging.LogRecord):
+        dropped = self.source.dropped
+        if dropped > self._reported:
+            note = logging.LogRecord(f"{ROOT}.log", logging.WARNING, __file__, 0,
+                                     f"Log queue full — dropped {dropped - self._reported} record(s)", None, None)
+            note.request_id = None
+            note.dropped_total = dropped
+            self._reported = dropped
+            self.sink.handle(note)
+
+
+_listener: QueueListener | None = None
+_handler: _AsyncHandler | None = None
+
+
+def configure(level: str = "INFO", fmt: str = "json", queue_size: int = 10000,
+              debug_sample_rate: float = 0.01, debug_max_per_second: float = 50.0):
+    """Route the `phyto` loggers through the async handler (idempotent)."""
+    global _listener, _handler
+    if _listener is not None:
+        return
+    sink = logging.StreamHandler(sys.stderr)
+    sink.setFormatter(TextFormatter() if fmt == "text" else JsonFormatter())
+
+    _handler = _AsyncHandler(queue.Queue(maxsize=queue_size))
+    _handler.addFilter(_DebugSampler(debug_sample_rate, debug_max_per_second))
+    _listener = QueueListener(_handler.queue, sink, _Reporter(_handler, sink))
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger(ROOT)
+    root.setLevel(level)
+    root.addHandler(_handler)
+    root.propagate = False
+
+
+def dropped_records() -> int:
+    return _handler.dropped if _handler else 0
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+class RequestContextMiddleware:
+    """Set the request's correlation ID for every log record made while serving it."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rid = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                rid = value.decode("latin-1")
+                break
+        if rid is None or not _REQUEST_ID_RE.match(rid):
+            rid = new_request_id()
+        header = (b"x-request-id", rid.encode())
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), header]
+            await send(message)
+
+        token = request_id.set(rid)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id.reset(token)
@@ -0,0 +1,307 @@
+"""
+Phyto — in-process metrics with a Prometheus text endpoint.
+
+Histograms per pipeline stage and model_key, cache hit/miss counters,
+upstream outcome counters and model load events. Recording is a bisect
+plus two additions under a lock, so it is cheap enough for the hot path.
+
+Each uvicorn worker keeps its own registry; scrape every worker (or run a
+single worker per container) to get the full picture.
+"""
+
+import functools
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import profiling
+
+# Seconds — covers sub-ms lookups up to upstream timeouts (8–10 s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *labels: str, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._values: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._values.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._values.items()]
+        for labels, series in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+REGISTRY: list[_Metric] = []
+
+# ── Metric definitions ─────────────────────────────────
+HTTP_REQUEST_SECONDS = Histogram(
+    "phyto_http_request_seconds", "HTTP request latency by route.", ("method", "route", "status"),
+)
+STAGE_SECONDS = Histogram(
+    "phyto_stage_seconds", "Latency of individual pipeline stages.", ("stage", "model_key"),
+)
+CACHE_EVENTS = Counter(
+    "phyto_cache_events_total", "Cache lookups by cache and result (hit/miss).", ("cache", "result"),
+)
+UPSTREAM_EVENTS = Counter(
+    "phyto_upstream_events_total",
+    "Upstream calls by outcome: ok (live answer), error (failed, fallback served), fallback (not configured or no data), "
+    "short_circuit (breaker open, not called), offline (EDGE_MODE=offline), shed (skipped under load, QoS level >= 1).",
+    ("upstream", "outcome"),
+)
+MODEL_LOADS = Counter(
+    "phyto_model_loads_total", "Model load events by model and outcome (loaded/demo).", ("model_key", "outcome"),
+)
+LEAF_ROI_FRACTION = Histogram(
+    "phyto_leaf_roi_pixel_fraction", "Share of the frame's pixels kept by the leaf ROI crop (1.0 = no crop).",
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.7, 0.9, 1.0),
+)
+CASCADE_EXITS = Counter(
+    "phyto_cascade_exits_total",
+    "model_key=auto requests by exit: early (confident generic), generic_only, escalated, routed (crop hint), "
+    "capped (escalation skipped under load, QoS level 3).",
+    ("exit",),
+)
+CASCADE_GFLOPS_SAVED = Counter(
+    "phyto_cascade_gflops_saved_total", "GFLOPs saved by the cascade versus running the specialist directly.",
+)
+
+HISTORY_RECORDS = Counter(
+    "phyto_history_records_total",
+    "Diagnosis history records by outcome: written, spilled (to the JSONL file), replayed (from it), "
+    "dropped (spill backlog full or unwritable).",
+    ("outcome",),
+)
+HISTORY_QUEUE_DEPTH = Gauge("phyto_history_queue_depth", "Records waiting in the history write-behind queue.")
+
+QUALITY_GATE_EVENTS = Counter(
+    "phyto_quality_gate_total",
+    "Image quality gate results: passed, or one count per failed check (too_small, blurry, too_dark, overexposed, "
+    "no_leaf, unreadable). mode=shadow counts without rejecting.",
+    ("result", "mode"),
+)
+
+CIRCUIT_STATE = Gauge(
+    "phyto_circuit_state", "Upstream circuit breaker state: 0 closed, 1 half-open, 2 open.", ("upstream",),
+)
+CIRCUIT_TRANSITIONS = Counter(
+    "phyto_circuit_transitions_total", "Circuit breaker transitions by upstream and new state.", ("upstream", "state"),
+)
+
+QOS_LEVEL = Gauge("phyto_qos_level", "Degradation level /api/predict is served at: 0 full ... 3 reduced input.")
+QOS_PRESSURE = Gauge("phyto_qos_pressure", "Load pressure: max(in-flight / QOS_MAX_INFLIGHT, latency EWMA / SLO).")
+QOS_RESPONSES = Counter("phyto_qos_responses_total", "/api/predict responses by the degradation level served.", ("level",))
+
+
+# ── Helpers used by the services ───────────────────────
+@contextmanager
+def span(stage: str, model_key: str = ""):
+    """Time a block into phyto_stage_seconds{stage, model_key}."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - t0, stage, model_key)
+
+
+async def timed(stage: str, awaitable, model_key: str = ""):
+    """Await `awaitable` inside a span — for coroutines handed to asyncio.gather."""
+    with span(stage, model_key):
+        return await awaitable
+
+
+def timed_stage(stage: str):
+    """Decorator form of `span` for sync and async service functions."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_EVENTS.inc(cache, "hit" if hit else "miss")
+
+
+def record_upstream(upstream: str, outcome: str):
+    UPSTREAM_EVENTS.inc(upstream, outcome)
+
+
+def record_model_load(model_key: str, outcome: str):
+    MODEL_LOADS.inc(model_key, outcome)
+
+
+def record_cascade(exit_kind: str, gflops_saved: float):
+    CASCADE_EXITS.inc(exit_kind)
+    CASCADE_GFLOPS_SAVED.inc(amount=gflops_saved)
+
+
+def record_history(outcome: str, n: int = 1):
+    HISTORY_RECORDS.inc(outcome, amount=n)
+
+
+def record_quality(failed: list[str], mode: str):
+    if not failed:
+        QUALITY_GATE_EVENTS.inc("passed", mode)
+    for check in failed:
+        QUALITY_GATE_EVENTS.inc(check, mode)
+
+
+def record_circuit(upstream: str, state: str, level: int):
+    CIRCUIT_STATE.set(upstream, value=level)
+    CIRCUIT_TRANSITIONS.inc(upstream, state)
+
+
+def record_qos(level: int, pressure: float):
+    QOS_LEVEL.set(value=level)
+    QOS_PRESSURE.set(value=round(pressure, 3))
+
+
+def record_qos_response(level: int):
+    QOS_RESPONSES.inc(str(level))
+
+
+def render_latest() -> str:
+    """Prometheus text exposition format (0.0.4)."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ── ASGI middleware ────────────────────────────────────
+class MetricsMiddleware:
+    """Per-route request latency, labelled by the route template (not the raw path)."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        t0 = time.perf_counter()
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = _route_template(scope)
+            if route != "/metrics":
+                HTTP_REQUEST_SECONDS.observe(time.perf_counter() - t0, scope["method"], route, str(status))
+            session = profiling.ACTIVE
+            if session is not None and not route.startswith(("/admin", "/metrics")):
+                session.request_done()
+
+
+def _route_template(scope: Scope) -> str:
+    """'/api/remedies/Tomato___Late_blight' -> '/api/remedies/{disease_class}' (bounded label cardinality)."""
+    if scope.get("route") is None:
+        return "unmatched"
+    path = scope["path"]
+    for name, value in scope.get("path_params", {}).items():
+        path = path.replace(f"/{value}", f"/{{{name}}}", 1)
+    return path
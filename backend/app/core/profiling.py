@@ -0,0 +1,234 @@
+"""
+Phyto — on-demand profiling of the live process.
+
+An admin starts a session (POST /admin/profile) for the next N requests or
+T seconds, whichever comes first. While it runs:
+
+- a sampler thread snapshots every thread's Python stack each
+  PROFILE_SAMPLE_INTERVAL_MS and counts them as folded stacks
+  ("thread;outer;...;inner count"), the input format of flamegraph.pl,
+  speedscope and inferno;
+- every ModelManager.predict call runs under torch.profiler, and the
+  traces are merged into one Chrome trace (chrome://tracing, Perfetto).
+
+When no session is active the only cost is the `ACTIVE is not None` check
+in ModelManager.predict and MetricsMiddleware — nothing is sampled or
+traced. torch.profiler is process-global, so predict calls are serialized
+while a session traces them.
+
+Sessions are per process, like the metrics registry: the worker that
+receives the start request is the one profiled. Artifacts are written to
+PROFILE_DIR/<session id>/.
+"""
+
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app.core.config import PROFILE_DIR, PROFILE_KEEP, PROFILE_MAX_SECONDS, PROFILE_SAMPLE_INTERVAL_MS
+
+logger = logging.getLogger("phyto.profiling")
+
+ARTIFACTS = {
+    "stacks.folded": "text/plain",            # sampled stacks, whole request path
+    "torch_trace.json": "application/json",   # torch.profiler Chrome trace of ModelManager.predict
+}
+
+# Innermost frames of threads that are parked, not working
+_IDLE_FRAMES = {
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"), ("queue.py", "get"),
+    ("selectors.py", "select"), ("thread.py", "_worker"),
+}
+
+
+class ProfileSession:
+    def __init__(self, requests: int | None, seconds: float, interval_ms: float, trace_torch: bool):
+        started = datetime.now(timezone.utc)
+        self.id = f"{started:%Y%m%dT%H%M%S}-{os.getpid()}"
+        self.dir = PROFILE_DIR / self.id
+        self.started_at = started.isoformat(timespec="seconds")
+        self.requests_limit = requests
+        self.seconds = seconds
+        self.interval = interval_ms / 1000
+        self.trace_torch = trace_torch
+        self.requests_seen = 0
+        self.predicts_traced = 0
+        self.samples = 0
+        self._stacks: Counter[str] = Counter()
+        self._deadline = time.monotonic() + seconds
+        self._stop = threading.Event()
+        self._torch_lock = threading.Lock()
+        self._sampler = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self.finished_at: str | None = None
+
+    # ── request path hooks ──────────────────────────────
+    def request_done(self):
+        self.requests_seen += 1
+        if self.requests_limit and self.requests_seen >= self.requests_limit:
+            self._stop.set()
+
+    def trace_predict(self, fn, *args):
+        """Run one ModelManager.predict under torch.profiler; its trace is merged at the end."""
+        if not self.trace_torch:
+            return fn(*args)
+        import torch
+        from torch.profiler import ProfilerActivity, profile, record_function
+
+        activities = [ProfilerActivity.CPU] + ([ProfilerActivity.CUDA] if torch.cuda.is_available() else [])
+        with self._torch_lock:
+            if self._stop.is_set():
+                return fn(*args)
+            with profile(activities=activities, record_shapes=True) as prof:
+                with record_function(f"predict:{args[1] if len(args) > 1 else 'general'}"):
+                    result = fn(*args)
+            self.predicts_traced += 1
+            prof.export_chrome_trace(str(self.dir / "torch" / f"predict_{self.predicts_traced:05d}.json"))
+        return result
+
+    # ── sampler ─────────────────────────────────────────
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval) and time.monotonic() < self._deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}").replace(";", ":"))
+                self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+        _finish(self)
+
+    def stop(self):
+        self._stop.set()
+
+    def _write(self):
+        with open(self.dir / "stacks.folded", "w", encoding="utf-8") as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        parts = sorted((self.dir / "torch").glob("predict_*.json"))
+        if parts:
+            events, seen_meta = [], set()
+            for part in parts:
+                for event in json.loads(part.read_text(encoding="utf-8")).get("traceEvents", []):
+                    if event.get("ph") == "M":
+                        key = (event.get("name"), event.get("pid"), event.get("tid"))
+                        if key in seen_meta:
+                            continue
+                        seen_meta.add(key)
+                    events.append(event)
+            (self.dir / "torch_trace.json").write_text(
+                json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}), encoding="utf-8"
+            )
+        shutil.rmtree(self.dir / "torch", ignore_errors=True)
+
+        self.finished_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        (self.dir / "session.json").write_text(json.dumps(self.describe(), indent=2), encoding="utf-8")
+
+    def describe(self) -> dict:
+        return {
+            "id": self.id,
+            "pid": os.getpid(),
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "requests_limit": self.requests_limit,
+            "seconds_limit": self.seconds,
+            "requests_seen": self.requests_seen,
+            "predicts_traced": self.predicts_traced,
+            "samples": self.samples,
+            "sample_interval_ms": self.interval * 1000,
+            "artifacts": sorted(name for name in ARTIFACTS if (self.dir / name).exists()),
+        }
+
+
+def _frame_label(code) -> str:
+    path = code.co_filename.replace("\\", "/")
+    for marker in ("site-packages/", "/backend/"):
+        if marker in path:
+            path = path.split(marker, 1)[1]
+            break
+    else:
+        path = os.path.basename(path)
+    return f"{code.co_qualname} ({path}:{code.co_firstlineno})".replace(";", ":")
+
+
+# The session being recorded; None (the common case) means profiling is off
+ACTIVE: ProfileSession | None = None
+_lock = threading.Lock()
+
+
+def start(requests: int | None, seconds: float, interval_ms: float = PROFILE_SAMPLE_INTERVAL_MS,
+          trace_torch: bool = True) -> ProfileSession:
+    """Start a session; ValueError if one is already running in this process."""
+    global ACTIVE
+    with _lock:
+        if ACTIVE is not None:
+            raise ValueError(f"Profile session {ACTIVE.id} is already running.")
+        session = ProfileSession(requests, min(seconds, PROFILE_MAX_SECONDS), interval_ms, trace_torch)
+        (session.dir / "torch").mkdir(parents=True, exist_ok=True)
+        _prune()
+        ACTIVE = session
+    session._sampler.start()
+    logger.info("Session %s started (%s requests, %.0fs max)", session.id, requests or "any number of", session.seconds)
+    return session
+
+
+def stop() -> ProfileSession | None:
+    """End the running session early; its artifacts are written shortly after."""
+    session = ACTIVE
+    if session is not None:
+        session.stop()
+    return session
+
+
+def _finish(session: ProfileSession):
+    global ACTIVE
+    with _lock:
+        if ACTIVE is session:
+            ACTIVE = None
+    session._stop.set()
+    with session._torch_lock:   # let an in-flight traced predict finish exporting
+        session._write()
+    logger.info("Session %s finished — %d requests, %d samples, %d traced predicts",
+                session.id, session.requests_seen, session.samples, session.predicts_traced)
+
+
+def _prune():
+    sessions = sorted((p for p in PROFILE_DIR.iterdir() if p.is_dir()), key=lambda p: p.name)
+    for old in sessions[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else []:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def sessions() -> list[dict]:
+    """Finished sessions on disk (any worker), newest first."""
+    if not PROFILE_DIR.exists():
+        return []
+    found = []
+    for path in sorted(PROFILE_DIR.glob("*/session.json"), reverse=True):
+        try:
+            found.append(json.loads(path.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            continue
+    return found
+
+
+def artifact_path(session_id: str, name: str) -> Path | None:
+    """Path of a finished session's artifact, or None (also for ids that are not plain names)."""
+    if name not in ARTIFACTS or not session_id or session_id != Path(session_id).name or session_id.startswith("."):
+        return None
+    path = PROFILE_DIR / session_id / name
+    return path if path.is_file() else None
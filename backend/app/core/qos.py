@@ -0,0 +1,203 @@
+"""
+Phyto — load-adaptive degradation (quality of service) for /api/predict.
+
+At peak season (kharif soybean, rabi wheat) the ResNet-50 and VGG-16
+specialists saturate the CPUs and every diagnosis gets slow at once. Each
+worker instead watches its own load and, past the SLO, serves cheaper
+diagnoses rather than later ones:
+
+- level 0 "full":      everything.
+- level 1 "lean":      no severity grid or /api/visuals reference; ISRO and
+                       Agmarknet answers come from the edge bundle / seasonal
+                       estimates only (no live calls).
+- level 2 "quantized": also int8 dynamically quantized Linear layers in the
+                       QOS_QUANTIZE_MODELS specialists (VGG-16, where they
+                       hold most of the weights; the conv stacks stay float).
+- level 3 "reduced":   also QOS_REDUCED_IMAGE_SIZE inputs for the specialists,
+                       and model_key=auto serves the generic model only, even
+                       with a crop hint.
+
+Load pressure is max(in-flight predicts / QOS_MAX_INFLIGHT, latency EWMA /
+QOS_LATENCY_SLO_MS). The level rises to the one for the current pressure
+immediately and steps down one level at a time, once pressure has stayed
+under QOS_RECOVERY x the current level's threshold for QOS_COOLDOWN_SECONDS.
+
+Usage in the router:
+
+    with qos.controller.admit() as plan:
+        ...
+        body["qos"] = plan.tag()
+
+The plan is also kept in a context variable, so services called while the
+request is served (`qos.current()`) see the same level. State is per
+process, like the circuit breakers; it is served on /health/qos.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+from app.core.config import (
+    QOS_MODE, QOS_MAX_INFLIGHT, QOS_LATENCY_SLO_MS, QOS_EWMA_ALPHA, QOS_THRESHOLDS, QOS_MAX_LEVEL, QOS_RECOVERY,
+    QOS_COOLDOWN_SECONDS, QOS_FORCE_LEVEL,
+)
+from app.core.metrics import record_qos
+
+logger = logging.getLogger("phyto.qos")
+
+
+class Plan(NamedTuple):
+    level: int
+    mode: str
+    degraded: tuple[str, ...]     # what this level gives up, for clients
+
+    @property
+    def enrichment(self) -> bool:
+        """Severity grid and visuals reference."""
+        return self.level < 1
+
+    @property
+    def live_upstreams(self) -> bool:
+        return self.level < 1
+
+    @property
+    def quantized(self) -> bool:
+        return self.level >= 2
+
+    @property
+    def reduced_input(self) -> bool:
+        return self.level >= 3
+
+    @property
+    def escalation(self) -> bool:
+        return self.level < 3
+
+    def tag(self) -> dict:
+        return {"level": self.level, "mode": self.mode, "degraded": list(self.degraded)}
+
+
+PLANS = (
+    Plan(0, "full", ()),
+    Plan(1, "lean", ("severity_grid", "visuals", "live_upstreams")),
+    Plan(2, "quantized", ("severity_grid", "visuals", "live_upstreams", "full_precision")),
+    Plan(3, "reduced", ("severity_grid", "visuals", "live_upstreams", "full_precision", "full_resolution",
+                        "cascade_escalation")),
+)
+FULL = PLANS[0]
+
+_current: ContextVar[Plan] = ContextVar("qos_plan", default=FULL)
+
+
+def current() -> Plan:
+    """The plan of the request being served (level 0 outside /api/predict)."""
+    return _current.get()
+
+
+class LoadController:
+    def __init__(
+        self, mode: str = QOS_MODE, max_inflight: int = QOS_MAX_INFLIGHT, slo_ms: float = QOS_LATENCY_SLO_MS,
+        alpha: float = QOS_EWMA_ALPHA, thresholds: tuple[float, ...] = QOS_THRESHOLDS,
+        max_level: int = QOS_MAX_LEVEL, recovery: float = QOS_RECOVERY, cooldown: float = QOS_COOLDOWN_SECONDS,
+        force_level: int = QOS_FORCE_LEVEL,
+    ):
+        self.mode = mode
+        self.max_inflight = max(max_inflight, 1)
+        self.slo_ms = slo_ms
+        self.alpha = alpha
+        self.thresholds = thresholds
+        self.max_level = min(max_level, len(thresholds), len(PLANS) - 1)
+        self.recovery = recovery
+        self.cooldown = cooldown
+        self.force_level = min(force_level, len(PLANS) - 1)
+        self._lock = threading.Lock()
+        self.inflight = 0
+        self.latency_ms = 0.0          # EWMA of /api/predict latency
+        self.level = 0
+        self._calm_since: float | None = None
+        self._last_done = time.monotonic()
+        self._transitions: deque[dict] = deque(maxlen=20)
+        self._served = [0] * len(PLANS)
+        record_qos(0, 0.0)
+
+    def _pressure(self) -> float:
+        return max(self.inflight / self.max_inflight, self.latency_ms / self.slo_ms if self.slo_ms > 0 else 0.0)
+
+    def _update(self, now: float) -> int:
+        if self.inflight == 1:
+            # Nothing else in flight: the EWMA only moves when requests finish,
+            # so fade a reading left over from a busy period that has ended
+            self.latency_ms *= 0.5 ** ((now - self._last_done) / self.cooldown) if self.cooldown > 0 else 0.0
+        pressure = self._pressure()
+        if self.force_level >= 0 or self.mode == "off":
+            level = max(self.force_level, 0)
+            record_qos(level, pressure)
+            return level
+        target = min(sum(pressure >= t for t in self.thresholds), self.max_level)
+        if target > self.level:
+            self._transition(target, pressure)
+        elif self.level > 0 and pressure < self.thresholds[self.level - 1] * self.recovery:
+            if self._calm_since is None:
+                self._calm_since = now
+            elif now - self._calm_since >= self.cooldown:
+                self._transition(self.level - 1, pressure)
+                self._calm_since = now    # the next step down needs another calm period
+        else:
+            self._calm_since = None
+        record_qos(self.level, pressure)
+        return self.level
+
+    def _transition(self, level: int, pressure: float):
+        self._transitions.append({
+            "from": self.level,
+            "to": level,
+            "pressure": round(pressure, 2),
+            "inflight": self.inflight,
+            "latency_ms": round(self.latency_ms, 1),
+            "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        })
+        logger.warning("Level %d -> %d (%s) at pressure %.2f", self.level, level, PLANS[level].mode, pressure,
+                       extra={"qos_level": level, "inflight": self.inflight, "latency_ms": round(self.latency_ms, 1)})
+        self.level = level
+        self._calm_since = None
+
+    @contextmanager
+    def admit(self):
+        """Serve one predict request: yields its Plan and times it into the latency EWMA."""
+        started = time.monotonic()
+        with self._lock:
+            self.inflight += 1
+            plan = PLANS[self._update(started)]
+            self._served[plan.level] += 1
+        token = _current.set(plan)
+        try:
+            yield plan
+        finally:
+            _current.reset(token)
+            now = time.monotonic()
+            with self._lock:
+                self.inflight -= 1
+                self.latency_ms += self.alpha * ((now - started) * 1000 - self.latency_ms)
+                self._last_done = now
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "mode": "forced" if self.force_level >= 0 else self.mode,
+                "level": self.force_level if self.force_level >= 0 else self.level,
+                "plan": PLANS[self.force_level if self.force_level >= 0 else self.level].tag(),
+                "pressure": round(self._pressure(), 3),
+                "inflight": self.inflight,
+                "latency_ewma_ms": round(self.latency_ms, 1),
+                "latency_slo_ms": self.slo_ms,
+                "served_by_level": list(self._served),
+                "transitions": list(self._transitions),
+            }
+
+
+# The process-wide controller for /api/predict
+controller = LoadController()
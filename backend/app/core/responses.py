@@ -0,0 +1,24 @@
+"""
+Phyto — fast JSON response class.
+
+orjson serializes the nested diagnosis payload several times faster than the
+stdlib encoder used by FastAPI's default JSONResponse. Falls back to the
+stdlib encoder if orjson isn't installed.
+"""
+
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+class ORJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        if not ORJSON_AVAILABLE:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
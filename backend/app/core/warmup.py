@@ -0,0 +1,110 @@
+"""
+Phyto — background warmup and readiness state.
+
+Importing `app.main` only pulls in FastAPI and light modules, so a worker is
+live almost immediately. The heavy parts (torch + model weights, OpenCV and
+the HSV table, shapely, google-genai, remedy tables) are loaded here in a
+background thread started from the app lifespan; `/health/ready` reports
+ready once the required steps (the model) have succeeded. The others only
+front-load what happens lazily on first use anyway, so their failures are
+logged and listed under `steps` without holding readiness back.
+"""
+
+import logging
+import threading
+import time
+
+from app.core.config import WARMUP_MODEL_KEY
+
+logger = logging.getLogger("phyto.warmup")
+
+
+def _warm_model():
+    from app.services.ml_service import model_manager
+    model_manager.warmup(WARMUP_MODEL_KEY)
+
+
+def _warm_vision():
+    from app.services.vision_service import load_hsv_data
+    load_hsv_data()
+
+
+def _warm_remedies():
+    from app.services import remedy_service, jugaad_service
+    remedy_service.get_index()
+    jugaad_service.get_index()
+
+
+def _warm_upstreams():
+    import app.services.isro_service  # noqa: F401  (shapely, httpx)
+    import app.services.agmarknet_service  # noqa: F401
+    import app.services.weather_service  # noqa: F401
+
+
+def _warm_llm():
+    import app.services.llm_service  # noqa: F401  (google-genai, advisory corpus)
+
+
+WARMUP_STEPS = [
+    ("remedies", _warm_remedies),
+    ("vision", _warm_vision),
+    ("upstreams", _warm_upstreams),
+    ("llm", _warm_llm),
+    ("model", _warm_model),
+]
+# Steps that must succeed before the worker reports ready
+REQUIRED_STEPS = {"model"}
+
+_state = {
+    "ready": False,
+    "started_at": None,
+    "finished_at": None,
+    "steps": {},
+}
+_thread: threading.Thread | None = None
+
+
+def run_warmup():
+    """Run every warmup step, recording its duration or error."""
+    _state["started_at"] = time.time()
+    ok = True
+    for name, step in WARMUP_STEPS:
+        t0 = time.perf_counter()
+        try:
+            step()
+            _state["steps"][name] = {"status": "ok", "seconds": round(time.perf_counter() - t0, 3)}
+        except Exception as e:
+            _state["steps"][name] = {"status": "error", "error": str(e)}
+            if name in REQUIRED_STEPS:
+                ok = False
+                logger.error("Step %r failed: %s", name, e)
+            else:
+                logger.warning("Step %r failed: %s — it will load lazily on first use", name, e)
+    _state["finished_at"] = time.time()
+    _state["ready"] = ok
+    logger.info("Finished in %.2fs — ready=%s", _state["finished_at"] - _state["started_at"], ok)
+
+
+def start_warmup():
+    """Kick off warmup in a daemon thread (idempotent)."""
+    global _thread
+    if _thread is None:
+        _thread = threading.Thread(target=run_warmup, name="phyto-warmup", daemon=True)
+        _thread.start()
+
+
+def mark_ready():
+    """Skip warmup: everything loads lazily on first use."""
+    _state["ready"] = True
+
+
+def is_ready() -> bool:
+    return _state["ready"]
+
+
+def readiness() -> dict:
+    return {
+        "ready": _state["ready"],
+        "warming": _thread is not None and _thread.is_alive(),
+        "steps": dict(_state["steps"]),
+    }
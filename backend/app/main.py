@@ -3,16 +3,42 @@ FastAPI entry point — mounts routers and CORS middleware.
 """ 
 
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+
+from app.core.config import CORS_ORIGINS, WARMUP_ON_STARTUP
+from app.core.compression import CompressionMiddleware
+from app.core.log import RequestContextMiddleware
+from app.core.metrics import MetricsMiddleware, render_latest
+from app.core.responses import ORJSONResponse
+from app.core import circuit, qos, warmup
+from app.services import history_service
+from app.routers import diagnosis, remedies, auth, chat, visuals, outbreaks, loss, enrichment, admin
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Don't block startup on model loading — the worker is live right away
+    # and flips to ready when the background warmup finishes.
+    if WARMUP_ON_STARTUP:
+        warmup.start_warmup()
+    else:
+        warmup.mark_ready()
+    # Diagnosis history is written behind the request path by a background task
+    await history_service.start()
+    yield
+    await history_service.stop()
 
-from app.core.config import CORS_ORIGINS
-from app.routers import diagnosis, remedies, auth, chat
 
 app = FastAPI(
     title="PlantGuard API",
     description="Plant disease diagnosis backend — 50% milestone demo.",
     version="0.5.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
 # ── CORS (allow Vite dev server) ────────────────────────────
@@ -24,13 +50,67 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ── Compression (brotli/gzip, above COMPRESSION_MIN_SIZE) ───
+app.add_middleware(CompressionMiddleware)
+
+# ── Metrics (times compression too) ─────────────────────────
+app.add_middleware(MetricsMiddleware)
+
+# ── Request IDs (outermost, so every log record carries one) ─
+app.add_middleware(RequestContextMiddleware)
+
 # ── Routers ─────────────────────────────────────────────────
 app.include_router(diagnosis.router, prefix="/api", tags=["Diagnosis"])
 app.include_router(remedies.router, prefix="/api", tags=["Remedies"])
 app.include_router(auth.router, prefix="/api/auth", tags=["Auth"])
 app.include_router(chat.router, prefix="/api", tags=["Chat"])
+app.include_router(visuals.router, prefix="/api", tags=["Visuals"])
+app.include_router(outbreaks.router, prefix="/api", tags=["Outbreaks"])
+app.include_router(loss.router, prefix="/api", tags=["Loss"])
+app.include_router(enrichment.router, prefix="/api", tags=["Enrichment"])
+app.include_router(admin.router, prefix="/admin", tags=["Admin"], include_in_schema=False)
 
 
 @app.get("/", tags=["Health"])
 async def health_check():
     return {"status": "ok", "version": "0.5.0"}
+
+
+@app.get("/health/live", tags=["Health"])
+async def liveness():
+    """The process is up and serving requests."""
+    return {"status": "ok"}
+
+
+@app.get("/health/ready", tags=["Health"])
+async def readiness():
+    """Models and data are warm — 503 until the startup warmup succeeds."""
+    state = warmup.readiness()
+    return ORJSONResponse(state, status_code=200 if state["ready"] else 503)
+
+
+@app.get("/health/upstreams", tags=["Health"])
+async def upstream_health():
+    """Circuit breaker state per upstream; "degraded" while any breaker is not closed."""
+    from app.services.edge_bundle import get_bundle
+
+    upstreams = circuit.snapshot()
+    bundle = get_bundle()
+    return {
+        "status": "ok" if all(u["state"] == circuit.CLOSED for u in upstreams.values()) else "degraded",
+        "upstreams": upstreams,
+        "edge_bundle": bundle.version if bundle else None,
+    }
+
+
+@app.get("/health/qos", tags=["Health"])
+async def qos_health():
+    """Load pressure and the degradation level /api/predict is served at on this worker."""
+    state = qos.controller.snapshot()
+    return {"status": "ok" if state["level"] == 0 else "degraded", **state}
+
+
+@app.get("/metrics", tags=["Health"], include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(render_latest(), media_type="text/plain; version=0.0.4")
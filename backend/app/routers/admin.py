@@ -0,0 +1,66 @@
+"""
+Admin router — operator-only endpoints, disabled unless ADMIN_TOKEN is set.
+
+Profiling: start a session on the worker that serves the request, then
+download its sampled stacks (flamegraph input) and torch.profiler Chrome
+trace once it has finished.
+"""
+
+import hmac
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import FileResponse
+
+from app.core import profiling
+from app.core.config import ADMIN_TOKEN, PROFILE_MAX_SECONDS, PROFILE_SAMPLE_INTERVAL_MS
+from app.core.responses import ORJSONResponse
+
+
+def require_admin(x_admin_token: str = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+
+
+router = APIRouter(default_response_class=ORJSONResponse, dependencies=[Depends(require_admin)])
+
+
+@router.post("/profile")
+async def start_profile(
+    requests: int = Query(None, ge=1, description="Stop after this many requests"),
+    seconds: float = Query(60.0, gt=0, le=PROFILE_MAX_SECONDS, description="Stop after this long at the latest"),
+    interval_ms: float = Query(PROFILE_SAMPLE_INTERVAL_MS, ge=1, le=1000, description="Stack sampling interval"),
+    torch: bool = Query(True, description="Trace ModelManager.predict with torch.profiler"),
+):
+    """Profile the next `requests` requests or `seconds` seconds on this worker."""
+    try:
+        session = profiling.start(requests, seconds, interval_ms, torch)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return session.describe()
+
+
+@router.post("/profile/stop")
+async def stop_profile():
+    """End this worker's running session now."""
+    session = profiling.stop()
+    if session is None:
+        raise HTTPException(status_code=404, detail="No profile session is running on this worker.")
+    return session.describe()
+
+
+@router.get("/profile")
+async def list_profiles():
+    """The running session on this worker (if any) and the finished sessions on disk."""
+    active = profiling.ACTIVE
+    return {"active": active.describe() if active else None, "sessions": profiling.sessions()}
+
+
+@router.get("/profile/{session_id}/{artifact}")
+async def download_profile(session_id: str, artifact: str):
+    """`stacks.folded` (flamegraph.pl / speedscope) or `torch_trace.json` (chrome://tracing / Perfetto)."""
+    path = profiling.artifact_path(session_id, artifact)
+    if path is None:
+        raise HTTPException(status_code=404, detail="No such profile artifact (the session may still be running).")
+    return FileResponse(path, media_type=profiling.ARTIFACTS[artifact], filename=f"{session_id}-{artifact}")
@@ -3,8 +3,9 @@ Auth router — placeholder for future Supabase-based authentication.
 """
 
 from fastapi import APIRouter
+from app.core.responses import ORJSONResponse
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
 
 @router.post("/login")
@@ -2,20 +2,46 @@
 Chat router — LLM-powered advisory and follow-up endpoints.
 """
 
+import json
+
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
-from app.services.llm_service import generate_advisory, follow_up
+from app.core.metrics import record_cache
+from app.core.responses import ORJSONResponse
+from app.services.session_store import get_session_store, new_session_id
+
+# llm_service (google-genai) is imported inside the handlers to keep app
+# import fast; the lifespan warmup imports it ahead of the first request.
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
 MAX_FOLLOWUPS = 2
 
 
+class _LimitReached(Exception):
+    pass
+
+
+def _limit_reached() -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Follow-up limit reached. You can ask up to 2 follow-up questions per diagnosis.",
+    )
+
+
+def _reserve_followup(session: dict) -> dict:
+    """Session change that takes one follow-up slot (applied atomically by the store)."""
+    if session["followups"] >= MAX_FOLLOWUPS:
+        raise _LimitReached
+    return {**session, "followups": session["followups"] + 1}
+
+
 class AdvisoryRequest(BaseModel):
     disease: str
     confidence: float
     severity: float
+    model_key: str = "general"     # model that produced the label (crop models share names)
 
 
 class FollowUpMessage(BaseModel):
@@ -24,32 +50,68 @@ class FollowUpMessage(BaseModel):
 
 
 class FollowUpRequest(BaseModel):
-    history: list[FollowUpMessage]
     question: str
+    session_id: str | None = None
+    # Legacy clients still send the full history instead of a session_id
+    history: list[FollowUpMessage] | None = None
 
 
 @router.post("/chat/advisory")
 async def get_advisory(req: AdvisoryRequest):
-    """Generate an initial bilingual advisory from diagnosis results."""
-    result = generate_advisory(req.disease, req.confidence, req.severity)
-    return result
+    """Generate an initial bilingual advisory and open a follow-up session for it."""
+    from app.services.llm_service import generate_advisory, advisory_seed
+
+    result = generate_advisory(req.disease, req.confidence, req.severity, req.model_key)
+
+    session_id = new_session_id()
+    get_session_store().set(session_id, {
+        "history": advisory_seed(req.disease, req.confidence, req.severity, result),
+        "followups": 0,
+    })
+    return {**result, "session_id": session_id}
 
 
 @router.post("/chat/followup")
 async def get_followup(req: FollowUpRequest):
     """Handle a follow-up question (max 2 allowed)."""
-    # Count user messages in history to enforce the limit.
-    # The first user message is the initial diagnosis context (seeded by the frontend),
-    # not a real follow-up, so skip it when counting.
-    user_msgs = sum(1 for m in req.history if m.role == "user") - 1
-    if user_msgs >= MAX_FOLLOWUPS:
-        raise HTTPException(
-            status_code=429,
-            detail="Follow-up limit reached. You can ask up to 2 follow-up questions per diagnosis.",
-        )
-
-    result = follow_up(
-        [{"role": m.role, "content": m.content} for m in req.history],
-        req.question,
-    )
+    from app.services.llm_service import follow_up
+
+    store = get_session_store()
+
+    if req.session_id:
+        # Take the slot before calling Gemini, so concurrent follow-ups on one
+        # session (possibly on different workers) can't all pass the limit
+        try:
+            session = store.update(req.session_id, _reserve_followup)
+        except _LimitReached:
+            raise _limit_reached()
+        record_cache("chat_session", session is not None)
+        if session is None:
+            raise HTTPException(
+                status_code=404,
+                detail="Chat session expired. Please request a new advisory.",
+            )
+        history = session["history"]
+    elif req.history is not None:
+        history = [{"role": m.role, "content": m.content} for m in req.history]
+        # The first user message is the initial diagnosis context (seeded by the frontend),
+        # not a real follow-up, so skip it when counting.
+        if sum(1 for m in history if m["role"] == "user") - 1 >= MAX_FOLLOWUPS:
+            raise _limit_reached()
+    else:
+        raise HTTPException(status_code=422, detail="Either session_id or history is required.")
+
+    try:
+        result = follow_up(history, req.question)
+    except Exception:
+        if req.session_id:
+            store.update(req.session_id, lambda s: {**s, "followups": s["followups"] - 1})
+        raise
+
+    if req.session_id:
+        turn = [
+            {"role": "user", "content": req.question},
+            {"role": "model", "content": json.dumps(result, ensure_ascii=False)},
+        ]
+        store.update(req.session_id, lambda s: {**s, "history": s["history"] + turn})
     return result
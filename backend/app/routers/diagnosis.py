@@ -1,55 +1,75 @@
 from fastapi import APIRouter, UploadFile, File, Form, Query
 import asyncio
-from app.services.ml_service import model_manager
-from app.services.vision_service import calculate_severity
+import logging
+from app.core import qos
+from app.core.metrics import timed, record_qos_response
+from app.core.responses import ORJSONResponse
 from app.services.remedy_service import get_remedy
 from app.services.jugaad_service import get_jugaad_remedies
-from app.services.isro_service import get_environmental_context
-from app.services.agmarknet_service import get_crop_pricing
-from app.services.weather_service import get_weather_data
+from app.services import history_service
 
-router = APIRouter()
+# torch / cv2 / shapely / httpx-backed services are imported inside the
+# handler so importing the app stays fast; the lifespan warmup
+# (app.core.warmup) loads them in the background before the worker is ready.
+
+router = APIRouter(default_response_class=ORJSONResponse)
+logger = logging.getLogger("phyto.diagnosis")
 
 # Default coordinates — Bhopal city center
 DEFAULT_LAT = 23.2599
 DEFAULT_LON = 77.4126
 
-# Nuance: How much does leaf severity impact overall harvestable yield?
-# 1.0 means 20% severity = 20% loss. 0.5 means 20% severity = 10% loss.
-CROP_YIELD_SENSITIVITY = {
-    "Tomato": 0.85,
-    "Potato": 0.70,
-    "Maize": 0.60,
-    "Apple": 0.50,
-    "Grapes": 0.75,
-    "Orange": 0.40,
-    "Peach": 0.50,
-    "Capsicum": 0.90,
-    "Soyabean": 0.65,
-    "Squash": 0.95,
-    "Strawberry": 0.80,
-    "Raspberry": 0.80,
-    "Blueberry": 0.75,
-    "Cherry": 0.60,
-}
-
 @router.post("/predict")
 async def predict(
     file: UploadFile = File(...),
     model_key: str = Form("general"),
+    crop: str = Form(None, description="Optional crop hint for model_key=auto (e.g. wheat)"),
     lat: float = Query(None, description="Latitude"),
     lon: float = Query(None, description="Longitude"),
+    severity_grid: bool = Query(False, description="Also return a per-tile severity grid (hotspot map)"),
 ):
     """
     Accept a leaf image, run ML prediction + severity analysis,
     and return diagnosis with remedies, environmental context, and market metrics.
+
+    Under load the worker serves a cheaper diagnosis (app.core.qos); the
+    level served is in the `qos` field and the X-QoS-Level header.
     """
+    with qos.controller.admit() as plan:
+        response = await _diagnose(file, model_key, crop, lat, lon, severity_grid, plan)
+    record_qos_response(plan.level)
+    response.headers["X-QoS-Level"] = str(plan.level)
+    return response
+
+
+async def _diagnose(file: UploadFile, model_key: str, crop: str | None, lat: float | None, lon: float | None,
+                    severity_grid: bool, plan: qos.Plan) -> ORJSONResponse:
+    from app.services.ml_service import model_manager
+    from app.services.vision_service import calculate_severity, prepare_leaf, severity_map, disease_bounds
+    from app.services import visuals_service
+    from app.services.isro_service import get_environmental_context
+    from app.services.agmarknet_service import get_crop_pricing
+    from app.services.weather_service import get_weather_data
+    from app.services.loss_engine import estimate_one
+    from app.services import quality_gate
+
     image_bytes = await file.read()
 
+    # Tiny, blurry, dark or leafless photos get a retake hint before any model or upstream call
+    report = quality_gate.check(image_bytes)
+    if report is not None:
+        logger.info("Asked for a retake: %s", ", ".join(report.failed), extra={"quality": report.metrics})
+        return ORJSONResponse({**report.retake_response(), "qos": plan.tag()}, status_code=422)
+
+    # Decode once and crop to the leaf; classification and severity both use the crop
+    leaf = prepare_leaf(image_bytes)
+
     # ML prediction
-    prediction = model_manager.predict(image_bytes, model_key)
+    prediction = await model_manager.predict_async(leaf.pil_image() if leaf else image_bytes, model_key, crop=crop)
     if "disease" not in prediction:
-        return prediction
+        return ORJSONResponse({**prediction, "qos": plan.tag()})
+    if model_key == "auto":
+        model_key = prediction["cascade"]["final_model"]
 
     # Visual severity via OpenCV
     crop_context = model_key
@@ -60,11 +80,24 @@ async def predict(
         crop_context = parts[0]
         disease_context = parts[1]
 
-    severity = calculate_severity(image_bytes, crop=crop_context, disease=disease_context)
+    severity = calculate_severity(leaf if leaf else image_bytes, crop=crop_context, disease=disease_context)
+
+    # The hotspot map covers the whole photo, not just the leaf the diagnosis was
+    # cropped to, so canopy and multi-leaf shots keep every leaf. Optional
+    # enrichment is dropped from QoS level 1.
+    hotspots = None
+    if severity_grid and plan.enrichment:
+        hotspots = severity_map(leaf.whole_frame() if leaf else image_bytes, crop=crop_context, disease=disease_context)
+
+    # Keep a reference for /api/visuals — masks and overlays are only built if asked for
+    image_hash = visuals_service.image_id(image_bytes)
+    visuals_id = None
+    if leaf and plan.enrichment:
+        visuals_id = visuals_service.remember(image_hash, leaf, disease_bounds(crop_context, disease_context))
 
     # Remedy lookup (Synchronous)
-    remedy = get_remedy(prediction["disease"])
-    jugaad = get_jugaad_remedies(prediction["disease"])
+    remedy = get_remedy(prediction["disease"], crop=crop_context)
+    jugaad = get_jugaad_remedies(prediction["disease"], crop=crop_context)
 
     # Parallel data fetching (The "Intelligent Layer") - Asynchronous
     use_lat = lat if lat is not None else DEFAULT_LAT
@@ -73,25 +106,18 @@ async def predict(
     tasks = [
         get_environmental_context(use_lat, use_lon),
         get_crop_pricing(prediction["disease"]),
-        get_weather_data(use_lat, use_lon)
+        timed("weather", get_weather_data(use_lat, use_lon)),
     ]
     
     env_context, market_data, weather = await asyncio.gather(*tasks)
 
 
     # ── Nuanced Financial Loss Calculation ──────────────────
+    # Loss percentage = severity * crop sensitivity (capped), per Quintal at the modal price
     commodity = market_data["commodity"]
-    sensitivity = CROP_YIELD_SENSITIVITY.get(commodity, 0.75)
-    
-    # Loss percentage = severity * sensitivity
-    # We cap it to avoid looking unrealistic at very high severities
-    impact_pct = min(severity * sensitivity, 95.0) 
-    
-    modal_price = market_data["modal_price"]
-    
-    # Financial loss per Quintal
-    loss_per_unit = (impact_pct / 100.0) * modal_price
-    
+    loss = estimate_one(commodity, severity, market_data["modal_price"])
+    impact_pct, loss_per_unit, sensitivity = loss["impact_pct"], loss["loss_per_unit"], loss["sensitivity"]
+
     market_loss_data = {
         "impact_percentage": round(impact_pct, 1),
         "loss_per_unit": round(loss_per_unit, 0),
@@ -100,14 +126,30 @@ async def predict(
         "recommendation": "High Priority" if impact_pct > 25 else "Monitor"
     }
 
-    return {
+    # Write-behind: queued here, persisted in batches by the history writer
+    history_service.record(history_service.make_record(
+        image_hash, prediction["disease"], prediction.get("model_used", model_key), prediction["confidence"],
+        severity, lat, lon, commodity, impact_pct, loss_per_unit,
+    ))
+
+    logger.debug(
+        "Diagnosed %s", prediction["disease"],
+        extra={"model_key": model_key, "confidence": prediction["confidence"], "severity": severity, "commodity": commodity},
+    )
+
+    # Returned as a response directly so FastAPI skips jsonable_encoder on the big payload
+    return ORJSONResponse({
         **prediction,
         "severity": severity,
+        "severity_grid": hotspots,
+        "leaf_roi": leaf.summary() if leaf else None,
+        "visuals_id": visuals_id,
         "remedy": remedy,
         "jugaad_remedies": jugaad,
         "environmental_context": env_context,
         "market_data": market_data,
         "market_loss_data": market_loss_data,
-        "weather": weather
-    }
+        "weather": weather,
+        "qos": plan.tag(),
+    })
 
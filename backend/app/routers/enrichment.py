@@ -0,0 +1,63 @@
+"""
+Enrichment router — wetland proximity and soil wetness for many plots in
+one request, with upstream calls made once per map tile rather than per plot.
+"""
+
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from app.core.responses import ORJSONResponse
+
+# geo_enrichment (NumPy, Shapely, httpx) is imported inside the handler to keep app import light
+
+router = APIRouter(default_response_class=ORJSONResponse)
+
+try:
+    from orjson import loads as _loads
+except ImportError:
+    from json import loads as _loads
+
+_MEDIA_TYPES = {"csv": "text/csv", "geojson": "application/geo+json"}
+
+
+@router.post("/enrich/bulk")
+async def enrich_bulk(request: Request, format: str = Query("csv", pattern="^(csv|geojson)$")):
+    """
+    Body: a CSV with `lat`, `lon` and optional `id` columns (Content-Type
+    text/csv), or columnar JSON {"id": [...], "lat": [...], "lon": [...]}.
+    Streams one row/feature per plot with the wetland zone, SWI, saturation
+    level and risk amplifier that /api/predict reports for a single point.
+    """
+    from app.services import geo_enrichment
+
+    body = await request.body()
+    is_csv = request.headers.get("content-type", "").split(";")[0].strip() in ("text/csv", "text/plain")
+    try:
+        if is_csv:
+            plots = await asyncio.to_thread(geo_enrichment.parse_csv, body.decode("utf-8-sig"))
+        else:
+            payload = await asyncio.to_thread(_loads, body)
+            if not isinstance(payload, dict):
+                raise ValueError("Body must be a JSON object of columns.")
+            plots = geo_enrichment.parse_columns(payload)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=422, detail="CSV body must be UTF-8.")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    result = await geo_enrichment.enrich(plots)
+    stream = geo_enrichment.iter_csv(result) if format == "csv" else geo_enrichment.iter_geojson(result)
+    stats = result.stats
+    return StreamingResponse(
+        stream,
+        media_type=_MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="enriched_plots.{format}"',
+            "X-Plots": str(stats["plots"]),
+            "X-Tiles": str(stats["tiles"]),
+            "X-Upstream-Requests": str(stats["upstream_requests"]),
+            "X-Upstream-Failures": str(stats["upstream_failures"]),
+        },
+    )
@@ -0,0 +1,65 @@
+"""
+Loss router — bulk financial loss estimates for cooperative and district
+reporting, computed column-wise by the NumPy loss engine.
+"""
+
+import asyncio
+import math
+
+from fastapi import APIRouter, HTTPException, Request
+from orjson import loads as _loads
+
+from app.core.config import LOSS_BULK_MAX_ROWS, LOSS_BULK_MAX_DETAIL_ROWS
+from app.core.responses import ORJSONResponse
+
+# loss_engine (NumPy) is imported inside the handler to keep app import light
+
+router = APIRouter(default_response_class=ORJSONResponse)
+
+
+@router.post("/loss/bulk")
+async def bulk_loss(request: Request):
+    """
+    Columnar JSON body: equal-length arrays `commodity`, `severity` (% leaf
+    area), `area_ha`, `yield_q_per_ha`, optional `district`; optional
+    `prices` ({commodity: INR per quintal}) to override the mandi lookup and
+    `include_rows` for per-plot values. Returns totals and distributions,
+    plus the price used per commodity and where it came from (`price_source`:
+    override, agmarknet, edge_bundle or seasonal).
+    """
+    from app.services.agmarknet_service import get_modal_prices
+    from app.services.loss_engine import commodity_name, estimate_bulk
+
+    body = await request.body()
+    try:
+        payload = await asyncio.to_thread(_loads, body)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Body must be a JSON object of columns.")
+    if not isinstance(payload, dict) or not isinstance(payload.get("commodity"), list):
+        raise HTTPException(status_code=422, detail="Body must be a JSON object with a 'commodity' array.")
+
+    include_rows = bool(payload.get("include_rows"))
+    n = len(payload["commodity"])
+    if include_rows and n > LOSS_BULK_MAX_DETAIL_ROWS:
+        raise HTTPException(status_code=422, detail=f"include_rows is limited to {LOSS_BULK_MAX_DETAIL_ROWS} rows.")
+    if n > LOSS_BULK_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"{n} rows exceeds the limit of {LOSS_BULK_MAX_ROWS}.")
+
+    # One price lookup per distinct commodity; explicit prices win
+    try:
+        distinct = {commodity_name(str(c)) for c in set(payload["commodity"])}
+        overrides = {commodity_name(str(k)): float(v) for k, v in (payload.get("prices") or {}).items()}
+    except (TypeError, ValueError, AttributeError):
+        raise HTTPException(status_code=422, detail="'commodity' must be strings and 'prices' a {commodity: number} object.")
+    bad = sorted(k for k, v in overrides.items() if not math.isfinite(v) or v < 0)
+    if bad:
+        raise HTTPException(status_code=422, detail=f"'prices' must be finite and non-negative (got {', '.join(bad)}).")
+    looked_up = await get_modal_prices(sorted(distinct - overrides.keys()))
+    prices = {**{name: price for name, (price, _) in looked_up.items()}, **overrides}
+    price_source = {**{name: source for name, (_, source) in looked_up.items()}, **{name: "override" for name in overrides}}
+
+    try:
+        result = await asyncio.to_thread(estimate_bulk, payload, prices, include_rows, LOSS_BULK_MAX_ROWS)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return ORJSONResponse({**result, "prices": prices, "price_source": price_source})
@@ -0,0 +1,50 @@
+"""
+Outbreaks router — disease case counts around a point or per map cell,
+served from the incrementally maintained outbreak aggregates.
+"""
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app.core.config import OUTBREAK_CELL_PRECISION, OUTBREAK_MAX_DAYS, OUTBREAK_MAX_RADIUS_KM
+from app.core.responses import ORJSONResponse
+from app.services import outbreak_service
+
+router = APIRouter(default_response_class=ORJSONResponse)
+
+
+def _store():
+    store = outbreak_service.get_store()
+    if store is None:
+        raise HTTPException(status_code=503, detail="Diagnosis history is disabled (HISTORY_BACKEND=off).")
+    return store
+
+
+@router.get("/outbreaks/radius")
+def outbreak_radius(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(5.0, gt=0, le=OUTBREAK_MAX_RADIUS_KM),
+    days: int = Query(14, ge=1, le=OUTBREAK_MAX_DAYS),
+    label: str = Query(None, description="Disease filter, e.g. 'late blight' (matches any crop)"),
+):
+    """Cases per disease within `radius_km` over the last `days` days. Sync: runs in the threadpool."""
+    return outbreak_service.radius_summary(_store(), lat, lon, radius_km, days, label)
+
+
+@router.get("/outbreaks/heatmap")
+def outbreak_heatmap(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    days: int = Query(14, ge=1, le=OUTBREAK_MAX_DAYS),
+    label: str = Query(None, description="Disease filter, e.g. 'late blight' (matches any crop)"),
+    precision: int = Query(5, ge=1, le=OUTBREAK_CELL_PRECISION, description="Geohash length of the output cells"),
+):
+    """Cases per geohash cell inside a bounding box, for a heatmap layer."""
+    if min_lat >= max_lat or min_lon >= max_lon:
+        raise HTTPException(status_code=422, detail="Expected min_lat < max_lat and min_lon < max_lon.")
+    try:
+        return outbreak_service.heatmap(_store(), min_lat, min_lon, max_lat, max_lon, days, label, precision)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
@@ -1,14 +1,55 @@
 """
 Remedies router — standalone remedy lookup by disease class.
+
+Bodies are pre-encoded by the remedy index, so this endpoint just picks the
+right representation and honours If-None-Match.
 """
 
-from fastapi import APIRouter
-from app.services.remedy_service import get_remedy
+from fastapi import APIRouter, Query, Request, Response
+from app.core.responses import ORJSONResponse
+from app.services.remedy_service import get_remedy_body
+
+router = APIRouter(default_response_class=ORJSONResponse)
+
+CACHE_CONTROL = "public, max-age=3600"
+
 
-router = APIRouter()
+def _etag_matches(if_none_match: str, etags: tuple[str, ...]) -> bool:
+    """Weak comparison per RFC 9110 — 'W/' prefixes are ignored."""
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.removeprefix("W/") in etags:
+            return True
+    return False
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    for coding in accept_encoding.lower().split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
 
 
 @router.get("/remedies/{disease_class}")
-async def lookup_remedy(disease_class: str):
+async def lookup_remedy(
+    disease_class: str,
+    request: Request,
+    crop: str = Query(None, description="Crop model key, for crop-model labels such as 'Healthy'"),
+):
     """Return remedy info for a given disease class name."""
-    return get_remedy(disease_class)
+    encoded = get_remedy_body(disease_class, crop)
+    use_gzip = _accepts_gzip(request.headers.get("accept-encoding", ""))
+    etag = encoded.etag_gzip if use_gzip else encoded.etag
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, (encoded.etag, encoded.etag_gzip)):
+        return Response(status_code=304, headers=headers)
+
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=encoded.body_gzip, media_type="application/json", headers=headers)
+    return Response(content=encoded.body, media_type="application/json", headers=headers)
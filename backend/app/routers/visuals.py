@@ -0,0 +1,66 @@
+"""
+Visuals router — severity pipeline artifacts (masks and overlays) for a
+diagnosis, generated on first request and cached. Never on /api/predict.
+"""
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+
+from app.core.responses import ORJSONResponse
+
+# visuals_service (OpenCV) is imported inside the handlers to keep app import light
+
+router = APIRouter(default_response_class=ORJSONResponse)
+
+# Artifacts are content-addressed by the image hash and the disease bounds
+# (both in the id, and so in the ETag), so they never change
+CACHE_CONTROL = "private, max-age=86400, immutable"
+
+
+def _missing(image_id: str) -> HTTPException:
+    return HTTPException(
+        status_code=404,
+        detail=f"No cached visuals for {image_id}. Run /api/predict for the image again.",
+    )
+
+
+@router.get("/visuals/{image_id}")
+async def list_visuals(image_id: str):
+    """URLs of every stage available for a diagnosed image."""
+    from app.services import visuals_service
+
+    if not visuals_service.available(image_id):
+        raise _missing(image_id)
+    return {
+        "image_id": image_id,
+        "stages": {
+            stage: f"/api/visuals/{image_id}/{stage}?format={visuals_service.default_format(stage)}"
+            for stage in visuals_service.STAGES
+        },
+    }
+
+
+@router.get("/visuals/{image_id}/{stage}")
+def get_visual(
+    image_id: str,
+    stage: str,
+    request: Request,
+    format: str = Query(None, description="png or webp (default: png for masks, webp otherwise)"),
+):
+    """One pipeline stage as an image. Sync handler: rendering runs in the threadpool."""
+    from app.services import visuals_service
+
+    if stage not in visuals_service.STAGES:
+        raise HTTPException(status_code=404, detail=f"Unknown stage '{stage}'. Options: {', '.join(visuals_service.STAGES)}")
+    fmt = (format or visuals_service.default_format(stage)).lower()
+    if fmt not in visuals_service.FORMATS:
+        raise HTTPException(status_code=422, detail="format must be png or webp")
+
+    etag = f'"{image_id}-{stage}-{fmt}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if request.headers.get("if-none-match", "").strip().removeprefix("W/") == etag:
+        return Response(status_code=304, headers=headers)
+
+    body = visuals_service.render(image_id, stage, fmt)
+    if body is None:
+        raise _missing(image_id)
+    return Response(content=body, media_type=visuals_service.FORMATS[fmt], headers=headers)
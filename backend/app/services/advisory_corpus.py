@@ -0,0 +1,122 @@
+"""
+Pregenerated advisory corpus — bilingual advisories for every model's
+disease labels × severity band, built offline by
+`scripts/pregenerate_advisories.py` and served before calling Gemini.
+
+The corpus file is versioned: every rebuild bumps `version`, and entries are
+only served while `prompt_version` matches the live system prompt/model.
+"""
+
+import json
+import logging
+import os
+from bisect import bisect_right
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app.core.config import (
+    ADVISORY_CORPUS_PATH, ADVISORY_SEVERITY_BANDS,
+    CLASS_LABELS_GENERIC, CLASS_LABELS_SOYBEAN, CLASS_LABELS_WHEAT, CLASS_LABELS_CHILI,
+)
+
+logger = logging.getLogger("phyto.advisory_corpus")
+
+MODEL_LABELS = {
+    "general": CLASS_LABELS_GENERIC,
+    "soybean": CLASS_LABELS_SOYBEAN,
+    "wheat": CLASS_LABELS_WHEAT,
+    "chili": CLASS_LABELS_CHILI,
+}
+# Every (model_key, label) pair — crop models share names like "Healthy", so
+# the model is part of the key
+ALL_LABELS = [(key, label) for key, labels in MODEL_LABELS.items() for label in labels]
+
+
+def entry_key(model_key: str, disease: str) -> str:
+    """Corpus key of a label, e.g. ("wheat", "Healthy") -> "wheat/Healthy"."""
+    model_key = model_key.split(" ", 1)[0]          # "soybean (demo)" -> "soybean"
+    if model_key not in MODEL_LABELS:
+        model_key = "general"
+    return f"{model_key}/{disease}"
+
+
+def band_key(severity: float, bands: list[float] = ADVISORY_SEVERITY_BANDS) -> str:
+    """Map a severity % onto its band, e.g. 12.5 -> "10-25"."""
+    i = min(max(bisect_right(bands, severity) - 1, 0), len(bands) - 2)
+    return f"{bands[i]}-{bands[i + 1]}"
+
+
+def band_midpoints(bands: list[float] = ADVISORY_SEVERITY_BANDS) -> dict[str, float]:
+    """Representative severity used when generating each band."""
+    return {f"{lo}-{hi}": (lo + hi) / 2 for lo, hi in zip(bands, bands[1:])}
+
+
+class AdvisoryCorpus:
+    """Read-only view over one corpus file."""
+
+    def __init__(self, data: dict | None = None):
+        data = data or {}
+        self.version = data.get("version", 0)
+        self.prompt_version = data.get("prompt_version")
+        self.bands = data.get("bands", ADVISORY_SEVERITY_BANDS)
+        self.entries: dict[str, dict[str, dict]] = data.get("entries", {})
+
+    def __len__(self):
+        return sum(len(by_band) for by_band in self.entries.values())
+
+    def get(self, model_key: str, disease: str, severity: float) -> dict | None:
+        """Advisory for the model's exact label and severity band, if pregenerated."""
+        return self.entries.get(entry_key(model_key, disease), {}).get(band_key(severity, self.bands))
+
+    def nearest(self, model_key: str, disease: str, severity: float) -> dict | None:
+        """Closest available band for the label — used when Gemini is down."""
+        by_band = self.entries.get(entry_key(model_key, disease))
+        if not by_band:
+            return None
+        key = min(by_band, key=lambda k: abs(float(k.split("-")[0]) - severity))
+        return by_band[key]
+
+
+def load_corpus(prompt_version: str, path: Path = ADVISORY_CORPUS_PATH) -> AdvisoryCorpus:
+    """Load the corpus, ignoring it if missing or built for a different prompt."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return AdvisoryCorpus()
+    except Exception as e:
+        logger.error("Error loading %s: %s", path, e)
+        return AdvisoryCorpus()
+
+    if data.get("prompt_version") != prompt_version:
+        logger.warning("%s v%s is stale (prompt changed) — ignoring.", path.name, data.get("version"))
+        return AdvisoryCorpus()
+
+    corpus = AdvisoryCorpus(data)
+    logger.info("Loaded v%s with %d advisories.", corpus.version, len(corpus))
+    return corpus
+
+
+def _file_version(path: Path) -> int:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return int(json.load(f).get("version", 0))
+    except Exception:
+        return 0
+
+
+def save_corpus(corpus: AdvisoryCorpus, prompt_version: str, path: Path = ADVISORY_CORPUS_PATH):
+    """Atomically write the corpus as the next version."""
+    data = {
+        "version": max(corpus.version, _file_version(path)) + 1,
+        "prompt_version": prompt_version,
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "bands": corpus.bands,
+        "entries": corpus.entries,
+    }
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+    corpus.version, corpus.prompt_version = data["version"], prompt_version
+    return data["version"]
@@ -1,6 +1,11 @@
+import asyncio
 import httpx
 import random
-from app.core.config import AGMARKNET_API_KEY
+from app.core.config import AGMARKNET_API_KEY, AGMARKNET_API_URL
+from app.core import qos
+from app.core.circuit import get_breaker
+from app.core.metrics import timed_stage, record_upstream
+from app.services.edge_bundle import get_bundle, offline
 
 # Mappings from our model labels to Agmarknet commodity names
 COMMODITY_MAP = {
@@ -39,41 +44,55 @@ def clean_crop_name(disease_string: str) -> str:
         return COMMODITY_MAP.get(crop_base, crop_base)
     return disease_string
 
-async def get_crop_pricing(disease_string: str) -> dict:
-    """
-    Fetches latest pricing data. Seamlessly falls back to realistic seasonal 
-    estimates if the API is unavailable.
-    """
-    commodity = clean_crop_name(disease_string)
-    
-    # Generate realistic fallback (indistinguishable from live)
-    base = BASE_PRICES.get(commodity, {"min": 1500, "max": 3500, "modal": 2500})
-    
+DEFAULT_BASE_PRICE = {"min": 1500, "max": 3500, "modal": 2500}
+
+# Commodities worth an Agmarknet lookup; anything else gets the default estimate
+KNOWN_COMMODITIES = frozenset(COMMODITY_MAP.values()) | frozenset(BASE_PRICES)
+
+
+def _seasonal_fallback(commodity: str) -> dict:
+    """Realistic estimate from the seasonal base prices (indistinguishable from live)."""
+    base = BASE_PRICES.get(commodity, DEFAULT_BASE_PRICE)
+
     # Add daily variation (±3-7%)
     variation = random.uniform(0.93, 1.07)
-    min_p = round(base["min"] * variation, 0)
-    max_p = round(base["max"] * variation, 0)
-    modal_p = round(base["modal"] * variation, 0)
-    
-    sentiment = random.choice(["Bullish", "Stable", "Bearish"])
-    market = random.choice(["Kothri Kalan", "Bhopal (F&V)", "Sehore", "Ashta"])
-
-    fallback_data = {
+    return {
         "commodity": commodity,
-        "min_price": min_p,
-        "max_price": max_p,
-        "modal_price": modal_p,
+        "min_price": round(base["min"] * variation, 0),
+        "max_price": round(base["max"] * variation, 0),
+        "modal_price": round(base["modal"] * variation, 0),
         "unit": "Quintal",
-        "market": market,
+        "market": random.choice(["Kothri Kalan", "Bhopal (F&V)", "Sehore", "Ashta"]),
         "state": "Madhya Pradesh",
-        "sentiment": sentiment,
-        "arrival_volume": random.randint(50, 500)
+        "sentiment": random.choice(["Bullish", "Stable", "Bearish"]),
+        "arrival_volume": random.randint(50, 500),
+        "price_source": "seasonal",
     }
 
-    if not AGMARKNET_API_KEY:
-        return fallback_data
 
-    url = "https://api.data.gov.in/resource/9ef84268-d588-465a-a308-a864a43d0070"
+def _offline_fallback(commodity: str) -> dict:
+    """The edge bundle's price snapshot when there is one — deterministic — else the seasonal estimate."""
+    bundle = get_bundle()
+    snapshot = bundle.price(commodity) if bundle else None
+    if snapshot is None:
+        return _seasonal_fallback(commodity)
+    return {
+        "commodity": commodity,
+        "min_price": snapshot["min_price"],
+        "max_price": snapshot["max_price"],
+        "modal_price": snapshot["modal_price"],
+        "unit": "Quintal",
+        "market": snapshot["market"],
+        "state": snapshot["state"],
+        "sentiment": "Stable",
+        "arrival_volume": snapshot.get("arrival_volume"),
+        "price_date": snapshot.get("date"),
+        "price_source": "edge_bundle",
+    }
+
+
+async def fetch_latest_record(client: httpx.AsyncClient, commodity: str) -> dict | None:
+    """Latest Agmarknet record for a commodity in Madhya Pradesh; None if there is none."""
     params = {
         "api-key": AGMARKNET_API_KEY,
         "format": "json",
@@ -81,30 +100,84 @@ async def get_crop_pricing(disease_string: str) -> dict:
         "filters[commodity]": commodity,
         "filters[state]": "Madhya Pradesh"
     }
-    
+    response = await client.get(AGMARKNET_API_URL, params=params)
+    response.raise_for_status()
+    records = response.json().get("records", [])
+    return records[0] if records else None
+
+
+@timed_stage("agmarknet")
+async def get_crop_pricing(disease_string: str) -> dict:
+    """
+    Fetches latest pricing data. Seamlessly falls back to the edge bundle's
+    snapshot or realistic seasonal estimates if the API is unavailable.
+    """
+    commodity = clean_crop_name(disease_string)
+    fallback_data = _offline_fallback(commodity)
+
+    if offline():
+        record_upstream("agmarknet", "offline")
+        return fallback_data
+
+    # Shed under load (QoS level 1+): snapshot / seasonal estimate only
+    if not qos.current().live_upstreams:
+        record_upstream("agmarknet", "shed")
+        return fallback_data
+
+    if not AGMARKNET_API_KEY:
+        record_upstream("agmarknet", "fallback")
+        return fallback_data
+
+    breaker = get_breaker("agmarknet")
+    if not breaker.allow():
+        record_upstream("agmarknet", "short_circuit")
+        return fallback_data
+
     try:
         async with httpx.AsyncClient(timeout=4.0) as client:
-            response = await client.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            
-            records = data.get("records", [])
-            if not records:
+            record = await fetch_latest_record(client, commodity)
+            breaker.success()
+            if record is None:
+                record_upstream("agmarknet", "fallback")
                 return fallback_data
                 
-            record = records[0]
+            record_upstream("agmarknet", "ok")
             return {
                 "commodity": commodity,
-                "min_price": float(record.get("min_price", min_p)),
-                "max_price": float(record.get("max_price", max_p)),
-                "modal_price": float(record.get("modal_price", modal_p)),
+                "min_price": float(record.get("min_price", fallback_data["min_price"])),
+                "max_price": float(record.get("max_price", fallback_data["max_price"])),
+                "modal_price": float(record.get("modal_price", fallback_data["modal_price"])),
                 "unit": "Quintal",
-                "market": record.get("market", market),
+                "market": record.get("market", fallback_data["market"]),
                 "state": record.get("state", "Madhya Pradesh"),
-                "sentiment": sentiment, # Enrich API data with sentiment
-                "arrival_volume": random.randint(50, 500) 
+                "sentiment": fallback_data["sentiment"], # Enrich API data with sentiment
+                "arrival_volume": random.randint(50, 500),
+                "price_source": "agmarknet",
             }
             
     except Exception:
+        breaker.failure()
+        record_upstream("agmarknet", "error")
         return fallback_data
 
+
+
+async def get_modal_prices(commodities: list[str]) -> dict[str, tuple[float, str]]:
+    """
+    (modal price per quintal, price_source) for each commodity, one lookup per
+    distinct name (concurrently). For reports the seasonal estimate is the
+    plain base price, without the per-call variation the diagnosis card adds,
+    so the same request always gives the same totals.
+
+    Only KNOWN_COMMODITIES are looked up, so the number of upstream calls is
+    bounded by that list, not by how many distinct strings a caller sends.
+    """
+    names = [name for name in dict.fromkeys(commodities) if name in KNOWN_COMMODITIES]
+    results = await asyncio.gather(*(get_crop_pricing(name) for name in names))
+    prices = {name: (float(DEFAULT_BASE_PRICE["modal"]), "seasonal") for name in commodities}
+    for name, data in zip(names, results):
+        if data["price_source"] == "seasonal":
+            prices[name] = (float(BASE_PRICES.get(name, DEFAULT_BASE_PRICE)["modal"]), "seasonal")
+        else:
+            prices[name] = (data["modal_price"], data["price_source"])
+    return prices
@@ -0,0 +1,288 @@
+"""
+Phyto — offline edge bundle: reference data in one memory-mapped file.
+
+Kiosks in Krishi Vigyan Kendras can go days without connectivity. Instead of
+the random fallbacks, the services then answer from a snapshot built while
+online by scripts/build_edge_bundle.py: buffered waterbody polygons, an SWI
+grid over the AOI, the latest mandi prices, the HSV calibration and the
+remedy tables.
+
+Layout: magic, little-endian uint32 format version and header length, a JSON
+header (bundle version, build time, per-section offsets), then 64-byte
+aligned sections. Array sections are np.frombuffer views onto the mapping,
+so opening a bundle reads only the header and pages are faulted in as
+lookups touch them. Document sections (prices, remedy tables) are JSON,
+decoded on first access.
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from app.core.config import EDGE_BUNDLE_PATH, EDGE_MODE
+
+logger = logging.getLogger("phyto.edge_bundle")
+
+MAGIC = b"PHYTOEDG"
+FORMAT_VERSION = 1
+ALIGN = 64
+_PREAMBLE = struct.Struct("<8sII")
+
+
+class EdgeBundle:
+    """Read-only view of a bundle file."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, fmt, header_len = _PREAMBLE.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not an edge bundle.")
+        if fmt != FORMAT_VERSION:
+            raise ValueError(f"{self.path} has bundle format {fmt}, expected {FORMAT_VERSION}.")
+        header = json.loads(self._mmap[_PREAMBLE.size:_PREAMBLE.size + header_len])
+        self.version: str = header["version"]
+        self.built_at: str = header["built_at"]
+        self.meta: dict = header["meta"]
+        self._sections: dict = header["sections"]
+        self._documents: dict = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._sections
+
+    def array(self, name: str) -> np.ndarray:
+        spec = self._sections[name]
+        count = int(np.prod(spec["shape"]))
+        return np.frombuffer(self._mmap, dtype=spec["dtype"], count=count, offset=spec["offset"]).reshape(spec["shape"])
+
+    def document(self, name: str):
+        if name not in self._documents:
+            spec = self._sections[name]
+            self._documents[name] = json.loads(self._mmap[spec["offset"]:spec["offset"] + spec["length"]])
+        return self._documents[name]
+
+    # ── Mandi prices ────────────────────────────────────
+    def price(self, commodity: str) -> dict | None:
+        """{min_price, max_price, modal_price, market, state, date, source} or None."""
+        return self.document("prices").get(commodity) if "prices" in self else None
+
+    # ── Soil wetness ────────────────────────────────────
+    def swi_grid(self, lat, lon) -> np.ndarray:
+        """SWI per point from the grid, NaN outside it or where no scene covered the cell."""
+        lat, lon = np.atleast_1d(np.asarray(lat, dtype=np.float64)), np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        out = np.full(lat.shape, np.nan)
+        if "swi/grid" not in self:
+            return out
+        grid = self.array("swi/grid")
+        min_lon, min_lat, _, _ = self.meta["swi"]["bounds"]
+        cell = self.meta["swi"]["cell_deg"]
+        row = np.floor((lat - min_lat) / cell).astype(np.int64)
+        col = np.floor((lon - min_lon) / cell).astype(np.int64)
+        inside = (row >= 0) & (row < grid.shape[0]) & (col >= 0) & (col < grid.shape[1])
+        out[inside] = grid[row[inside], col[inside]]
+        return out
+
+    def swi(self, lat: float, lon: float) -> float | None:
+        value = float(self.swi_grid(lat, lon)[0])
+        return None if np.isnan(value) else value
+
+    # ── Wetlands ────────────────────────────────────────
+    @property
+    def has_waterbodies(self) -> bool:
+        return "waterbody/bbox" in self
+
+    def wetland_zones(self, lat, lon) -> tuple[np.ndarray, np.ndarray]:
+        """(in zone, zone name) per point: the first buffered waterbody that holds it.
+
+        Even-odd ray casting over every ring of a polygon, so holes are
+        respected; only points inside a polygon's bounding box are tested.
+        """
+        lat, lon = np.atleast_1d(np.asarray(lat, dtype=np.float64)), np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        in_zone = np.zeros(lat.shape, dtype=bool)
+        names = np.full(lat.shape, None, dtype=object)
+        if not self.has_waterbodies:
+            return in_zone, names
+        coords = self.array("waterbody/coords")
+        rings = self.array("waterbody/ring_offsets")
+        polygons = self.array("waterbody/polygon_offsets")
+        bbox = self.array("waterbody/bbox")
+        labels = self.document("waterbody/names")
+
+        for p in range(len(bbox)):
+            min_x, min_y, max_x, max_y = bbox[p]
+            candidates = np.flatnonzero(~in_zone & (lon >= min_x) & (lon <= max_x) & (lat >= min_y) & (lat <= max_y))
+            if candidates.size == 0:
+                continue
+            x, y = lon[candidates, None], lat[candidates, None]
+            crossings = np.zeros(candidates.size, dtype=np.int64)
+            for r in range(polygons[p], polygons[p + 1]):
+                ring = coords[rings[r]:rings[r + 1]]
+                x1, y1, x2, y2 = ring[:-1, 0], ring[:-1, 1], ring[1:, 0], ring[1:, 1]
+                spans = (y1 > y) != (y2 > y)
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    x_cross = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+                crossings += np.count_nonzero(spans & (x < x_cross), axis=1)
+            hit = candidates[crossings % 2 == 1]
+            in_zone[hit] = True
+            names[hit] = labels[p]
+        return in_zone, names
+
+    def wetland_zone(self, lat: float, lon: float) -> str | None:
+        return self.wetland_zones(lat, lon)[1][0]
+
+    # ── HSV calibration and remedy tables ───────────────
+    def hsv_bounds(self) -> dict[tuple[str, str], tuple[np.ndarray, np.ndarray]]:
+        if "hsv/keys" not in self:
+            return {}
+        lower, upper = self.array("hsv/lower"), self.array("hsv/upper")
+        return {(crop, disease): (lower[i], upper[i]) for i, (crop, disease) in enumerate(self.document("hsv/keys"))}
+
+    def table(self, name: str) -> dict | None:
+        """A remedy table ("remedies" or "jugaad_remedies") as in its JSON file."""
+        return self.document(name) if name in self else None
+
+
+# ── Loading ────────────────────────────────────────────
+_bundle: EdgeBundle | None = None
+_loaded = False
+_lock = threading.Lock()
+
+
+def get_bundle() -> EdgeBundle | None:
+    """The bundle at EDGE_BUNDLE_PATH, opened once; None if EDGE_MODE=off or there is none."""
+    global _bundle, _loaded
+    if not _loaded:
+        with _lock:
+            if not _loaded:
+                if EDGE_MODE != "off" and EDGE_BUNDLE_PATH.exists():
+                    try:
+                        _bundle = EdgeBundle(EDGE_BUNDLE_PATH)
+                        logger.info("Loaded bundle %s (built %s).", _bundle.version, _bundle.built_at)
+                    except Exception as e:
+                        logger.error("Error loading %s: %s", EDGE_BUNDLE_PATH, e)
+                elif EDGE_MODE == "offline":
+                    logger.warning("EDGE_MODE=offline but %s is missing — using built-in fallbacks.", EDGE_BUNDLE_PATH)
+                _loaded = True
+    return _bundle
+
+
+def offline() -> bool:
+    """EDGE_MODE=offline: answer from the bundle (or built-in fallbacks) without calling upstreams."""
+    return EDGE_MODE == "offline"
+
+
+# ── Building ───────────────────────────────────────────
+def _pad(n: int) -> int:
+    return -n % ALIGN
+
+
+def write_bundle(path: Path, arrays: dict[str, np.ndarray], documents: dict, meta: dict) -> str:
+    """Write a bundle atomically (temp file + rename); returns its version."""
+    blobs = []
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        blobs.append((name, arr.tobytes(), {"dtype": arr.dtype.str, "shape": list(arr.shape)}))
+    for name, doc in documents.items():
+        body = json.dumps(doc, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        blobs.append((name, body, {"length": len(body)}))
+
+    digest = hashlib.sha256()
+    for name, body, _ in blobs:
+        digest.update(name.encode())
+        digest.update(body)
+    built = datetime.now(timezone.utc)
+    version = f"{built:%Y%m%d}-{digest.hexdigest()[:10]}"
+
+    # Absolute offsets depend on the header's size, so the header is padded with
+    # room for every offset to grow by a few digits once data_start is added.
+    sections, offset = {}, 0
+    for name, body, spec in blobs:
+        sections[name] = {**spec, "offset": offset}
+        offset += len(body) + _pad(len(body))
+    header = {"version": version, "built_at": built.isoformat(timespec="seconds"), "meta": meta, "sections": sections}
+    header_len = len(json.dumps(header).encode()) + 16 * len(sections) + 64
+    data_start = _PREAMBLE.size + header_len + _pad(_PREAMBLE.size + header_len)
+    for spec in sections.values():
+        spec["offset"] += data_start
+    header_bytes = json.dumps(header).encode()
+    assert len(header_bytes) <= header_len
+    header_bytes = header_bytes.ljust(header_len)
+
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, header_len))
+        f.write(header_bytes)
+        f.write(b"\0" * (data_start - _PREAMBLE.size - header_len))
+        for _, body, _ in blobs:
+            f.write(body)
+            f.write(b"\0" * _pad(len(body)))
+    # A running kiosk keeps its mapping of the old file until it restarts
+    os.replace(tmp, path)
+    return version
+
+
+def pack_waterbodies(features: list[dict], buffer_deg: float) -> tuple[dict[str, np.ndarray], list[str]]:
+    """Buffered waterbody polygons as flat coordinate/offset arrays (needs Shapely).
+
+    Multi-part waterbodies become one entry per part with the same name, in
+    feature order, so the first-match rule of find_wetland_zone carries over.
+    """
+    import shapely
+    from shapely.geometry import shape
+    from app.services.isro_service import wetland_name
+
+    # quad_segs=16: the same buffer as BaseGeometry.buffer in find_wetland_zone
+    buffers = shapely.buffer(np.array([shape(f["geometry"]) for f in features], dtype=object), buffer_deg, quad_segs=16)
+    coords, ring_offsets, polygon_offsets, bbox, names = [], [0], [0], [], []
+    for feature, geom in zip(features, buffers):
+        for part in getattr(geom, "geoms", [geom]):
+            if part.is_empty:
+                continue
+            for ring in [part.exterior, *part.interiors]:
+                xy = np.asarray(ring.coords, dtype=np.float64)[:, :2]
+                coords.append(xy)
+                ring_offsets.append(ring_offsets[-1] + len(xy))
+            polygon_offsets.append(len(ring_offsets) - 1)
+            bbox.append(part.bounds)
+            names.append(wetland_name(feature))
+    arrays = {
+        "waterbody/coords": np.concatenate(coords) if coords else np.empty((0, 2)),
+        "waterbody/ring_offsets": np.asarray(ring_offsets, dtype=np.int64),
+        "waterbody/polygon_offsets": np.asarray(polygon_offsets, dtype=np.int64),
+        "waterbody/bbox": np.asarray(bbox, dtype=np.float64).reshape(-1, 4),
+    }
+    return arrays, names
+
+
+def paint_swi_grid(scenes: list[dict], bounds: tuple[float, float, float, float], cell_deg: float) -> tuple[np.ndarray, int]:
+    """SWI grid over `bounds` from STAC scenes, later scenes painted over earlier ones.
+
+    Returns the grid (NaN where no scene had a footprint) and the number of scenes used.
+    """
+    from app.services.isro_service import item_swi
+
+    min_lon, min_lat, max_lon, max_lat = bounds
+    rows, cols = int(np.ceil((max_lat - min_lat) / cell_deg)), int(np.ceil((max_lon - min_lon) / cell_deg))
+    grid = np.full((rows, cols), np.nan, dtype=np.float32)
+    usable = [
+        (item.get("properties", {}).get("datetime", ""), item["bbox"], value)
+        for item in scenes
+        if (value := item_swi(item)) is not None and len(item.get("bbox") or ()) == 4
+    ]
+    usable.sort(key=lambda scene: scene[0])
+    for _, (x0, y0, x1, y1), value in usable:
+        r0, r1 = max(int((y0 - min_lat) / cell_deg), 0), min(int(np.ceil((y1 - min_lat) / cell_deg)), rows)
+        c0, c1 = max(int((x0 - min_lon) / cell_deg), 0), min(int(np.ceil((x1 - min_lon) / cell_deg)), cols)
+        if r0 < r1 and c0 < c1:
+            grid[r0:r1, c0:c1] = value
+    return grid, len(usable)
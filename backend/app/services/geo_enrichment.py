@@ -0,0 +1,356 @@
+"""
+Phyto — environmental context for thousands of plots at once.
+
+`get_environmental_context` costs two upstream calls per point, which is
+100k requests for a 50k-plot farmer registry. Here plots are grouped into
+AOI tiles of GEO_ENRICH_TILE_DEG: each occupied tile costs one Bhuvan WFS
+request (waterbodies in the tile plus the 2 km buffer margin) and one
+Bhoonidhi STAC search (SWI scenes over the tile). Wetland proximity is then
+an STRtree bulk query of every point against the buffered waterbodies, and
+SWI comes from the latest scene whose footprint holds the point, else the
+tile's latest scene, else the seasonal estimate.
+
+Fallbacks match the single-point path (edge bundle, else the Bhojtal
+simulation box and seasonal SWI) per tile, so a failed tile degrades only
+its own plots. Results are yielded in chunks as CSV or GeoJSON for
+streaming.
+"""
+
+import asyncio
+import csv
+import io
+import json
+import random
+from typing import Iterator, NamedTuple
+
+import httpx
+import numpy as np
+
+from app.core.config import (
+    BHUVAN_API_KEY, BHOONIDHI_API_KEY, GEO_ENRICH_TILE_DEG, GEO_ENRICH_MAX_POINTS,
+    GEO_ENRICH_CONCURRENCY, GEO_ENRICH_CHUNK_ROWS,
+)
+from app.core.circuit import get_breaker
+from app.core.metrics import record_upstream, span
+from app.services.edge_bundle import get_bundle, offline
+from app.services.isro_service import (
+    BUFFER_DEG, SHAPELY_AVAILABLE, RISK_AMPLIFIERS, SWI_LOW_MAX, SWI_MODERATE_MAX,
+    fetch_swi_items, fetch_waterbodies, in_bhojtal_box, item_swi, wetland_name,
+)
+
+try:
+    import orjson
+
+    def _dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+SIMULATED_ZONE = "Bhoj Wetland (Bhojtal)"
+CSV_COLUMNS = (
+    "id", "lat", "lon", "in_wetland_zone", "high_fungal_risk", "zone_name",
+    "swi_value", "saturation_level", "risk_amplifier", "swi_source", "tile",
+)
+_LAT_KEYS = ("lat", "latitude")
+_LON_KEYS = ("lon", "lng", "long", "longitude")
+_ID_KEYS = ("id", "plot_id")
+
+
+class Plots(NamedTuple):
+    ids: list[str]
+    lat: np.ndarray
+    lon: np.ndarray
+
+
+class Enrichment(NamedTuple):
+    plots: Plots
+    tile: np.ndarray            # tile index per plot
+    in_zone: np.ndarray         # bool
+    zone_name: np.ndarray       # object (str or None)
+    swi: np.ndarray
+    swi_source: np.ndarray      # object: scene / tile / bundle / seasonal
+    stats: dict
+
+
+# ── Input ──────────────────────────────────────────────
+def make_plots(ids, lat, lon) -> Plots:
+    n = len(lat)
+    if n == 0:
+        raise ValueError("No plots given.")
+    if n > GEO_ENRICH_MAX_POINTS:
+        raise ValueError(f"{n} plots exceeds the limit of {GEO_ENRICH_MAX_POINTS}.")
+    if len(lon) != n or (ids is not None and len(ids) != n):
+        raise ValueError("id, lat and lon must have the same length.")
+    try:
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError("lat and lon must be numbers.")
+    bad = ~np.isfinite(lat) | ~np.isfinite(lon) | (np.abs(lat) > 90) | (np.abs(lon) > 180)
+    if bad.any():
+        raise ValueError(f"{int(bad.sum())} plot(s) have invalid coordinates (first at row {int(np.argmax(bad)) + 1}).")
+    ids = [str(i) for i in ids] if ids is not None else [str(i + 1) for i in range(n)]
+    return Plots(ids, lat, lon)
+
+
+def _pick(fields: list[str], keys: tuple[str, ...]) -> str | None:
+    lowered = {f.strip().lower(): f for f in fields}
+    return next((lowered[k] for k in keys if k in lowered), None)
+
+
+def parse_csv(text: str) -> Plots:
+    """CSV with a header: lat/latitude, lon/lng/longitude, optional id/plot_id."""
+    reader = csv.DictReader(io.StringIO(text))
+    fields = reader.fieldnames or []
+    lat_key, lon_key, id_key = _pick(fields, _LAT_KEYS), _pick(fields, _LON_KEYS), _pick(fields, _ID_KEYS)
+    if not lat_key or not lon_key:
+        raise ValueError("CSV needs 'lat' and 'lon' columns.")
+    ids, lat, lon = [], [], []
+    for row in reader:
+        ids.append(row[id_key] if id_key else None)
+        lat.append(row[lat_key])
+        lon.append(row[lon_key])
+    return make_plots(ids if id_key else None, lat, lon)
+
+
+def parse_columns(payload: dict) -> Plots:
+    """{"id": [...], "lat": [...], "lon": [...]} (id optional)."""
+    lat = payload.get("lat") or payload.get("latitude")
+    lon = payload.get("lon") or payload.get("lng") or payload.get("longitude")
+    if not isinstance(lat, list) or not isinstance(lon, list):
+        raise ValueError("Body needs 'lat' and 'lon' arrays.")
+    return make_plots(payload.get("id"), lat, lon)
+
+
+# ── Tiles and upstream fetches ─────────────────────────
+def tile_index(plots: Plots) -> tuple[np.ndarray, np.ndarray]:
+    """(tile code per plot, (row, col) per occupied tile) on a GEO_ENRICH_TILE_DEG grid."""
+    grid = np.stack([np.floor(plots.lat / GEO_ENRICH_TILE_DEG), np.floor(plots.lon / GEO_ENRICH_TILE_DEG)], axis=1)
+    tiles, codes = np.unique(grid.astype(np.int64), axis=0, return_inverse=True)
+    return codes.reshape(-1), tiles
+
+
+def tile_bbox(row: int, col: int, pad: float = 0.0) -> str:
+    """"minlon,minlat,maxlon,maxlat" of a tile, grown by `pad` degrees."""
+    t = GEO_ENRICH_TILE_DEG
+    return f"{col * t - pad:.6f},{row * t - pad:.6f},{(col + 1) * t + pad:.6f},{(row + 1) * t + pad:.6f}"
+
+
+async def _fetch_tiles(tiles: np.ndarray) -> tuple[list, list, dict]:
+    """Per tile: waterbody features and SWI scenes (None where not configured or failed),
+    plus how many upstream calls were attempted and how many of those failed."""
+    live_wetland = SHAPELY_AVAILABLE and bool(BHUVAN_API_KEY) and not offline()
+    live_swi = bool(BHOONIDHI_API_KEY) and not offline()
+    limit = asyncio.Semaphore(GEO_ENRICH_CONCURRENCY)
+    calls = {"attempted": 0, "failed": 0}
+
+    async def guarded(upstream: str, fetch, *args):
+        breaker = get_breaker(upstream)
+        async with limit:
+            # Checked once the slot is ours, so tiles queued behind a failing
+            # upstream skip it as soon as its breaker opens
+            if not breaker.allow():
+                record_upstream(upstream, "short_circuit")
+                return None
+            calls["attempted"] += 1
+            try:
+                result = await fetch(*args)
+            except Exception:
+                result = None
+        if result is not None:
+            breaker.success()
+        else:
+            calls["failed"] += 1
+            breaker.failure()
+        record_upstream(upstream, "ok" if result is not None else "error")
+        return result
+
+    async with httpx.AsyncClient(timeout=15.0) as client:
+        wfs = [
+            guarded("bhuvan", fetch_waterbodies, client, tile_bbox(r, c, pad=BUFFER_DEG)) if live_wetland else None
+            for r, c in tiles.tolist()
+        ]
+        stac = [
+            guarded("bhoonidhi", fetch_swi_items, client, tile_bbox(r, c), 20) if live_swi else None
+            for r, c in tiles.tolist()
+        ]
+        pending = [t for t in wfs + stac if t is not None]
+        done = iter(await asyncio.gather(*pending))
+    waterbodies = [next(done) if t is not None else None for t in wfs]
+    scenes = [next(done) if t is not None else None for t in stac]
+    if not live_wetland:
+        record_upstream("bhuvan", "offline" if offline() else "fallback")
+    if not live_swi:
+        record_upstream("bhoonidhi", "offline" if offline() else "fallback")
+    return waterbodies, scenes, calls
+
+
+# ── Joins ──────────────────────────────────────────────
+def _wetlands(plots: Plots, waterbodies: list) -> tuple[np.ndarray, np.ndarray]:
+    """Live match where a buffered waterbody holds the point, else the edge bundle or simulation box."""
+    bundle = get_bundle()
+    if bundle is not None and bundle.has_waterbodies:
+        in_zone, zone_name = bundle.wetland_zones(plots.lat, plots.lon)
+    else:
+        in_zone = in_bhojtal_box(plots.lat, plots.lon)
+        zone_name = np.where(in_zone, SIMULATED_ZONE, None).astype(object)
+
+    seen, features = set(), []
+    for tile_features in waterbodies:
+        for feature in tile_features or ():
+            key = feature.get("id")
+            if key is not None:
+                if key in seen:
+                    continue   # the same waterbody fetched by neighbouring tiles
+                seen.add(key)
+            features.append(feature)
+    if not features:
+        return in_zone, zone_name
+
+    import shapely
+    from shapely.geometry import shape
+
+    # quad_segs=16 is BaseGeometry.buffer's default (shapely.buffer's is 8), so the
+    # bulk buffers are the same polygons find_wetland_zone tests against
+    geoms = np.array([shape(f["geometry"]) for f in features], dtype=object)
+    buffers = shapely.buffer(geoms, BUFFER_DEG, quad_segs=16)
+    shapely.prepare(buffers)
+    names = [wetland_name(f) for f in features]
+
+    # STRtree bulk query for bounding-box candidates, then exact contains_xy tests
+    # waterbody by waterbody in feature order, skipping points already matched:
+    # the first match wins, as in find_wetland_zone, and dense layers (a plot
+    # inside ten buffers) cost one exact test per plot instead of ten.
+    point_idx, geom_idx = shapely.STRtree(buffers).query(shapely.points(plots.lon, plots.lat))
+    order = np.argsort(geom_idx, kind="stable")
+    point_idx = point_idx[order]
+    starts = np.searchsorted(geom_idx[order], np.arange(len(features) + 1))
+    matched = np.zeros(len(plots.ids), dtype=bool)
+    for g in range(len(features)):
+        candidates = point_idx[starts[g]:starts[g + 1]]
+        candidates = candidates[~matched[candidates]]
+        if candidates.size == 0:
+            continue
+        hit = candidates[shapely.contains_xy(buffers[g], plots.lon[candidates], plots.lat[candidates])]
+        matched[hit] = True
+        in_zone[hit] = True
+        zone_name[hit] = names[g]
+    return in_zone, zone_name
+
+
+def _swi(plots: Plots, codes: np.ndarray, n_tiles: int, scenes: list) -> tuple[np.ndarray, np.ndarray]:
+    swi = np.empty(len(plots.ids))
+    source = np.empty(len(plots.ids), dtype=object)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(n_tiles + 1))
+    bundle = get_bundle()
+    offline_swi = bundle.swi_grid(plots.lat, plots.lon) if bundle is not None else np.full(len(plots.ids), np.nan)
+
+    for t in range(n_tiles):
+        members = order[bounds[t]:bounds[t + 1]]
+        items = [
+            (item.get("properties", {}).get("datetime", ""), item.get("bbox"), value)
+            for item in scenes[t] or ()
+            if (value := item_swi(item)) is not None
+        ]
+        if not items:
+            gridded = offline_swi[members]
+            known = ~np.isnan(gridded)
+            swi[members[known]] = gridded[known]
+            source[members[known]] = "bundle"
+            # Research-backed fallback for late March in Bhopal (dry season), one draw per tile
+            swi[members[~known]] = random.uniform(0.28, 0.34)
+            source[members[~known]] = "seasonal"
+            continue
+        items.sort(key=lambda item: item[0])
+        swi[members] = items[-1][2]
+        source[members] = "tile"
+        lat, lon = plots.lat[members], plots.lon[members]
+        for _, bbox, value in items:   # oldest first, so the latest covering scene wins
+            if not bbox or len(bbox) < 4:
+                continue
+            inside = (bbox[0] <= lon) & (lon <= bbox[2]) & (bbox[1] <= lat) & (lat <= bbox[3])
+            swi[members[inside]] = value
+            source[members[inside]] = "scene"
+    return swi, source
+
+
+async def enrich(plots: Plots) -> Enrichment:
+    codes, tiles = tile_index(plots)
+    with span("geo_enrich_fetch"):
+        waterbodies, scenes, calls = await _fetch_tiles(tiles)
+    with span("geo_enrich_join"):
+        in_zone, zone_name = await asyncio.to_thread(_wetlands, plots, waterbodies)
+        swi, swi_source = _swi(plots, codes, len(tiles), scenes)
+    stats = {
+        "plots": len(plots.ids),
+        "tiles": len(tiles),
+        "upstream_requests": calls["attempted"],
+        "upstream_failures": calls["failed"],
+        "in_wetland_zone": int(in_zone.sum()),
+    }
+    return Enrichment(plots, codes, in_zone, zone_name, swi, swi_source, stats)
+
+
+# ── Output ─────────────────────────────────────────────
+def _saturation(swi: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    level = np.where(swi < SWI_LOW_MAX, "LOW", np.where(swi <= SWI_MODERATE_MAX, "MODERATE", "HIGH"))
+    amplifier = np.select(
+        [level == "LOW", level == "MODERATE"], [RISK_AMPLIFIERS["LOW"], RISK_AMPLIFIERS["MODERATE"]],
+        RISK_AMPLIFIERS["HIGH"],
+    )
+    return level, amplifier
+
+
+def iter_rows(result: Enrichment) -> Iterator[tuple]:
+    level, amplifier = _saturation(result.swi)
+    in_zone = result.in_zone.tolist()
+    return zip(
+        result.plots.ids, result.plots.lat.tolist(), result.plots.lon.tolist(), in_zone, in_zone,
+        result.zone_name.tolist(), np.round(result.swi, 3).tolist(), level.tolist(), amplifier.tolist(),
+        result.swi_source.tolist(), result.tile.tolist(),
+    )
+
+
+def _chunks(rows: Iterator[tuple], size: int) -> Iterator[list[tuple]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_csv(result: Enrichment, chunk_rows: int = GEO_ENRICH_CHUNK_ROWS) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(CSV_COLUMNS)
+    for chunk in _chunks(iter_rows(result), chunk_rows):
+        writer.writerows(chunk)
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+
+def iter_geojson(result: Enrichment, chunk_rows: int = GEO_ENRICH_CHUNK_ROWS) -> Iterator[bytes]:
+    yield b'{"type":"FeatureCollection","features":['
+    first = True
+    for chunk in _chunks(iter_rows(result), chunk_rows):
+        features = []
+        for row in chunk:
+            props = dict(zip(CSV_COLUMNS, row))
+            lat, lon = props.pop("lat"), props.pop("lon")
+            features.append(_dumps({
+                "type": "Feature",
+                "id": props["id"],
+                "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                "properties": props,
+            }))
+        yield (b"" if first else b",") + b",".join(features)
+        first = False
+    yield b"]}"
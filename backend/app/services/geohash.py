@@ -0,0 +1,108 @@
+"""
+Phyto — geohash encoding and bounding-box cover.
+
+Cells are addressed by integer (lat, lon) grid indices at a precision, so
+covering a box is a loop over index ranges rather than repeated encodes of
+probe points. Precision 6 cells are ~1.2 x 0.6 km, precision 5 ~4.9 x 4.9 km.
+"""
+
+import math
+from functools import lru_cache
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE = {c: i for i, c in enumerate(_BASE32)}
+EARTH_RADIUS_KM = 6371.0
+
+
+def _bits(precision: int) -> tuple[int, int]:
+    """(lat bits, lon bits) — geohash interleaves starting with longitude."""
+    total = 5 * precision
+    return total // 2, total - total // 2
+
+
+def cell_size(precision: int) -> tuple[float, float]:
+    """(height, width) of a cell in degrees."""
+    lat_bits, lon_bits = _bits(precision)
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def _index(lat: float, lon: float, precision: int) -> tuple[int, int]:
+    lat_bits, lon_bits = _bits(precision)
+    lat_i = min(int((lat + 90.0) / 180.0 * (1 << lat_bits)), (1 << lat_bits) - 1)
+    lon_i = min(int((lon + 180.0) / 360.0 * (1 << lon_bits)), (1 << lon_bits) - 1)
+    return lat_i, lon_i
+
+
+def _encode_index(lat_i: int, lon_i: int, precision: int) -> str:
+    lat_bits, lon_bits = _bits(precision)
+    chars = []
+    value = n = 0
+    for bit in range(5 * precision):
+        if bit % 2 == 0:
+            lon_bits -= 1
+            value = (value << 1) | ((lon_i >> lon_bits) & 1)
+        else:
+            lat_bits -= 1
+            value = (value << 1) | ((lat_i >> lat_bits) & 1)
+        n += 1
+        if n == 5:
+            chars.append(_BASE32[value])
+            value = n = 0
+    return "".join(chars)
+
+
+def encode(lat: float, lon: float, precision: int = 7) -> str:
+    return _encode_index(*_index(lat, lon, precision), precision)
+
+
+def bounds(geohash: str) -> tuple[float, float, float, float]:
+    """(min_lat, min_lon, max_lat, max_lon) of a cell."""
+    lat_i = lon_i = 0
+    bit = 0
+    for c in geohash:
+        value = _DECODE[c]
+        for shift in range(4, -1, -1):
+            b = (value >> shift) & 1
+            if bit % 2 == 0:
+                lon_i = (lon_i << 1) | b
+            else:
+                lat_i = (lat_i << 1) | b
+            bit += 1
+    height, width = cell_size(len(geohash))
+    min_lat, min_lon = lat_i * height - 90.0, lon_i * width - 180.0
+    return min_lat, min_lon, min_lat + height, min_lon + width
+
+
+@lru_cache(maxsize=65536)
+def center(geohash: str) -> tuple[float, float]:
+    min_lat, min_lon, max_lat, max_lon = bounds(geohash)
+    return (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+
+
+def cover(min_lat: float, min_lon: float, max_lat: float, max_lon: float, precision: int) -> list[str]:
+    """Every cell at `precision` that intersects the box (no antimeridian wrap)."""
+    lat_lo, lon_lo = _index(min_lat, min_lon, precision)
+    lat_hi, lon_hi = _index(max_lat, max_lon, precision)
+    return [
+        _encode_index(lat_i, lon_i, precision)
+        for lat_i in range(lat_lo, lat_hi + 1)
+        for lon_i in range(lon_lo, lon_hi + 1)
+    ]
+
+
+def cover_count(min_lat: float, min_lon: float, max_lat: float, max_lon: float, precision: int) -> int:
+    lat_lo, lon_lo = _index(min_lat, min_lon, precision)
+    lat_hi, lon_hi = _index(max_lat, max_lon, precision)
+    return (lat_hi - lat_lo + 1) * (lon_hi - lon_lo + 1)
+
+
+def radius_box(lat: float, lon: float, radius_km: float) -> tuple[float, float, float, float]:
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+    return max(lat - dlat, -90.0), max(lon - dlon, -180.0), min(lat + dlat, 90.0), min(lon + dlon, 180.0)
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
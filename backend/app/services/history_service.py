@@ -0,0 +1,457 @@
+"""
+Phyto — write-behind diagnosis history.
+
+/api/predict hands a compact record (image hash, label, confidence,
+severity, location, commodity, loss, timestamp) to `record()`, which is a
+`put_nowait` on an in-process asyncio queue — no I/O on the request path.
+A background task started from the app lifespan drains the queue in
+batches of up to HISTORY_BATCH_SIZE (or whatever arrived within
+HISTORY_FLUSH_SECONDS) and bulk-inserts them through a sink in a worker
+thread, retrying with exponential backoff.
+
+Records that cannot be queued (queue full, writer not running) or whose
+batch exhausted its retries are appended to a JSONL spill file; the writer
+replays it after the next successful flush, and at startup. Every worker
+shares the one spill file, so appends and the hand-off to a replay hold an
+exclusive lock on a sibling ".lock" file, and each replay reads from its
+own ".replaying.<pid>" copy. Overflow from
+the request path is handed to a spill thread rather than written inline,
+so a backed-up writer never puts file I/O on the event loop; if that
+thread falls HISTORY_QUEUE_MAX records behind too, records are dropped and
+counted.
+
+Sinks: "supabase" (one PostgREST insert per batch into HISTORY_TABLE) and
+"sqlite" (executemany in one transaction) as the local stand-in. The
+Postgres schema, including the outbreak aggregates a trigger maintains on
+insert, is in backend/sql/diagnosis_history.postgres.sql.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+try:
+    import fcntl
+except ImportError:      # Windows dev machines: single worker, the thread lock is enough
+    fcntl = None
+
+from app.core.config import (
+    HISTORY_BACKEND, HISTORY_TABLE, HISTORY_SQLITE_PATH, HISTORY_SPILL_PATH,
+    HISTORY_QUEUE_MAX, HISTORY_BATCH_SIZE, HISTORY_FLUSH_SECONDS, HISTORY_MAX_RETRIES,
+    OUTBREAK_TABLE, OUTBREAK_CELL_PRECISION, OUTBREAK_COARSE_PRECISION,
+)
+from app.core.metrics import HISTORY_QUEUE_DEPTH, record_history
+from app.services import geohash
+
+logger = logging.getLogger("phyto.history")
+
+COLUMNS = (
+    "image_hash", "label", "model_used", "confidence", "severity", "lat", "lon", "geohash",
+    "commodity", "impact_pct", "loss_per_unit", "created_at",
+)
+
+
+def make_record(
+    image_hash: str, label: str, model_used: str, confidence: float, severity: float,
+    lat: float | None, lon: float | None, commodity: str, impact_pct: float, loss_per_unit: float,
+) -> dict:
+    """lat/lon are what the client sent (None, not the Bhopal default, when absent)."""
+    return {
+        "image_hash": image_hash,
+        "label": label,
+        "model_used": model_used,
+        "confidence": round(float(confidence), 4),
+        "severity": round(float(severity), 2),
+        "lat": lat,
+        "lon": lon,
+        "geohash": geohash.encode(lat, lon) if lat is not None and lon is not None else None,
+        "commodity": commodity,
+        "impact_pct": round(float(impact_pct), 1),
+        "loss_per_unit": round(float(loss_per_unit), 0),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+    }
+
+
+# ── Sinks ──────────────────────────────────────────────
+class HistorySink:
+    """Bulk writer; `insert_many` runs in a worker thread and raises on failure."""
+
+    name = ""
+
+    def insert_many(self, records: list[dict]):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+def ensure_sqlite_schema(conn: sqlite3.Connection, table: str = HISTORY_TABLE):
+    """History table plus the outbreak aggregate and the trigger that keeps it in step."""
+    with conn:
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, image_hash TEXT, label TEXT, model_used TEXT, "
+            "confidence REAL, severity REAL, lat REAL, lon REAL, geohash TEXT, commodity TEXT, "
+            "impact_pct REAL, loss_per_unit REAL, created_at TEXT NOT NULL)"
+        )
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_created_at ON {table} (created_at)")
+        if "geohash" not in {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN geohash TEXT")
+        levels = ((OUTBREAK_TABLE, OUTBREAK_CELL_PRECISION), (f"{OUTBREAK_TABLE}_coarse", OUTBREAK_COARSE_PRECISION))
+        upserts = []
+        for aggregate, precision in levels:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {aggregate} ("
+                "cell TEXT NOT NULL, day TEXT NOT NULL, label TEXT NOT NULL, cases INTEGER NOT NULL DEFAULT 0, "
+                "severity_sum REAL NOT NULL DEFAULT 0, loss_sum REAL NOT NULL DEFAULT 0, "
+                "PRIMARY KEY (cell, day, label)) WITHOUT ROWID"
+            )
+            # created_at is ISO-8601 UTC, so its first 10 characters are the UTC day
+            upserts.append(
+                f"INSERT INTO {aggregate} (cell, day, label, cases, severity_sum, loss_sum) "
+                f"VALUES (substr(NEW.geohash, 1, {precision}), substr(NEW.created_at, 1, 10), NEW.label, 1, "
+                "coalesce(NEW.severity, 0), coalesce(NEW.loss_per_unit, 0)) "
+                "ON CONFLICT (cell, day, label) DO UPDATE SET cases = cases + 1, "
+                "severity_sum = severity_sum + excluded.severity_sum, loss_sum = loss_sum + excluded.loss_sum;"
+            )
+        conn.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_outbreak AFTER INSERT ON {table} "
+            f"WHEN NEW.geohash IS NOT NULL BEGIN {' '.join(upserts)} END"
+        )
+
+
+class SQLiteSink(HistorySink):
+    name = "sqlite"
+
+    def __init__(self, path: Path = HISTORY_SQLITE_PATH, table: str = HISTORY_TABLE):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.table = table
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            ensure_sqlite_schema(self._conn, table)
+        self._insert = (
+            f"INSERT INTO {table} ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+        )
+
+    def insert_many(self, records: list[dict]):
+        # .get: records spilled by an older version may lack newer columns
+        rows = [tuple(r.get(c) for c in COLUMNS) for r in records]
+        with self._lock, self._conn:
+            self._conn.executemany(self._insert, rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SupabaseSink(HistorySink):
+    name = "supabase"
+
+    def __init__(self, table: str = HISTORY_TABLE):
+        from app.core.config import get_supabase
+        client = get_supabase()
+        # The outbreak trigger cuts cells server-side; if its precisions have
+        # drifted from the config, the aggregates the read side queries are
+        # wrong. Fail the open (records spill and replay once fixed).
+        row = client.rpc("outbreak_precisions", {}).execute().data
+        row = row[0] if isinstance(row, list) else row
+        remote = (row["cell"], row["coarse"])
+        if remote != (OUTBREAK_CELL_PRECISION, OUTBREAK_COARSE_PRECISION):
+            raise RuntimeError(
+                f"outbreak_precisions() is {remote} but the config says "
+                f"{(OUTBREAK_CELL_PRECISION, OUTBREAK_COARSE_PRECISION)}; see sql/diagnosis_history.postgres.sql"
+            )
+        self._table = client.table(table)
+
+    def insert_many(self, records: list[dict]):
+        # One PostgREST request per batch (a multi-row INSERT)
+        self._table.insert(records, returning="minimal").execute()
+
+
+_SINKS: dict[str, Callable[[], HistorySink]] = {
+    "sqlite": SQLiteSink,
+    "supabase": SupabaseSink,
+}
+
+
+def register_sink(name: str, factory: Callable[[], HistorySink]):
+    """Make a sink selectable through HISTORY_BACKEND."""
+    _SINKS[name] = factory
+
+
+# ── Disk spill ─────────────────────────────────────────
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SpillFile:
+    """Append-only JSONL overflow shared by every worker; `take()` hands the current contents to a replay."""
+
+    def __init__(self, path: Path = HISTORY_SPILL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive across threads and, through flock, across worker processes."""
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if fcntl is None:
+                yield
+                return
+            with open(self.path.with_name(self.path.name + ".lock"), "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def append(self, records: list[dict]):
+        lines = "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in records)
+        with self._locked():
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+
+    def take(self) -> list[dict]:
+        """Read and remove the spilled records (re-append what fails to replay)."""
+        prefix = self.path.name + ".replaying."
+        with self._locked():
+            # Copies left behind by a worker that died mid-replay are picked up too
+            claimed = []
+            for p in self.path.parent.glob(prefix + "*"):
+                pid = p.name[len(prefix):].partition("-")[0]
+                if pid.isdigit() and not _pid_alive(int(pid)):
+                    claimed.append(p)
+            if self.path.exists():
+                replaying = self.path.with_name(f"{prefix}{os.getpid()}-{time.time_ns()}")
+                os.replace(self.path, replaying)
+                claimed.append(replaying)
+        records = []
+        for replaying in claimed:
+            with open(replaying, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue   # torn write from a crash mid-append
+            replaying.unlink()
+        return records
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+
+class SpillThread:
+    """Appends request-path overflow to a SpillFile off the event loop, in arrival order."""
+
+    def __init__(self, spill: SpillFile, max_pending: int = HISTORY_QUEUE_MAX):
+        self.spill = spill
+        self._pending: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+
+    def offer(self, record: dict) -> bool:
+        """Never blocks; False when the backlog is full."""
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="phyto-history-spill", daemon=True)
+                    self._thread.start()
+        try:
+            self._pending.put_nowait(record)
+        except queue.Full:
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            batch = [self._pending.get()]
+            while len(batch) < HISTORY_BATCH_SIZE:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.spill.append(batch)
+                record_history("spilled", len(batch))
+            except OSError as e:
+                logger.error("Could not spill %d record(s): %s", len(batch), e)
+                record_history("dropped", len(batch))
+
+
+# ── Writer ─────────────────────────────────────────────
+class HistoryWriter:
+    def __init__(
+        self, sink: HistorySink, spill: SpillFile | None = None, queue_max: int = HISTORY_QUEUE_MAX,
+        batch_size: int = HISTORY_BATCH_SIZE, flush_seconds: float = HISTORY_FLUSH_SECONDS,
+        max_retries: int = HISTORY_MAX_RETRIES,
+    ):
+        self.sink = sink
+        self.spill = spill or SpillFile()
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_retries = max_retries
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_max)
+        self._task: asyncio.Task | None = None
+
+    def offer(self, record: dict) -> bool:
+        try:
+            self.queue.put_nowait(record)
+        except asyncio.QueueFull:
+            return False
+        HISTORY_QUEUE_DEPTH.set(value=self.queue.qsize())
+        return True
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run(), name="phyto-history-writer")
+
+    async def stop(self):
+        """Cancel the loop, then flush whatever is still queued (spilling it if the sink is down)."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        batch = []
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        if batch:
+            await self._flush(batch, retries=1)
+        await asyncio.to_thread(self.sink.close)
+
+    async def _run(self):
+        await self._replay()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                # Take what's already queued without waiting, then wait out the flush window
+                while len(batch) < self.batch_size and not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                remaining = deadline - time.monotonic()
+                if len(batch) >= self.batch_size or remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            HISTORY_QUEUE_DEPTH.set(value=self.queue.qsize())
+            if await self._flush(batch) and self.spill.exists():
+                await self._replay()
+
+    async def _flush(self, batch: list[dict], retries: int | None = None) -> bool:
+        retries = self.max_retries if retries is None else retries
+        delay = 0.5
+        for attempt in range(1, retries + 1):
+            try:
+                await asyncio.to_thread(self.sink.insert_many, batch)
+                record_history("written", len(batch))
+                return True
+            except Exception as e:
+                logger.warning("%s insert of %d failed (attempt %d/%d): %s", self.sink.name, len(batch), attempt, retries, e)
+                if attempt < retries:
+                    await asyncio.sleep(delay)
+                    delay *= 2
+        await asyncio.to_thread(self.spill.append, batch)
+        record_history("spilled", len(batch))
+        return False
+
+    async def _replay(self):
+        records = await asyncio.to_thread(self.spill.take)
+        if not records:
+            return
+        logger.info("Replaying %d spilled record(s)", len(records))
+        for i in range(0, len(records), self.batch_size):
+            chunk = records[i:i + self.batch_size]
+            if not await self._flush(chunk):
+                # Sink is down again: _flush spilled this chunk, keep the rest for later too
+                rest = records[i + self.batch_size:]
+                if rest:
+                    await asyncio.to_thread(self.spill.append, rest)
+                    record_history("spilled", len(rest))
+                return
+            record_history("replayed", len(chunk))
+
+
+_writer: HistoryWriter | None = None
+_opener: asyncio.Task | None = None      # retries a sink that failed to open
+SINK_REOPEN_MIN_SECONDS = 5.0
+SINK_REOPEN_MAX_SECONDS = 300.0
+_spill = SpillFile()
+_spiller = SpillThread(_spill)
+
+
+def record(rec: dict):
+    """Request-path entry point: enqueue, or hand to the spill thread if the writer can't take it."""
+    if HISTORY_BACKEND == "off":
+        return
+    if _writer is not None and _writer.offer(rec):
+        return
+    if not _spiller.offer(rec):
+        record_history("dropped")
+
+
+async def start():
+    """Open the sink and start the writer task (called from the app lifespan)."""
+    global _opener
+    if HISTORY_BACKEND == "off" or _writer is not None or _opener is not None:
+        return
+    factory = _SINKS.get(HISTORY_BACKEND)
+    if factory is None:
+        logger.error("Unknown backend %r — history goes to the spill file only.", HISTORY_BACKEND)
+        return
+    if not await _open(factory):
+        # Keep trying in the background; records spill to disk (and replay) meanwhile
+        _opener = asyncio.get_running_loop().create_task(_reopen(factory), name="phyto-history-open")
+
+
+async def _open(factory: Callable[[], HistorySink]) -> bool:
+    global _writer
+    try:
+        sink = await asyncio.to_thread(factory)
+    except Exception as e:
+        logger.error("Could not open %r sink: %s — spilling history to disk until it opens.", HISTORY_BACKEND, e)
+        return False
+    _writer = HistoryWriter(sink, spill=_spill)
+    _writer.start()
+    logger.info("Writing diagnosis history to %s (batch %d, every %gs)", sink.name, _writer.batch_size, _writer.flush_seconds)
+    return True
+
+
+async def _reopen(factory: Callable[[], HistorySink]):
+    global _opener
+    delay = SINK_REOPEN_MIN_SECONDS
+    while True:
+        await asyncio.sleep(delay)
+        if await _open(factory):
+            _opener = None
+            return
+        delay = min(delay * 2, SINK_REOPEN_MAX_SECONDS)
+
+
+async def stop():
+    global _writer, _opener
+    if _opener is not None:
+        _opener.cancel()
+        _opener = None
+    if _writer is not None:
+        writer, _writer = _writer, None
+        await writer.stop()
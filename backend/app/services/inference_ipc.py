@@ -0,0 +1,206 @@
+"""
+Phyto — API-worker side of the shared inference server.
+
+Each API worker owns one shared-memory ring of fixed-size slots, one per
+in-flight request. The preprocessed image is written straight into a slot
+as float32 HWC (channels_last) and the server reads it in place, so pixel data never goes through
+the socket. Only small control messages and logits are sent over the
+(authenticated, Unix-domain, owner-only) multiprocessing connection:
+
+    worker -> server   ("attach", shm_name, slot_bytes, slots)     once per connection
+                       ("ping", req_id)
+                       ("infer", req_id, slot, model_key, shape, quantized)
+    server -> worker   (req_id, "ok" | "demo" | "error", payload)
+"""
+
+import atexit
+import itertools
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from app.core.config import (
+    INFERENCE_SOCKET, INFERENCE_AUTHKEY, INFERENCE_RING_SLOTS, INFERENCE_CONNECT_TIMEOUT,
+    IMAGE_SIZE_GENERIC, IMAGE_SIZE_CUSTOM,
+)
+
+logger = logging.getLogger("phyto.inference")
+
+# Largest input any model takes: float32 HWC at the biggest image size
+SLOT_BYTES = 3 * max(IMAGE_SIZE_GENERIC, IMAGE_SIZE_CUSTOM) ** 2 * 4
+REQUEST_TIMEOUT_SECONDS = 30.0
+
+
+def slot_view(buf, slot: int, slot_bytes: int, shape) -> np.ndarray:
+    """float32 view of one slot of a ring buffer — no copy."""
+    return np.ndarray(tuple(shape), dtype=np.float32, buffer=buf, offset=slot * slot_bytes)
+
+
+def authkey_path(address: str) -> str:
+    return address + ".key"
+
+
+def server_authkey(address: str) -> bytes:
+    """INFERENCE_AUTHKEY, or a fresh random key written owner-only next to the socket."""
+    if INFERENCE_AUTHKEY:
+        return INFERENCE_AUTHKEY
+    key = secrets.token_hex(32).encode()
+    path = authkey_path(address)
+    if os.path.exists(path):
+        os.unlink(path)
+    # O_EXCL: refuse a file someone else slipped in between unlink and create
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+def client_authkey(address: str) -> bytes:
+    """INFERENCE_AUTHKEY, or the key the running server wrote (FileNotFoundError until it has)."""
+    if INFERENCE_AUTHKEY:
+        return INFERENCE_AUTHKEY
+    with open(authkey_path(address), "rb") as f:
+        return f.read()
+
+
+def attach_ring(name: str) -> SharedMemory:
+    """Open a ring created by another process without adopting its cleanup."""
+    shm = SharedMemory(name=name)
+    # Python < 3.13 registers attached segments too, and would unlink the
+    # worker's ring when this process exits.
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class InferenceClient:
+    """Thread-safe; connects (and reconnects) lazily to the node's inference server."""
+
+    def __init__(self, address: str = INFERENCE_SOCKET, slots: int = INFERENCE_RING_SLOTS):
+        self.address = address
+        self.slots = slots
+        self._ring: SharedMemory | None = None
+        self._conn = None
+        self._connect_lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._free = deque(range(slots))
+        self._free_cond = threading.Condition()
+        # slot -> future of a timed-out request the server may still be reading it for
+        self._quarantined: dict[int, Future] = {}
+        self._pending: dict[int, Future] = {}
+        self._ids = itertools.count()
+
+    # ── connection ─────────────────────────────────────
+    def _ensure_connected(self):
+        with self._connect_lock:
+            if self._conn is not None:
+                return
+            if self._ring is None:
+                self._ring = SharedMemory(create=True, size=self.slots * SLOT_BYTES)
+                atexit.register(self._ring.unlink)
+
+            deadline = time.monotonic() + INFERENCE_CONNECT_TIMEOUT
+            while True:
+                try:
+                    conn = Client(self.address, family="AF_UNIX", authkey=client_authkey(self.address))
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    if time.monotonic() > deadline:
+                        raise ConnectionError(f"Inference server not reachable at {self.address}")
+                    time.sleep(0.5)
+
+            conn.send(("attach", self._ring.name, SLOT_BYTES, self.slots))
+            self._conn = conn
+            threading.Thread(target=self._receive, args=(conn,), name="phyto-inference-rx", daemon=True).start()
+            logger.info("Connected to %s (ring %s, %d slots)", self.address, self._ring.name, self.slots)
+
+    def _receive(self, conn):
+        try:
+            while True:
+                req_id, status, payload = conn.recv()
+                future = self._pending.pop(req_id, None)
+                if future is None:
+                    continue
+                if status == "error":
+                    future.set_exception(RuntimeError(f"Inference server error: {payload}"))
+                else:
+                    future.set_result((status, payload))
+        except (EOFError, OSError) as e:
+            logger.error("Connection to inference server lost: %s", e)
+        finally:
+            with self._connect_lock:
+                if self._conn is conn:
+                    self._conn = None
+            for req_id in list(self._pending):
+                future = self._pending.pop(req_id, None)
+                if future is not None:
+                    future.set_exception(ConnectionError("Inference server connection lost"))
+
+    def _submit(self, *message) -> Future:
+        self._ensure_connected()
+        req_id = next(self._ids)
+        future = Future()
+        self._pending[req_id] = future
+        try:
+            with self._send_lock:
+                self._conn.send((message[0], req_id, *message[1:]))
+        except (OSError, AttributeError) as e:
+            self._pending.pop(req_id, None)
+            raise ConnectionError(f"Inference server connection lost: {e}") from e
+        return future
+
+    def _request(self, *message):
+        return self._submit(*message).result(timeout=REQUEST_TIMEOUT_SECONDS)
+
+    # ── public ─────────────────────────────────────────
+    def ping(self) -> list[str]:
+        """Model keys the server holds (blocks until it is reachable)."""
+        _, keys = self._request("ping")
+        return keys
+
+    @contextmanager
+    def slot(self, shape):
+        """Borrow a ring slot; yields (slot index, float32 array of `shape` backed by shared memory)."""
+        self._ensure_connected()
+        with self._free_cond:
+            while not self._free:
+                self._free_cond.wait()
+            slot = self._free.popleft()
+        try:
+            yield slot, slot_view(self._ring.buf, slot, SLOT_BYTES, shape)
+        finally:
+            with self._free_cond:
+                late = self._quarantined.pop(slot, None)
+            if late is None:
+                self._release(slot)
+            else:
+                # Back in the ring only once the server has answered (or the connection is gone)
+                late.add_done_callback(lambda _: self._release(slot))
+
+    def _release(self, slot: int):
+        with self._free_cond:
+            self._free.append(slot)
+            self._free_cond.notify()
+
+    def infer(self, slot: int, model_key: str, shape, quantized: bool = False) -> np.ndarray | None:
+        """
+        Logits for the pixels in `slot`, or None if the server runs `model_key`
+        in DEMO mode. `quantized` asks for the int8-Linear copy (QoS level 2+).
+        """
+        future = self._submit("infer", slot, model_key, tuple(shape), bool(quantized))
+        try:
+            status, logits = future.result(timeout=REQUEST_TIMEOUT_SECONDS)
+        except FutureTimeout:
+            with self._free_cond:
+                self._quarantined[slot] = future
+            raise
+        return None if status == "demo" else logits
@@ -0,0 +1,205 @@
+"""
+Phyto — shared inference server (one per node).
+
+Holds every model once and serves all API workers on the node, so memory
+stays flat as --workers grows and concurrent requests from different
+workers can share a forward pass. Workers run with INFERENCE_MODE=server;
+see app/services/inference_ipc.py for the wire protocol.
+
+Usage (from backend/):
+    python -m app.services.inference_server [--models general,wheat] [--threads 4]
+"""
+
+import argparse
+import logging
+import os
+import queue
+import threading
+import time
+from multiprocessing.connection import Listener
+
+import torch
+
+from app.core.config import (
+    INFERENCE_SOCKET, INFERENCE_MAX_BATCH, INFERENCE_BATCH_WAIT_MS, INFERENCE_SERVER_THREADS,
+    QOS_QUANTIZE_MODELS,
+)
+from app.services.inference_ipc import attach_ring, server_authkey, slot_view
+from app.services.ml_service import MODEL_KEYS, ModelManager, _quantize_linear
+
+logger = logging.getLogger("phyto.inference_server")
+
+
+class _Session:
+    """One connected API worker: its connection and its shared-memory ring."""
+
+    def __init__(self, conn, ring_name: str, slot_bytes: int):
+        self.conn = conn
+        self.ring = attach_ring(ring_name)
+        self.slot_bytes = slot_bytes
+        self.send_lock = threading.Lock()
+
+    def tensor(self, slot: int, shape) -> torch.Tensor:
+        """(3, H, W) channels_last view of an HWC slot — no copy."""
+        return torch.from_numpy(slot_view(self.ring.buf, slot, self.slot_bytes, shape)).permute(2, 0, 1)
+
+    def reply(self, req_id: int, status: str, payload=None):
+        try:
+            with self.send_lock:
+                self.conn.send((req_id, status, payload))
+        except OSError:
+            pass  # worker went away; its requests are dropped
+
+
+class InferenceServer:
+    def __init__(self, model_keys=MODEL_KEYS):
+        manager = ModelManager()
+        self.device = manager.device
+        self.models = {}
+        self.preprocessors = {}
+        for key in model_keys:
+            try:
+                self.models[key], path, _, self.preprocessors[key] = manager._load_weights(key)
+                logger.info("Loaded %r from %s", key, path)
+            except FileNotFoundError as e:
+                self.models[key] = None
+                logger.warning("%s not found — %r runs in DEMO mode", e.filename, key)
+        self.quantized = {}       # int8-Linear copies for QoS level 2+, built on first request
+        self.queue: queue.Queue = queue.Queue()
+        self.batches = 0
+        self.requests = 0
+
+    # ── batching ───────────────────────────────────────
+    def _next_batch(self) -> list:
+        """Block for one request, then gather whatever else arrives within the batch window."""
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + INFERENCE_BATCH_WAIT_MS / 1000
+        while len(batch) < INFERENCE_MAX_BATCH:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run_batches(self):
+        while True:
+            # Only requests for the same model, precision and input size can share a forward pass
+            groups: dict[tuple, list] = {}
+            for item in self._next_batch():
+                _, _, _, model_key, shape, quantized = item
+                groups.setdefault((model_key, quantized, shape), []).append(item)
+            for (model_key, quantized, _), items in groups.items():
+                self._forward(model_key, items, quantized)
+
+    def _model(self, model_key: str, quantized: bool):
+        model = self.models.get(model_key)
+        if model is None or not quantized or model_key not in QOS_QUANTIZE_MODELS or self.device.type != "cpu":
+            return model
+        if model_key not in self.quantized:
+            try:
+                self.quantized[model_key], extra = _quantize_linear(model)
+                logger.info("Quantized %r: +%.0f MB of int8 Linear weights", model_key, extra / 2**20)
+            except (RuntimeError, AssertionError) as e:   # no quantized engine on this CPU
+                logger.warning("Cannot quantize %r (%s) — serving float weights", model_key, e)
+                self.quantized[model_key] = model
+        return self.quantized[model_key]
+
+    def _forward(self, model_key: str, items: list, quantized: bool = False):
+        model = self._model(model_key, quantized)
+        if model is None:
+            for session, req_id, *_ in items:
+                session.reply(req_id, "demo")
+            return
+        try:
+            # A single request is fed straight from shared memory; a batch is
+            # gathered into the preprocessor's reusable channels_last buffer
+            # (or stacked, for QoS-reduced inputs)
+            tensors = [session.tensor(slot, shape) for session, _, slot, _, shape, _ in items]
+            size = self.preprocessors[model_key].size
+            if len(tensors) == 1:
+                batch = tensors[0].unsqueeze(0)
+            elif tensors[0].shape[1:] == (size, size):
+                batch = self.preprocessors[model_key].buffer(len(tensors))
+                for row, tensor in zip(batch, tensors):
+                    row.copy_(tensor)
+            else:
+                batch = torch.stack(tensors).contiguous(memory_format=torch.channels_last)
+            with torch.inference_mode():
+                logits = model(batch.to(self.device)).float().cpu().numpy()
+        except Exception as e:
+            for session, req_id, *_ in items:
+                session.reply(req_id, "error", str(e))
+            return
+        self.batches += 1
+        self.requests += len(items)
+        for (session, req_id, *_), row in zip(items, logits):
+            session.reply(req_id, "ok", row)
+
+    # ── connections ────────────────────────────────────
+    def _serve_connection(self, conn):
+        try:
+            kind, ring_name, slot_bytes, _slots = conn.recv()
+            if kind != "attach":
+                raise ValueError(f"expected attach, got {kind!r}")
+            session = _Session(conn, ring_name, slot_bytes)
+            logger.info("Worker attached (ring %s)", ring_name)
+            while True:
+                kind, req_id, *args = conn.recv()
+                if kind == "ping":
+                    session.reply(req_id, "ok", [k for k, m in self.models.items() if m is not None])
+                elif kind == "infer":
+                    slot, model_key, shape, *rest = args    # older workers don't send `quantized`
+                    self.queue.put((session, req_id, slot, model_key, tuple(shape), bool(rest and rest[0])))
+                else:
+                    session.reply(req_id, "error", f"unknown message {kind!r}")
+        except (EOFError, OSError):
+            pass
+        except Exception as e:
+            logger.warning("Dropping connection: %s", e)
+        finally:
+            conn.close()
+
+    def serve(self, address: str = INFERENCE_SOCKET):
+        if os.path.exists(address):
+            os.unlink(address)  # stale socket from a previous run
+        authkey = server_authkey(address)
+        # Owner-only socket: bind it under a umask instead of chmod-ing it afterwards
+        umask = os.umask(0o177)
+        try:
+            listener = Listener(address, family="AF_UNIX", authkey=authkey)
+        finally:
+            os.umask(umask)
+        threading.Thread(target=self._run_batches, name="phyto-inference-batcher", daemon=True).start()
+        logger.info("Listening on %s (max batch %d, window %g ms)", address, INFERENCE_MAX_BATCH, INFERENCE_BATCH_WAIT_MS)
+        try:
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:   # failed auth handshake etc.
+                    logger.warning("Rejected connection: %s", e)
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        finally:
+            listener.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared inference server for all API workers on this node")
+    parser.add_argument("--socket", default=INFERENCE_SOCKET, help="Unix socket path")
+    parser.add_argument("--models", default=",".join(MODEL_KEYS), help="Comma-separated model keys to hold")
+    parser.add_argument("--threads", type=int, default=INFERENCE_SERVER_THREADS,
+                        help="torch.set_num_threads (default: INFERENCE_SERVER_THREADS / tuning file)")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    server = InferenceServer([k.strip() for k in args.models.split(",") if k.strip()])
+    try:
+        server.serve(args.socket)
+    except KeyboardInterrupt:
+        logger.info("Stopped after %d requests in %d forward passes", server.requests, server.batches)
+
+
+if __name__ == "__main__":
+    main()
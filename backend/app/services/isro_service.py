@@ -10,19 +10,21 @@ try:
 except ImportError:
     SHAPELY_AVAILABLE = False
 
-from app.core.config import BHUVAN_API_KEY, BHOONIDHI_API_KEY
+from app.core.config import BHUVAN_API_KEY, BHOONIDHI_API_KEY, BHUVAN_WFS_BASE, BHOONIDHI_STAC_BASE
+from app.core import qos
+from app.core.circuit import get_breaker
+from app.core.metrics import timed_stage, record_upstream
+from app.services.edge_bundle import get_bundle, offline
 
 # ── Constants ──────────────────────────────────────────────
 BHUVAN_WFS_URL = (
-    "https://bhuvan-app3.nrsc.gov.in/bhuvan/wfs"
+    f"{BHUVAN_WFS_BASE}"
     "?service=WFS&version=1.0.0"
     "&request=GetFeature"
     "&typeName=waterbody:india_waterbody"
     "&outputFormat=application/json"
 )
 
-BHOONIDHI_STAC_BASE = "https://bhoonidhi.nrsc.gov.in/bhoonidhi-api/stac/v1"
-
 # Bhopal Bhojtal bounding box for initial WFS filter
 BHOJTAL_BBOX = "77.35,23.22,77.45,23.28"
 
@@ -30,112 +32,223 @@ BUFFER_KM = 2.0
 BUFFER_DEG = BUFFER_KM / 111.0  # ~0.018 degrees
 
 
+# EOS-04 Soil Wetness Index bands
+SWI_LOW_MAX = 0.3
+SWI_MODERATE_MAX = 0.6
+RISK_AMPLIFIERS = {"LOW": 1.0, "MODERATE": 1.3, "HIGH": 1.6}
+SWI_LOOKBACK_DAYS = 30
+
+
+def swi_level(swi: float) -> tuple[str, float]:
+    """(saturation level, risk amplifier) for an SWI value."""
+    level = "LOW" if swi < SWI_LOW_MAX else "MODERATE" if swi <= SWI_MODERATE_MAX else "HIGH"
+    return level, RISK_AMPLIFIERS[level]
+
+
+def wetland_name(feature: dict) -> str:
+    props = feature.get("properties", {})
+    return props.get("name") or props.get("NAME") or "Bhoj Wetland (Bhojtal)"
+
+
+def in_bhojtal_box(lat, lon):
+    """Simulation rule: Bhojtal is roughly between Lat 23.23-23.28 and Lon 77.30-77.40 (works on arrays too)."""
+    return (23.20 <= lat) & (lat <= 23.30) & (77.30 <= lon) & (lon <= 77.45)
+
+
+async def fetch_waterbodies(client: httpx.AsyncClient, bbox: str) -> list[dict] | None:
+    """Bhuvan WFS waterbody features in `bbox` ("minlon,minlat,maxlon,maxlat"); None on failure."""
+    headers = {"Authorization": f"Bearer {BHUVAN_API_KEY}"}
+    resp = await client.get(f"{BHUVAN_WFS_URL}&bbox={bbox}", headers=headers)
+    if resp.status_code != 200:
+        return None
+    return resp.json().get("features", [])
+
+
+async def fetch_swi_items(client: httpx.AsyncClient, bbox: str, limit: int = 5) -> list[dict] | None:
+    """Bhoonidhi EOS-04 SWI scenes over `bbox` from the last SWI_LOOKBACK_DAYS days; None on failure."""
+    end_date = datetime.utcnow()
+    start_date = end_date - timedelta(days=SWI_LOOKBACK_DAYS)
+    dt_range = f"{start_date.strftime('%Y-%m-%dT00:00:00Z')}/{end_date.strftime('%Y-%m-%dT23:59:59Z')}"
+
+    url = f"{BHOONIDHI_STAC_BASE}/collections/EOS04_SWI/items"
+    params = {"bbox": bbox, "datetime": dt_range, "limit": limit}
+    headers = {"Authorization": f"Bearer {BHOONIDHI_API_KEY}"}
+    resp = await client.get(url, params=params, headers=headers)
+    if resp.status_code != 200:
+        return None
+    return resp.json().get("features", [])
+
+
+def item_swi(item: dict) -> float | None:
+    props = item.get("properties", {})
+    swi = props.get("swi") or props.get("SWI")
+    return float(swi) if swi is not None else None
+
+
+# ── Offline fallbacks ──────────────────────────────────────
+def _offline_wetland(lat: float, lon: float) -> dict:
+    """Waterbodies from the edge bundle if it has them, else the Bhojtal simulation."""
+    bundle = get_bundle()
+    if bundle is not None and bundle.has_waterbodies:
+        zone = bundle.wetland_zone(lat, lon)
+    else:
+        # Realistic Simulation logic for Bhopal region
+        zone = "Bhoj Wetland (Bhojtal)" if in_bhojtal_box(lat, lon) else None
+    return {
+        "in_wetland_zone": zone is not None,
+        "high_fungal_risk": zone is not None,
+        "zone_name": zone,
+    }
+
+
+def _offline_soil_moisture(lat: float, lon: float) -> dict:
+    """SWI from the edge bundle's grid if it covers the point, else the seasonal estimate."""
+    bundle = get_bundle()
+    swi = bundle.swi(lat, lon) if bundle is not None else None
+    if swi is not None:
+        level, amp = swi_level(swi)
+        return {"swi_value": round(swi, 3), "saturation_level": level, "risk_amplifier": amp}
+
+    # Research-backed fallback for late March in Bhopal (Dry season)
+    # Average SWI: 0.28 - 0.34
+    swi_sim = random.uniform(0.28, 0.34)
+    return {
+        "swi_value": round(swi_sim, 3),
+        "saturation_level": "LOW",
+        "risk_amplifier": 1.0,
+    }
+
+
 # ── Bhuvan Wetland Alert ───────────────────────────────────
+def find_wetland_zone(features: list[dict], lat: float, lon: float) -> str | None:
+    """Name of the first waterbody feature whose 2km buffer contains the point."""
+    point = Point(lon, lat)
+
+    for feature in features:
+        geom = shape(feature["geometry"])
+        buffered = geom.buffer(BUFFER_DEG)
+
+        if buffered.contains(point):
+            return wetland_name(feature)
+    return None
+
+
+@timed_stage("bhuvan")
 async def get_bhuvan_wetland_alert(lat: float, lon: float) -> dict:
     """
     Check if coordinates fall within 2km of the Bhoj Wetland.
-    Falls back to a proximity simulation for Bhopal/Sehore coordinates.
+    Falls back to the edge bundle's waterbodies, or a proximity simulation
+    for Bhopal/Sehore coordinates.
     """
-    # Realistic Simulation logic for Bhopal region
-    # Bhojtal is roughly between Lat 23.23-23.28 and Lon 77.30-77.40
-    is_near_bhojtal = (23.20 <= lat <= 23.30) and (77.30 <= lon <= 77.45)
-    
-    fallback = {
-        "in_wetland_zone": is_near_bhojtal,
-        "high_fungal_risk": is_near_bhojtal,
-        "zone_name": "Bhoj Wetland (Bhojtal)" if is_near_bhojtal else None,
-    }
+    fallback = _offline_wetland(lat, lon)
+
+    if offline():
+        record_upstream("bhuvan", "offline")
+        return fallback
+
+    # Under load (QoS level 1+) only local data is served
+    if not qos.current().live_upstreams:
+        record_upstream("bhuvan", "shed")
+        return fallback
 
     if not SHAPELY_AVAILABLE or not BHUVAN_API_KEY:
+        record_upstream("bhuvan", "fallback")
         return fallback
 
-    try:
-        headers = {"Authorization": f"Bearer {BHUVAN_API_KEY}"}
-        url = f"{BHUVAN_WFS_URL}&bbox={BHOJTAL_BBOX}"
+    breaker = get_breaker("bhuvan")
+    if not breaker.allow():
+        record_upstream("bhuvan", "short_circuit")
+        return fallback
 
+    # Only the call itself trips the breaker; a bad geometry in an answer
+    # that did arrive is our problem, not an upstream outage
+    try:
         async with httpx.AsyncClient(timeout=8.0) as client:
-            resp = await client.get(url, headers=headers)
-            if resp.status_code != 200:
-                return fallback
-            data = resp.json()
-
-        point = Point(lon, lat)
-        features = data.get("features", [])
-
-        for feature in features:
-            geom = shape(feature["geometry"])
-            buffered = geom.buffer(BUFFER_DEG)
-
-            if buffered.contains(point):
-                name = (
-                    feature.get("properties", {}).get("name")
-                    or feature.get("properties", {}).get("NAME")
-                    or "Bhoj Wetland (Bhojtal)"
-                )
-                return {
-                    "in_wetland_zone": True,
-                    "high_fungal_risk": True,
-                    "zone_name": name,
-                }
-
+            features = await fetch_waterbodies(client, BHOJTAL_BBOX)
+    except Exception:
+        features = None
+    if features is None:
+        breaker.failure()
+        record_upstream("bhuvan", "error")
         return fallback
+    breaker.success()
 
+    try:
+        name = find_wetland_zone(features, lat, lon)
     except Exception:
+        record_upstream("bhuvan", "error")
         return fallback
+    record_upstream("bhuvan", "ok")
+    if name:
+        return {
+            "in_wetland_zone": True,
+            "high_fungal_risk": True,
+            "zone_name": name,
+        }
+
+    return fallback
 
 
 # ── Bhoonidhi Soil Moisture ────────────────────────────────
+@timed_stage("bhoonidhi")
 async def get_bhoonidhi_soil_moisture(lat: float, lon: float) -> dict:
     """
     Retrieve EOS-04 derived Soil Wetness Index (SWI).
-    Falls back to research-backed seasonal values for Bhopal in late March.
+    Falls back to the edge bundle's SWI grid, or research-backed seasonal
+    values for Bhopal in late March.
     """
-    # Research-backed fallback for late March in Bhopal (Dry season)
-    # Average SWI: 0.28 - 0.34
-    swi_sim = random.uniform(0.28, 0.34)
-    fallback = {
-        "swi_value": round(swi_sim, 3),
-        "saturation_level": "LOW",
-        "risk_amplifier": 1.0,
-    }
+    fallback = _offline_soil_moisture(lat, lon)
+
+    if offline():
+        record_upstream("bhoonidhi", "offline")
+        return fallback
+
+    if not qos.current().live_upstreams:
+        record_upstream("bhoonidhi", "shed")
+        return fallback
 
     if not BHOONIDHI_API_KEY:
+        record_upstream("bhoonidhi", "fallback")
         return fallback
 
+    breaker = get_breaker("bhoonidhi")
+    if not breaker.allow():
+        record_upstream("bhoonidhi", "short_circuit")
+        return fallback
+
+    # As for Bhuvan: only the call trips the breaker, not parsing its answer
     try:
         bbox = f"{lon - 0.005},{lat - 0.005},{lon + 0.005},{lat + 0.005}"
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=30)
-        dt_range = f"{start_date.strftime('%Y-%m-%dT00:00:00Z')}/{end_date.strftime('%Y-%m-%dT23:59:59Z')}"
-
-        url = f"{BHOONIDHI_STAC_BASE}/collections/EOS04_SWI/items"
-        params = {"bbox": bbox, "datetime": dt_range, "limit": 5}
-        headers = {"Authorization": f"Bearer {BHOONIDHI_API_KEY}"}
-
         async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.get(url, params=params, headers=headers)
-            if resp.status_code != 200:
-                return fallback
-            data = resp.json()
+            features = await fetch_swi_items(client, bbox)
+    except Exception:
+        features = None
+    if features is None:
+        breaker.failure()
+        record_upstream("bhoonidhi", "error")
+        return fallback
+    breaker.success()
 
-        features = data.get("features", [])
-        if not features:
-            return fallback
+    if not features:
+        record_upstream("bhoonidhi", "fallback")
+        return fallback
 
+    try:
         latest = max(features, key=lambda f: f.get("properties", {}).get("datetime", ""))
-        swi = latest.get("properties", {}).get("swi") or latest.get("properties", {}).get("SWI")
-        
+        swi = item_swi(latest)
         if swi is not None:
-            swi = float(swi)
-            level = "LOW" if swi < 0.3 else "MODERATE" if swi <= 0.6 else "HIGH"
-            amp = 1.0 if level == "LOW" else 1.3 if level == "MODERATE" else 1.6
-            return {"swi_value": swi, "saturation_level": level, "risk_amplifier": amp}
-
-        return fallback
-
+            level, amp = swi_level(swi)
     except Exception:
+        record_upstream("bhoonidhi", "error")
         return fallback
 
+    if swi is not None:
+        record_upstream("bhoonidhi", "ok")
+        return {"swi_value": swi, "saturation_level": level, "risk_amplifier": amp}
+
+    record_upstream("bhoonidhi", "fallback")
+    return fallback
+
 
 # ── Combined Environmental Context ────────────────────────
 async def get_environmental_context(lat: float, lon: float) -> dict:
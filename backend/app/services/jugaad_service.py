@@ -4,9 +4,13 @@ from jugaad_remedies.json (Kabaad-se-Jugaad module).
 """
 
 import json
+import logging
 from app.core.config import JUGAAD_REMEDIES_PATH
+from app.services.remedy_index import RemedyIndex
 
-_jugaad_remedies: dict = {}
+logger = logging.getLogger("phyto.jugaad_service")
+
+_index: RemedyIndex | None = None
 
 # Default fallback — Neem Kadha
 _DEFAULT_REMEDY = [
@@ -20,29 +24,43 @@ _DEFAULT_REMEDY = [
 ]
 
 
+def get_index() -> RemedyIndex:
+    """The remedy index, loaded on first use (or by the startup warmup)."""
+    if _index is None:
+        _load_jugaad_remedies()
+    return _index
+
+
 def _load_jugaad_remedies():
-    """Load jugaad remedy data from disk once."""
-    global _jugaad_remedies
+    """Load jugaad remedy data once (edge bundle if present, else the JSON file) and build the index."""
+    global _index
+    from app.services.edge_bundle import get_bundle
+
+    bundle = get_bundle()
+    table = bundle.table("jugaad_remedies") if bundle else None
+    if table is not None:
+        _index = RemedyIndex(table)
+        logger.info("Loaded jugaad remedies for %d disease classes from edge bundle %s.", len(_index), bundle.version)
+        return
+
+    index = RemedyIndex({})
     try:
         with open(JUGAAD_REMEDIES_PATH, "r", encoding="utf-8") as f:
-            _jugaad_remedies = json.load(f)
-        print(f"[jugaad_service] Loaded jugaad remedies for {len(_jugaad_remedies)} disease classes.")
+            index = RemedyIndex(json.load(f))
+        logger.info("Loaded jugaad remedies for %d disease classes.", len(index))
     except FileNotFoundError:
-        print(f"[jugaad_service] {JUGAAD_REMEDIES_PATH} not found — using defaults.")
+        logger.warning("%s not found — using defaults.", JUGAAD_REMEDIES_PATH)
     except Exception as e:
-        print(f"[jugaad_service] Error loading jugaad remedies: {e}")
-
-
-# Load at import time
-_load_jugaad_remedies()
+        logger.error("Error loading jugaad remedies: %s", e)
+    _index = index
 
 
-def get_jugaad_remedies(disease_class: str) -> list[dict]:
+def get_jugaad_remedies(disease_class: str, crop: str | None = None) -> list[dict]:
     """
     Return list of jugaad remedy dicts for the given disease class.
     Falls back to Neem Kadha if the class is not found.
     """
-    entry = _jugaad_remedies.get(disease_class)
-    if entry and "remedies" in entry:
-        return entry["remedies"]
+    record = get_index().resolve(disease_class, crop)
+    if record and "remedies" in record.data:
+        return record.data["remedies"]
     return list(_DEFAULT_REMEDY)
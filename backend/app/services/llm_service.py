@@ -7,14 +7,34 @@ with commercial and traditional remedies.
 Updated to use the new `google-genai` SDK (v1.0+).
 """
 
+import hashlib
 import json
+import logging
 from google import genai
 from google.genai import types
 
-from app.core.config import GEMINI_API_KEY
+from app.core.config import (
+    GEMINI_API_KEY, GEMINI_BASE_URL, ADVISORY_CORPUS_MIN_CONFIDENCE,
+)
+from app.core.circuit import get_breaker
+from app.core.metrics import timed_stage, record_cache, record_upstream
+from app.services.advisory_corpus import load_corpus
 
-# Initialize client
-client = genai.Client(api_key=GEMINI_API_KEY)
+logger = logging.getLogger("phyto.llm_service")
+
+_client: genai.Client | None = None
+
+
+def get_client() -> genai.Client:
+    """Gemini client, created on first use (raises if GEMINI_API_KEY is unset)."""
+    global _client
+    if _client is None:
+        http_options = types.HttpOptions(base_url=GEMINI_BASE_URL) if GEMINI_BASE_URL else None
+        _client = genai.Client(api_key=GEMINI_API_KEY, http_options=http_options)
+    return _client
+
+
+GEMINI_MODEL = "gemini-3-flash-preview"
 
 SYSTEM_INSTRUCTION = """You are Phyto AI, an empathetic and knowledgeable agricultural expert.
 A farmer has uploaded a photo of a diseased plant leaf. You receive the ML diagnosis results
@@ -68,32 +88,103 @@ Respond in valid JSON:
 Do NOT wrap the JSON in markdown code fences. Return ONLY the JSON object."""
 
 
-def generate_advisory(disease: str, confidence: float, severity: float) -> dict:
-    """Generate initial bilingual advisory from diagnosis results."""
-    prompt = (
-        f"Disease detected: {disease}\n"
-        f"Confidence: {confidence * 100:.1f}%\n"
-        f"Severity: {severity:.1f}% of leaf area affected\n\n"
-        "Provide your advisory."
+ADVISORY_PROMPT = (
+    "Disease detected: {disease}\n"
+    "{crop_line}"
+    "Confidence: {confidence:.1f}%\n"
+    "Severity: {severity:.1f}% of leaf area affected\n\n"
+    "Provide your advisory."
+)
+
+# Identifies the prompt/model a pregenerated corpus was built with
+PROMPT_VERSION = hashlib.sha256(f"{GEMINI_MODEL}\n{SYSTEM_INSTRUCTION}\n{ADVISORY_PROMPT}".encode()).hexdigest()[:16]
+
+_corpus = load_corpus(PROMPT_VERSION)
+
+
+def _instruction_config(instruction: str) -> types.GenerateContentConfig:
+    """
+    JSON-mode config with `instruction` sent inline. (The instructions are far
+    below Gemini's minimum size for context caching, so there is nothing to
+    cache.)
+    """
+    return types.GenerateContentConfig(
+        system_instruction=instruction,
+        response_mime_type="application/json",
     )
 
+
+def advisory_seed(disease: str, confidence: float, severity: float, advisory: dict) -> list[dict]:
+    """Initial chat history for follow-ups: the diagnosis context and the advisory reply."""
+    return [
+        {"role": "user", "content": f"Disease: {disease}, Confidence: {confidence * 100:.1f}%, Severity: {severity:.1f}%"},
+        {"role": "model", "content": json.dumps(advisory, ensure_ascii=False)},
+    ]
+
+
+@timed_stage("llm_advisory")
+def generate_advisory(disease: str, confidence: float, severity: float, model_key: str = "general") -> dict:
+    """
+    Return the bilingual advisory for a diagnosis — from the pregenerated
+    corpus when possible, otherwise live from Gemini.
+    """
+    if confidence >= ADVISORY_CORPUS_MIN_CONFIDENCE:
+        cached = _corpus.get(model_key, disease, severity)
+        record_cache("advisory_corpus", cached is not None)
+        if cached is not None:
+            logger.debug("Advisory for %s served from the corpus", disease)
+            return cached
+
+    breaker = get_breaker("gemini")
+    if not breaker.allow():
+        record_upstream("gemini", "short_circuit")
+        return _corpus.nearest(model_key, disease, severity) or _fallback_response(disease)
+
     try:
-        response = client.models.generate_content(
-            model="gemini-3-flash-preview",
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                system_instruction=SYSTEM_INSTRUCTION,
-                response_mime_type="application/json",  # Force JSON mode
-            ),
-        )
-        return json.loads(response.text)
+        advisory = generate_live_advisory(disease, confidence, severity, model_key)
+        breaker.success()
+        record_upstream("gemini", "ok")
+        return advisory
     except Exception as e:
-        print(f"[llm_service] Gemini error: {e}")
-        return _fallback_response(disease)
+        logger.warning("Gemini error: %s", e, extra={"upstream": "gemini"})
+        breaker.failure()
+        record_upstream("gemini", "error")
+        return _corpus.nearest(model_key, disease, severity) or _fallback_response(disease)
+
+
+def generate_live_advisory(disease: str, confidence: float, severity: float, model_key: str = "general") -> dict:
+    """Call Gemini for an advisory. Raises on any API or parsing failure."""
+    # Crop-model labels ("Healthy", "Leaf rust") don't name the crop themselves
+    crop = model_key.split(" ", 1)[0]
+    prompt = ADVISORY_PROMPT.format(
+        disease=disease,
+        crop_line=f"Crop: {crop}\n" if crop in ("soybean", "wheat", "chili") else "",
+        confidence=confidence * 100,
+        severity=severity,
+    )
+
+    response = get_client().models.generate_content(
+        model=GEMINI_MODEL,
+        contents=prompt,
+        config=_instruction_config(SYSTEM_INSTRUCTION),  # JSON mode
+    )
+    return json.loads(response.text)
 
 
+_FOLLOW_UP_UNAVAILABLE = {
+    "english": "Sorry, I couldn't process your question. Please try again.",
+    "hindi": "क्षमा करें, मैं आपके प्रश्न को संसाधित नहीं कर सका। कृपया पुनः प्रयास करें।",
+}
+
+
+@timed_stage("llm_followup")
 def follow_up(history: list[dict], question: str) -> dict:
-    """Handle a follow-up question with conversation context."""
+    """
+    Handle a follow-up question with conversation context. The Gemini API
+    is stateless, so the whole (short, capped at MAX_FOLLOWUPS) history is
+    still sent on every turn; the session store only saves the client from
+    uploading it.
+    """
     # Convert history to SDK format
     # The new SDK uses 'user' and 'model' roles, similar to the old one but strict on structure
     sdk_history = []
@@ -105,24 +196,28 @@ def follow_up(history: list[dict], question: str) -> dict:
             )
         )
 
+    breaker = get_breaker("gemini")
+    if not breaker.allow():
+        record_upstream("gemini", "short_circuit")
+        return dict(_FOLLOW_UP_UNAVAILABLE)
+
     try:
-        chat = client.chats.create(
-            model="gemini-3-flash-preview",
-            config=types.GenerateContentConfig(
-                system_instruction=FOLLOWUP_INSTRUCTION,
-                response_mime_type="application/json",
-            ),
+        chat = get_client().chats.create(
+            model=GEMINI_MODEL,
+            config=_instruction_config(FOLLOWUP_INSTRUCTION),
             history=sdk_history,
         )
         
         response = chat.send_message(question)
-        return json.loads(response.text)
+        answer = json.loads(response.text)
+        breaker.success()
+        record_upstream("gemini", "ok")
+        return answer
     except Exception as e:
-        print(f"[llm_service] Gemini follow-up error: {e}")
-        return {
-            "english": "Sorry, I couldn't process your question. Please try again.",
-            "hindi": "क्षमा करें, मैं आपके प्रश्न को संसाधित नहीं कर सका। कृपया पुनः प्रयास करें।",
-        }
+        logger.warning("Gemini follow-up error: %s", e, extra={"upstream": "gemini"})
+        breaker.failure()
+        record_upstream("gemini", "error")
+        return dict(_FOLLOW_UP_UNAVAILABLE)
 
 
 def _fallback_response(disease: str) -> dict:
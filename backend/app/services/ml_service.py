@@ -5,18 +5,68 @@ Loads the PlantCNN generic model, as well as specialised models (Soybean, Wheat,
 using standard PyTorch architectures. Implements lazy-loading to keep memory light.
 """
 
+import asyncio
+import copy
 import io
+import logging
 import torch
 import torch.nn as nn
 from PIL import Image
-from torchvision import transforms, models
+from torchvision import models
 
 from app.core.config import (
     MODEL_PATH_GENERIC, MODEL_PATH_SOYBEAN, MODEL_PATH_WHEAT, MODEL_PATH_CHILI,
     IMAGE_SIZE_GENERIC, NUM_CLASSES_GENERIC, CLASS_LABELS_GENERIC,
     IMAGE_SIZE_CUSTOM, IMAGENET_MEAN, IMAGENET_STD,
-    CLASS_LABELS_SOYBEAN, CLASS_LABELS_WHEAT, CLASS_LABELS_CHILI
+    CLASS_LABELS_SOYBEAN, CLASS_LABELS_WHEAT, CLASS_LABELS_CHILI,
+    MODEL_RANDOM_WEIGHTS, INFERENCE_MODE, TORCH_NUM_THREADS, TORCH_INTEROP_THREADS,
+    CASCADE_CONFIDENCE_THRESHOLD, CASCADE_CROP_SPECIALISTS, QOS_REDUCED_IMAGE_SIZE, QOS_QUANTIZE_MODELS,
 )
+from app.core import profiling, qos
+from app.core.metrics import span, record_cache, record_model_load, record_cascade
+from app.services.preprocess import Preprocessor
+
+logger = logging.getLogger("phyto.ml_service")
+
+
+def configure_threads():
+    """Apply TORCH_NUM_THREADS / TORCH_INTEROP_THREADS (inter-op can only be set once per process)."""
+    if TORCH_NUM_THREADS:
+        torch.set_num_threads(TORCH_NUM_THREADS)
+    if TORCH_INTEROP_THREADS:
+        try:
+            torch.set_num_interop_threads(TORCH_INTEROP_THREADS)
+        except RuntimeError:
+            pass  # already set, or parallel work has started
+
+
+configure_threads()
+
+MODEL_KEYS = ("general", "soybean", "wheat", "chili")
+MODEL_LABELS = {
+    "general": CLASS_LABELS_GENERIC,
+    "soybean": CLASS_LABELS_SOYBEAN,
+    "wheat": CLASS_LABELS_WHEAT,
+    "chili": CLASS_LABELS_CHILI,
+}
+
+# Forward-pass cost per image (2 x multiply-accumulates of every conv/linear layer,
+# counted with forward hooks at the model's input size)
+MODEL_GFLOPS = {"general": 1.56, "soybean": 8.17, "wheat": 0.77, "chili": 30.93}
+# What an early exit is compared against when no specialist was picked
+SPECIALIST_MEAN_GFLOPS = (MODEL_GFLOPS["soybean"] + MODEL_GFLOPS["wheat"] + MODEL_GFLOPS["chili"]) / 3
+
+
+def specialist_for(crop: str | None) -> str | None:
+    """'Pepper,_bell' / 'Wheat' / 'soyabean' -> the specialist model_key, if any."""
+    if not crop:
+        return None
+    return CASCADE_CROP_SPECIALISTS.get(crop.strip().lower().replace(" ", "_"))
+
+
+class LabelMismatchError(RuntimeError):
+    """A model's output width differs from its label list — predictions would be mislabelled."""
+
 
 # ── PlantCNN architecture (must match training code exactly) ──────
 class PlantCNN(nn.Module):
@@ -68,118 +118,345 @@ class ModelManager:
         self.current_model_key = None
         self.model = None
         self.demo_mode = False
+        # Cascade: keep the generic model resident next to the current specialist
+        self.pin_generic = False
+        self._generic = None
+        # QoS level 2+: int8-Linear view of the resident specialist, built on first use
+        self._quantized = None      # (model_key, model)
 
-        # Transform generic
-        self.transform_generic = transforms.Compose([
-            transforms.Resize((IMAGE_SIZE_GENERIC, IMAGE_SIZE_GENERIC)),
-            transforms.ToTensor(),
-        ])
-
-        # Transform custom models
-        self.transform_custom = transforms.Compose([
-            transforms.Resize((IMAGE_SIZE_CUSTOM, IMAGE_SIZE_CUSTOM)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD),
-        ])
-        
-        # Load generic model first to be ready since it's the default
-        self._set_model("general")
+        # Preprocess generic: resize + [0, 1]
+        self.preprocess_generic = Preprocessor(IMAGE_SIZE_GENERIC)
+
+        # Preprocess custom models: resize + ImageNet normalisation
+        self.preprocess_custom = Preprocessor(IMAGE_SIZE_CUSTOM, IMAGENET_MEAN, IMAGENET_STD)
+        # QoS level 3: smaller specialist inputs (they end in adaptive pooling; PlantCNN does not)
+        self.preprocess_reduced = Preprocessor(QOS_REDUCED_IMAGE_SIZE, IMAGENET_MEAN, IMAGENET_STD)
+
+        # Weights are loaded on first use or by warmup() from the app lifespan,
+        # so importing this module doesn't block on torch.load.
     
     def _build_model_architecture(self, model_key):
         if model_key == "general":
             model = PlantCNN(NUM_CLASSES_GENERIC)
-            return model, MODEL_PATH_GENERIC, CLASS_LABELS_GENERIC, self.transform_generic
+            return model, MODEL_PATH_GENERIC, CLASS_LABELS_GENERIC, self.preprocess_generic
         elif model_key == "soybean":
             model = models.resnet50(weights=None)
             num_features = model.fc.in_features
             model.fc = nn.Linear(num_features, len(CLASS_LABELS_SOYBEAN))
-            return model, MODEL_PATH_SOYBEAN, CLASS_LABELS_SOYBEAN, self.transform_custom
+            return model, MODEL_PATH_SOYBEAN, CLASS_LABELS_SOYBEAN, self.preprocess_custom
         elif model_key == "wheat":
             model = models.efficientnet_b0(weights=None)
             num_features = model.classifier[1].in_features
             model.classifier[1] = nn.Linear(num_features, len(CLASS_LABELS_WHEAT))
-            return model, MODEL_PATH_WHEAT, CLASS_LABELS_WHEAT, self.transform_custom
+            return model, MODEL_PATH_WHEAT, CLASS_LABELS_WHEAT, self.preprocess_custom
         elif model_key == "chili":
             model = models.vgg16(weights=None)
             # VGG classifier[6] is usually the final layer, let's verify if that matches standard PyTorch behavior
             num_features = model.classifier[6].in_features
             model.classifier[6] = nn.Linear(num_features, len(CLASS_LABELS_CHILI))
-            return model, MODEL_PATH_CHILI, CLASS_LABELS_CHILI, self.transform_custom
+            return model, MODEL_PATH_CHILI, CLASS_LABELS_CHILI, self.preprocess_custom
         else:
             raise ValueError(f"Unknown model key {model_key}")
 
+    def _build_checked(self, model_key):
+        """_build_model_architecture, refusing a head whose width doesn't match the labels."""
+        model, path, labels, preprocess = self._build_model_architecture(model_key)
+        outputs = [m for m in model.modules() if isinstance(m, nn.Linear)][-1].out_features
+        if outputs != len(labels):
+            raise LabelMismatchError(f"{model_key!r} model has {outputs} outputs but {len(labels)} labels")
+        return model, path, labels, preprocess
+
     def _set_model(self, model_key):
         if self.current_model_key == model_key and self.model is not None:
+            record_cache("model", True)
             return  # Already loaded
-            
-        print(f"[ml_service] Requested model '{model_key}'. Unloading previous model and loading new one...")
+        record_cache("model", False)
+
+        with span("model_switch", model_key):
+            self._load_model(model_key)
+
+    def _load_model(self, model_key):
+        logger.info("Requested model %r. Unloading previous model and loading new one...", model_key, extra={"model_key": model_key})
         
-        # Free memory of previous model
+        # Free memory of previous model (the cascade keeps the generic one resident)
+        if self.pin_generic and self.current_model_key == "general" and self.model is not None:
+            self._generic = (self.model, self.current_labels, self.current_preprocess)
+            self.model = None
         if self.model is not None:
             del self.model
             self.model = None
             if torch.cuda.is_available():
                 torch.cuda.empty_cache()
+        self._quantized = None
                 
         self.current_model_key = model_key
         
         try:
-            model, path, labels, transform = self._build_model_architecture(model_key)
-            model = model.to(self.device)
-            # weights_only=False because standard PyTorch load often needs it for some types
-            state_dict = torch.load(str(path), map_location=self.device, weights_only=False)
-            model.load_state_dict(state_dict)
-            model.eval()
+            model, path, labels, preprocess = self._load_weights(model_key)
             self.model = model
             self.current_labels = labels
-            self.current_transform = transform
+            self.current_preprocess = preprocess
             self.demo_mode = False
-            print(f"[ml_service] Model '{model_key}' loaded successfully from {path}")
-        except FileNotFoundError:
-            print(f"[ml_service] {path} not found — running in DEMO mode")
+            record_model_load(model_key, "loaded")
+            logger.info("Model %r loaded successfully from %s", model_key, path, extra={"model_key": model_key})
+        except FileNotFoundError as e:
+            logger.warning("%s not found — running in DEMO mode", e.filename, extra={"model_key": model_key})
             self.model = None
             self.current_labels = CLASS_LABELS_GENERIC
             self.demo_mode = True
+            record_model_load(model_key, "demo")
+        except LabelMismatchError:
+            self.model = None
+            self.current_model_key = None
+            raise
         except Exception as e:
-            print(f"[ml_service] Error loading model: {e} — running in DEMO mode")
+            logger.error("Error loading model: %s — running in DEMO mode", e, extra={"model_key": model_key})
             self.model = None
             self.current_labels = CLASS_LABELS_GENERIC
             self.demo_mode = True
+            record_model_load(model_key, "demo")
 
-    # ── public: run prediction on raw image bytes ───────────────
-    def predict(self, image_bytes: bytes, model_key: str = "general"):
-        if model_key not in ["general", "soybean", "wheat", "chili"]:
-            model_key = "general"
-            
+    def _load_weights(self, model_key):
+        """Build `model_key` and load its .pth (FileNotFoundError if missing)."""
+        model, path, labels, preprocess = self._build_checked(model_key)
+        model = model.to(self.device, memory_format=torch.channels_last)
+        if MODEL_RANDOM_WEIGHTS and not path.exists():
+            logger.warning("%s not found — using random weights (MODEL_RANDOM_WEIGHTS=1)", path)
+        else:
+            # weights_only=False because standard PyTorch load often needs it for some types
+            state_dict = torch.load(str(path), map_location=self.device, weights_only=False)
+            model.load_state_dict(state_dict)
+        model.eval()
+        return model, path, labels, preprocess
+
+    # ── public: load a model and run one dummy forward pass ─────
+    def warmup(self, model_key: str = "general"):
         self._set_model(model_key)
+        if self.demo_mode:
+            return
+        size = IMAGE_SIZE_GENERIC if model_key == "general" else IMAGE_SIZE_CUSTOM
+        with torch.inference_mode():
+            self.model(torch.zeros(1, 3, size, size, device=self.device).contiguous(memory_format=torch.channels_last))
 
-        # Demo mode — return a realistic-looking mock
+    def _resident(self, model_key):
+        """(model or None in DEMO mode, labels, preprocess) for `model_key`."""
+        if model_key == "general" and self._generic is not None and self.current_model_key != "general":
+            record_cache("model", True)
+            return self._generic
+        self._set_model(model_key)
         if self.demo_mode:
-            return {
-                "disease": self.current_labels[0] if hasattr(self, 'current_labels') else "Tomato___Late_blight",
-                "confidence": 0.87,
-                "model_used": f"{model_key} (demo)",
-            }
+            return None, self.current_labels, None
+        return self.model, self.current_labels, self.current_preprocess
+
+    def _quantized_model(self, model_key, model):
+        """int8 dynamic quantization of `model`'s Linear layers, cached while it stays resident."""
+        if self._quantized is None or self._quantized[0] != model_key:
+            try:
+                with span("quantize", model_key):
+                    quantized, extra = _quantize_linear(model)
+                logger.info("Quantized %r: +%.0f MB of int8 Linear weights next to the float model",
+                            model_key, extra / 2**20, extra={"model_key": model_key})
+            except (RuntimeError, AssertionError) as e:   # no quantized engine on this CPU / device
+                logger.warning("Cannot quantize %r (%s) — serving float weights", model_key, e,
+                               extra={"model_key": model_key})
+                quantized = model
+            self._quantized = (model_key, quantized)
+        return self._quantized[1]
 
-        # Real inference
-        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-        tensor = self.current_transform(image).unsqueeze(0).to(self.device)
+    @staticmethod
+    def _degradation(model_key) -> tuple[bool, bool]:
+        """(int8 Linear layers, reduced input) for the request's QoS plan — specialists only."""
+        if model_key == "general":
+            return False, False
+        plan = qos.current()
+        return plan.quantized and model_key in QOS_QUANTIZE_MODELS, plan.reduced_input
+
+    def _degrade(self, model_key, model, preprocess):
+        """Cheaper model / input for the request's QoS plan (specialists only)."""
+        quantize, reduce = self._degradation(model_key)
+        if quantize and self.device.type == "cpu":
+            model = self._quantized_model(model_key, model)
+        if reduce:
+            preprocess = self.preprocess_reduced
+        return model, preprocess
+
+    def _classify(self, image: Image.Image, model_key: str) -> dict:
+        model, labels, preprocess = self._resident(model_key)
+
+        # Demo mode — return a realistic-looking mock
+        if model is None:
+            return _demo_result(labels, model_key)
+        model, preprocess = self._degrade(model_key, model, preprocess)
+
+        with span("preprocess", model_key):
+            tensor = preprocess(image).to(self.device)
+
+        with span("forward", model_key), torch.inference_mode():
+            outputs = model(tensor)
+
+        result = _top_class(outputs, labels, model_key)
+        logger.debug("Classified as %s (%.3f)", result["disease"], result["confidence"], extra={"model_key": model_key})
+        return result
+
+    # ── public: run prediction on raw image bytes ───────────────
+    # `image` is raw upload bytes or an already decoded (e.g. leaf-cropped) PIL image
+    def predict(self, image: bytes | Image.Image, model_key: str = "general", crop: str | None = None):
+        session = profiling.ACTIVE
+        if session is not None:
+            return session.trace_predict(self._predict, image, model_key, crop)
+        return self._predict(image, model_key, crop)
+
+    async def predict_async(self, image: bytes | Image.Image, model_key: str = "general", crop: str | None = None):
+        """`predict` for async handlers; the local forward pass is CPU-bound, so it runs in place."""
+        return self.predict(image, model_key, crop)
+
+    def _predict(self, image: bytes | Image.Image, model_key: str, crop: str | None):
+        if model_key == "auto":
+            return self.predict_auto(image, crop)
+        if model_key not in MODEL_KEYS:
+            model_key = "general"
+
+        with span("decode", model_key):
+            image = _open_image(image)
+        return self._classify(image, model_key)
 
-        with torch.no_grad():
-            outputs = self.model(tensor)
-            probabilities = torch.softmax(outputs, dim=1)
-            confidence, predicted = torch.max(probabilities, 1)
+    # ── public: model_key="auto" — generic first, specialist only when needed ──
+    def predict_auto(self, image: bytes | Image.Image, crop: str | None = None):
+        with span("decode", "auto"):
+            image = _open_image(image)
 
-        class_idx = predicted.item()
-        labels = self.current_labels
-        label = labels[class_idx] if class_idx < len(labels) else f"class_{class_idx}"
+        models_run = []
+        skipped = None
+        specialist = specialist_for(crop)
+        exit_kind = "routed"
+        if specialist is not None and not qos.current().escalation:
+            # The level-3 cap holds for crop hints too, or any client could opt out of it
+            skipped, specialist = specialist, None
+        if specialist is None:
+            self.pin_generic = True
+            result = self._classify(image, "general")
+            models_run.append("general")
+            specialist = specialist_for(result["disease"].split("___")[0])
+            if skipped is not None:
+                specialist, exit_kind = None, "capped"
+            elif specialist is None:
+                exit_kind = "early" if result["confidence"] >= CASCADE_CONFIDENCE_THRESHOLD else "generic_only"
+            elif not qos.current().escalation:
+                skipped, specialist, exit_kind = specialist, None, "capped"
+            else:
+                exit_kind = "escalated"
+        if specialist is not None:
+            result = self._classify(image, specialist)
+            models_run.append(specialist)
 
+        # Conv cost scales with the input area; level 3 feeds the specialists smaller images
+        reduced = (QOS_REDUCED_IMAGE_SIZE / IMAGE_SIZE_CUSTOM) ** 2 if qos.current().reduced_input else 1.0
+        spent = sum(MODEL_GFLOPS[k] * (1.0 if k == "general" else reduced) for k in models_run)
+        baseline = specialist or skipped
+        saved = (MODEL_GFLOPS[baseline] if baseline else SPECIALIST_MEAN_GFLOPS) - spent
+        record_cascade(exit_kind, saved)
         return {
-            "disease": label,
-            "confidence": round(confidence.item(), 4),
-            "model_used": model_key,
+            **result,
+            "cascade": {
+                "exit": exit_kind,
+                "models_run": models_run,
+                "final_model": models_run[-1],
+                "gflops": round(spent, 2),
+                "gflops_saved": round(saved, 2),
+            },
         }
 
 
+def _quantize_linear(model: nn.Module) -> tuple[nn.Module, int]:
+    """
+    Shallow copy of `model` whose top-level children containing Linear layers
+    are int8 dynamically quantized; the rest (the conv stack) is shared with
+    the float model rather than copied. Returns it with the bytes it adds.
+    """
+    quantized = copy.copy(model)
+    quantized._modules = model._modules.copy()
+    extra = 0
+    for name, child in model.named_children():
+        linears = [m for m in child.modules() if isinstance(m, nn.Linear)]
+        if not linears:
+            continue
+        # quantize_dynamic swaps submodules, so a bare Linear child needs a wrapper
+        wrapped = nn.Sequential(child) if isinstance(child, nn.Linear) else child
+        swapped = torch.ao.quantization.quantize_dynamic(wrapped, {nn.Linear}, dtype=torch.qint8)
+        quantized._modules[name] = swapped[0] if wrapped is not child else swapped
+        extra += sum(m.weight.numel() + 4 * m.out_features for m in linears)   # int8 weights, float bias
+    return quantized, extra
+
+
+def _open_image(image: bytes | Image.Image) -> Image.Image:
+    if isinstance(image, Image.Image):
+        return image if image.mode == "RGB" else image.convert("RGB")
+    return Image.open(io.BytesIO(image)).convert("RGB")
+
+
+def _demo_result(labels, model_key: str) -> dict:
+    return {
+        "disease": labels[0] if labels else "Tomato___Late_blight",
+        "confidence": 0.87,
+        "model_used": f"{model_key} (demo)",
+    }
+
+
+def _top_class(outputs: torch.Tensor, labels, model_key: str) -> dict:
+    """Logits of shape (1, num_classes) -> diagnosis dict."""
+    probabilities = torch.softmax(outputs, dim=1)
+    confidence, predicted = torch.max(probabilities, 1)
+
+    class_idx = predicted.item()
+    label = labels[class_idx] if class_idx < len(labels) else f"class_{class_idx}"
+
+    return {
+        "disease": label,
+        "confidence": round(confidence.item(), 4),
+        "model_used": model_key,
+    }
+
+
+# ── Remote manager (INFERENCE_MODE=server) ──────────────────────
+class RemoteModelManager(ModelManager):
+    """
+    Same interface as ModelManager, but holds no weights: images are decoded
+    and preprocessed here, written straight into a shared-memory slot, and
+    the forward pass runs in the node's inference server.
+    """
+
+    def __init__(self):
+        super().__init__()
+        from app.services.inference_ipc import InferenceClient
+        self.client = InferenceClient()
+
+    async def predict_async(self, image: bytes | Image.Image, model_key: str = "general", crop: str | None = None):
+        """The round trip to the server waits on a socket: keep it off the event loop."""
+        return await asyncio.to_thread(self.predict, image, model_key, crop)
+
+    def warmup(self, model_key: str = "general"):
+        """Wait for the inference server (readiness depends on it)."""
+        loaded = self.client.ping()
+        logger.info("Inference server ready — models: %s", ", ".join(loaded))
+
+    def _classify(self, image: Image.Image, model_key: str) -> dict:
+        # The QoS plan applies here too: the reduced input is preprocessed
+        # locally, and the server swaps in its int8 copy when asked to
+        quantize, reduce = self._degradation(model_key)
+        if model_key == "general":
+            preprocess = self.preprocess_generic
+        else:
+            preprocess = self.preprocess_reduced if reduce else self.preprocess_custom
+        with self.client.slot((preprocess.size, preprocess.size, 3)) as (slot, pixels):
+            with span("preprocess", model_key):
+                preprocess.into(image, pixels)   # written straight into shared memory
+            with span("forward", model_key):
+                logits = self.client.infer(slot, model_key, pixels.shape, quantize)
+
+        if logits is None:
+            return _demo_result(MODEL_LABELS[model_key], model_key)
+        return _top_class(torch.from_numpy(logits).unsqueeze(0), MODEL_LABELS[model_key], model_key)
+
+
 # Singleton
-model_manager = ModelManager()
+model_manager = RemoteModelManager() if INFERENCE_MODE == "server" else ModelManager()
@@ -0,0 +1,200 @@
+"""
+Phyto — outbreak aggregates for district dashboards (/api/outbreaks).
+
+Queries read the per-(geohash cell, UTC day, label) counts that the history
+table's insert trigger keeps up to date (see history_service), never the raw
+history, so their cost depends on the area and window asked for, not on how
+many diagnoses were ever made. There are two cell sizes: fine cells for
+radius queries and close-up heatmaps, and a coarse rollup for zoomed-out
+heatmaps, which would otherwise aggregate every fine cell in a state.
+
+The query box is covered by at most OUTBREAK_MAX_PREFIXES geohash prefixes,
+each one a primary-key range search. Cells are then kept or dropped by
+their centre, so a radius is resolved to within half a fine cell (~0.6 km).
+"""
+
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+from app.core.config import (
+    HISTORY_BACKEND, HISTORY_SQLITE_PATH, OUTBREAK_TABLE, OUTBREAK_CELL_PRECISION,
+    OUTBREAK_COARSE_PRECISION, OUTBREAK_MAX_PREFIXES, OUTBREAK_HEATMAP_MAX_CELLS,
+)
+from app.core.metrics import timed_stage
+from app.services import geohash
+from app.services.history_service import ensure_sqlite_schema
+
+
+# ── Stores ─────────────────────────────────────────────
+class OutbreakStore:
+    def cells(self, prefixes: list[str], since: str, coarse: bool = False) -> list[tuple]:
+        """(cell, label, cases, severity_sum, loss_sum) per cell and label under `prefixes`, days >= `since`."""
+        raise NotImplementedError
+
+
+class SQLiteOutbreakStore(OutbreakStore):
+    def __init__(self, path=HISTORY_SQLITE_PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            ensure_sqlite_schema(self._conn)
+
+    def cells(self, prefixes, since, coarse=False):
+        # '~' sorts after every geohash character, so [p, p~) is everything under p.
+        # Joining a VALUES list (rather than OR-ing ranges) gets one primary-key
+        # range search per prefix instead of a table scan.
+        values = ", ".join("(?, ?)" for _ in prefixes)
+        sql = (
+            f"WITH ranges(lo, hi) AS (VALUES {values}) "
+            "SELECT cell, label, SUM(cases), SUM(severity_sum), SUM(loss_sum) "
+            f"FROM ranges JOIN {OUTBREAK_TABLE}{'_coarse' if coarse else ''} ON cell >= lo AND cell < hi "
+            "WHERE day >= ? GROUP BY cell, label"
+        )
+        params = [bound for p in prefixes for bound in (p, p + "~")] + [since]
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+
+class SupabaseOutbreakStore(OutbreakStore):
+    def cells(self, prefixes, since, coarse=False):
+        from app.core.config import get_supabase
+        params = {"prefixes": prefixes, "since": since, "coarse": coarse}
+        rows = get_supabase().rpc("outbreak_cells", params).execute().data
+        return [(r["cell"], r["label"], r["cases"], r["severity_sum"], r["loss_sum"]) for r in rows or []]
+
+
+_STORES = {
+    "sqlite": SQLiteOutbreakStore,
+    "supabase": SupabaseOutbreakStore,
+}
+_store: OutbreakStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> OutbreakStore | None:
+    """The store matching HISTORY_BACKEND, or None when history is off."""
+    global _store
+    if _store is None and HISTORY_BACKEND in _STORES:
+        with _store_lock:
+            if _store is None:
+                _store = _STORES[HISTORY_BACKEND]()
+    return _store
+
+
+# ── Queries ────────────────────────────────────────────
+def _since(days: int) -> str:
+    """First UTC day of a window of `days` days ending today."""
+    return (datetime.now(timezone.utc).date() - timedelta(days=days - 1)).isoformat()
+
+
+def _prefixes(box: tuple[float, float, float, float], max_precision: int) -> list[str]:
+    """Finest geohash cover of `box` with at most OUTBREAK_MAX_PREFIXES cells."""
+    for precision in range(max_precision, 1, -1):
+        if geohash.cover_count(*box, precision) <= OUTBREAK_MAX_PREFIXES:
+            return geohash.cover(*box, precision)
+    return geohash.cover(*box, 1)
+
+
+def _normalize(label: str) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", label.lower()).strip()
+
+
+def _label_filter(label: str | None):
+    """'late blight' matches 'Tomato___Late_blight' and 'Potato___Late_blight'."""
+    if not label:
+        return lambda _: True
+    wanted = _normalize(label)
+    return lambda candidate: wanted in _normalize(candidate)
+
+
+def _rows(store: OutbreakStore, box, days: int, label: str | None, keep_cell, coarse: bool = False):
+    matches = _label_filter(label)
+    prefixes = _prefixes(box, OUTBREAK_COARSE_PRECISION if coarse else OUTBREAK_CELL_PRECISION)
+    for cell, cell_label, cases, severity_sum, loss_sum in store.cells(prefixes, _since(days), coarse):
+        if cases and matches(cell_label) and keep_cell(cell):
+            yield cell, cell_label, cases, severity_sum, loss_sum
+
+
+@timed_stage("outbreak_radius")
+def radius_summary(store: OutbreakStore, lat: float, lon: float, radius_km: float, days: int, label: str | None = None) -> dict:
+    """Cases per label within `radius_km` of a point over the last `days` days."""
+    def within(cell):
+        return geohash.haversine_km(lat, lon, *geohash.center(cell)) <= radius_km
+
+    by_label: dict[str, list[float]] = {}
+    cells = set()
+    for cell, cell_label, cases, severity_sum, loss_sum in _rows(store, geohash.radius_box(lat, lon, radius_km), days, label, within):
+        totals = by_label.setdefault(cell_label, [0, 0.0, 0.0])
+        totals[0] += cases
+        totals[1] += severity_sum
+        totals[2] += loss_sum
+        cells.add(cell)
+
+    labels = sorted(by_label.items(), key=lambda item: item[1][0], reverse=True)
+    return {
+        "center": {"lat": lat, "lon": lon},
+        "radius_km": radius_km,
+        "days": days,
+        "since": _since(days),
+        "label": label,
+        "total_cases": sum(t[0] for _, t in labels),
+        "cells": len(cells),
+        "cell_precision": OUTBREAK_CELL_PRECISION,
+        "by_label": [
+            {
+                "label": name,
+                "cases": int(cases),
+                "mean_severity": round(severity_sum / cases, 2),
+                "mean_loss_per_unit": round(loss_sum / cases, 0),
+            }
+            for name, (cases, severity_sum, loss_sum) in labels
+        ],
+    }
+
+
+@timed_stage("outbreak_heatmap")
+def heatmap(
+    store: OutbreakStore, min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+    days: int, label: str | None = None, precision: int = 5,
+) -> dict:
+    """Cases per geohash cell at `precision` inside a bounding box (one heatmap layer)."""
+    box = (min_lat, min_lon, max_lat, max_lon)
+    if geohash.cover_count(*box, precision) > OUTBREAK_HEATMAP_MAX_CELLS:
+        raise ValueError(f"Box too large for precision {precision}; zoom in or lower the precision.")
+
+    def inside(cell):
+        c_lat, c_lon = geohash.center(cell)
+        return min_lat <= c_lat <= max_lat and min_lon <= c_lon <= max_lon
+
+    buckets: dict[str, list[float]] = {}
+    coarse = precision <= OUTBREAK_COARSE_PRECISION
+    for cell, _, cases, severity_sum, _ in _rows(store, box, days, label, inside, coarse):
+        totals = buckets.setdefault(cell[:precision], [0, 0.0])
+        totals[0] += cases
+        totals[1] += severity_sum
+
+    cells = []
+    for key, (cases, severity_sum) in buckets.items():
+        c_lat, c_lon = geohash.center(key)
+        cells.append({
+            "geohash": key,
+            "lat": round(c_lat, 5),
+            "lon": round(c_lon, 5),
+            "cases": int(cases),
+            "mean_severity": round(severity_sum / cases, 2),
+        })
+    cells.sort(key=lambda c: c["cases"], reverse=True)
+    return {
+        "bounds": {"min_lat": min_lat, "min_lon": min_lon, "max_lat": max_lat, "max_lon": max_lon},
+        "precision": precision,
+        "days": days,
+        "since": _since(days),
+        "label": label,
+        "total_cases": sum(c["cases"] for c in cells),
+        "max_cases": cells[0]["cases"] if cells else 0,
+        "cells": cells,
+    }
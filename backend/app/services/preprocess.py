@@ -0,0 +1,67 @@
+"""
+Phyto — fused image preprocessing for the classifiers.
+
+Replaces torchvision's Resize → ToTensor → Normalize chain (three float
+tensors per image) with: PIL resize (same antialiased bilinear filter as
+transforms.Resize), then a uint8 → float cast and one multiply-add done in
+place, straight into a preallocated channels_last batch buffer:
+
+    x = pixel * (1 / (255 * std)) + (-mean / std)
+
+which equals (pixel / 255 - mean) / std up to float32 rounding (< 1e-5).
+Scale and bias are pre-tiled to the flat HWC length, so NumPy runs plain
+contiguous loops instead of broadcasting over a 3-wide channel axis.
+Buffers are per thread and reused across calls, so a returned batch is
+only valid until the same thread preprocesses again.
+"""
+
+import threading
+
+import numpy as np
+import torch
+from PIL import Image
+
+
+class Preprocessor:
+    def __init__(self, size: int, mean=None, std=None):
+        self.size = size
+        if mean is None:
+            mean, std = (0.0, 0.0, 0.0), (1.0, 1.0, 1.0)
+        std = np.asarray(std, dtype=np.float32)
+        scale = (1.0 / (255.0 * std)).astype(np.float32)
+        bias = (-np.asarray(mean, dtype=np.float32) / std).astype(np.float32)
+        self._scale = np.tile(scale, size * size)
+        self._bias = np.tile(bias, size * size)
+        self._local = threading.local()
+
+    def buffer(self, batch_size: int) -> torch.Tensor:
+        """Reusable (batch_size, 3, size, size) float32 buffer in channels_last layout."""
+        buf = getattr(self._local, "buf", None)
+        if buf is None or buf.shape[0] < batch_size:
+            buf = torch.empty(batch_size, 3, self.size, self.size).contiguous(memory_format=torch.channels_last)
+            self._local.buf = buf
+        return buf[:batch_size]
+
+    def into(self, image: Image.Image, out: np.ndarray):
+        """Resize `image` and write the normalised pixels into `out` (size, size, 3) float32, in place."""
+        if not out.flags.c_contiguous:
+            raise ValueError("out must be a C-contiguous (size, size, 3) array")
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        if image.size != (self.size, self.size):
+            image = image.resize((self.size, self.size), Image.BILINEAR)
+        flat = out.reshape(-1)
+        flat[...] = np.asarray(image).reshape(-1)
+        np.multiply(flat, self._scale, out=flat)
+        np.add(flat, self._bias, out=flat)
+
+    def batch(self, images: list[Image.Image]) -> torch.Tensor:
+        """(N, 3, size, size) channels_last tensor for `images` — a view of the reusable buffer."""
+        buf = self.buffer(len(images))
+        rows = buf.permute(0, 2, 3, 1).numpy()   # NHWC view of the same memory
+        for image, row in zip(images, rows):
+            self.into(image, row)
+        return buf
+
+    def __call__(self, image: Image.Image) -> torch.Tensor:
+        return self.batch([image])
@@ -0,0 +1,95 @@
+"""
+Immutable remedy index — built once at load time from a remedy table
+(remedies.json / jugaad_remedies.json).
+
+Resolves label aliases so generic PlantVillage labels ("Tomato___Late_blight"),
+display names ("Tomato Late Blight") and crop-model labels ("Healthy" with
+crop="soybean") all land on the same entry, and keeps each entry's response
+body pre-encoded (plain + gzip) with a content-hash ETag.
+"""
+
+import gzip
+import hashlib
+import json
+import re
+from types import MappingProxyType
+from typing import Any, NamedTuple
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+_PARENS = re.compile(r"\([^)]*\)")
+
+
+class EncodedBody(NamedTuple):
+    body: bytes
+    body_gzip: bytes
+    etag: str          # strong ETag of the plain body
+    etag_gzip: str     # distinct ETag for the gzip representation
+
+
+class RemedyRecord(NamedTuple):
+    key: str           # canonical label in the source table
+    data: Any
+    encoded: EncodedBody | None
+
+
+def normalize_label(label: str) -> str:
+    """'Corn_(maize)___Common_rust_' -> 'corn maize common rust'."""
+    return _NON_ALNUM.sub(" ", label.lower()).strip()
+
+
+def label_aliases(label: str, data: Any = None) -> set[str]:
+    """All normalized spellings a table key should answer to."""
+    aliases = {normalize_label(label), normalize_label(_PARENS.sub(" ", label))}
+    if "___" in label:
+        crop, disease = label.split("___", 1)
+        # "Pepper,_bell" -> "pepper" so crop-model style "<crop> <disease>" lookups hit too
+        short_crop = normalize_label(_PARENS.sub(" ", crop)).split(" ")[0]
+        aliases.add(f"{short_crop} {normalize_label(_PARENS.sub(' ', disease))}")
+    if isinstance(data, dict) and isinstance(data.get("disease"), str):
+        aliases.add(normalize_label(data["disease"]))
+    aliases.discard("")
+    return aliases
+
+
+def encode_body(payload: Any) -> EncodedBody:
+    """Encode exactly like FastAPI's JSONResponse, plus a gzip variant."""
+    body = json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+    digest = hashlib.sha256(body).hexdigest()[:20]
+    return EncodedBody(
+        body=body,
+        body_gzip=gzip.compress(body, compresslevel=9, mtime=0),
+        etag=f'"{digest}"',
+        etag_gzip=f'"{digest}-gz"',
+    )
+
+
+class RemedyIndex:
+    """Read-only lookup table keyed by canonical label, with alias resolution."""
+
+    def __init__(self, table: dict, encode: bool = False):
+        records = {
+            key: RemedyRecord(key, value, encode_body(value) if encode else None)
+            for key, value in table.items()
+        }
+        aliases: dict[str, str] = {}
+        for key, value in table.items():
+            for alias in label_aliases(key, value):
+                # First table entry wins if two labels normalize the same way
+                aliases.setdefault(alias, key)
+
+        self._records = MappingProxyType(records)
+        self._aliases = MappingProxyType(aliases)
+
+    def __len__(self):
+        return len(self._records)
+
+    def resolve(self, label: str, crop: str | None = None) -> RemedyRecord | None:
+        """Find the record for a model label, optionally qualified by crop."""
+        record = self._records.get(label)
+        if record is not None:
+            return record
+
+        key = self._aliases.get(normalize_label(label))
+        if key is None and crop:
+            key = self._aliases.get(f"{normalize_label(crop)} {normalize_label(label)}")
+        return self._records[key] if key is not None else None
@@ -1,29 +1,50 @@
 """
-Remedy lookup service — loads remedies from a JSON file
-and returns matching entries or a sensible fallback.
+Remedy lookup service — loads remedies from a JSON file into an immutable
+index (with pre-encoded response bodies) and returns matching entries
+or a sensible fallback.
 """
 
 import json
+import logging
 from app.core.config import REMEDIES_PATH
+from app.core.metrics import record_cache
+from app.services.remedy_index import RemedyIndex, EncodedBody, encode_body
 
-_remedies: dict = {}
+logger = logging.getLogger("phyto.remedy_service")
+
+_index: RemedyIndex | None = None
+
+
+def get_index() -> RemedyIndex:
+    """The remedy index, loaded on first use (or by the startup warmup)."""
+    if _index is None:
+        _load_remedies()
+    return _index
 
 
 def _load_remedies():
-    """Load remedy data from disk once."""
-    global _remedies
+    """Load remedy data once (edge bundle if present, else the JSON file) and build the index."""
+    global _index
+    from app.services.edge_bundle import get_bundle
+
+    bundle = get_bundle()
+    table = bundle.table("remedies") if bundle else None
+    if table is not None:
+        _index = RemedyIndex(table, encode=True)
+        logger.info("Loaded %d remedies from edge bundle %s.", len(_index), bundle.version)
+        return
+
+    index = RemedyIndex({})
     try:
         with open(REMEDIES_PATH, "r", encoding="utf-8") as f:
-            _remedies = json.load(f)
-        print(f"[remedy_service] Loaded {len(_remedies)} remedies.")
+            index = RemedyIndex(json.load(f), encode=True)
+        logger.info("Loaded %d remedies.", len(index))
     except FileNotFoundError:
-        print(f"[remedy_service] {REMEDIES_PATH} not found — using empty set.")
+        logger.warning("%s not found — using empty set.", REMEDIES_PATH)
     except Exception as e:
-        print(f"[remedy_service] Error loading remedies: {e}")
-
+        logger.error("Error loading remedies: %s", e)
+    _index = index
 
-# Load at import time
-_load_remedies()
 
 # Default response when disease isn't in the database yet
 _DEFAULT_REMEDY = {
@@ -41,8 +62,18 @@ _DEFAULT_REMEDY = {
 }
 
 
-def get_remedy(disease_class: str) -> dict:
+def get_remedy(disease_class: str, crop: str | None = None) -> dict:
     """Return remedy details for a disease class, or a default fallback."""
-    if disease_class in _remedies:
-        return _remedies[disease_class]
+    record = get_index().resolve(disease_class, crop)
+    record_cache("remedy_index", record is not None)
+    if record is not None:
+        return record.data
     return {**_DEFAULT_REMEDY, "disease": disease_class}
+
+
+def get_remedy_body(disease_class: str, crop: str | None = None) -> EncodedBody:
+    """Pre-encoded JSON for `get_remedy` — cached for known classes."""
+    record = get_index().resolve(disease_class, crop)
+    if record is not None:
+        return record.encoded
+    return encode_body({**_DEFAULT_REMEDY, "disease": disease_class})
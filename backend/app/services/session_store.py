@@ -0,0 +1,140 @@
+"""
+Chat session store — keeps follow-up conversation history server-side
+so clients only send the new question.
+
+The default backend is an in-process TTL store: with several workers a
+follow-up can reach one that never saw the session, and a restart drops
+them all — the frontend then resends the history (the legacy payload).
+Other backends (Redis, Supabase, ...) can be plugged in with
+`register_backend` and selected via CHAT_SESSION_BACKEND.
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable
+
+from app.core.config import (
+    CHAT_SESSION_BACKEND, CHAT_SESSION_TTL_SECONDS, CHAT_SESSION_MAX,
+)
+
+logger = logging.getLogger("phyto.session_store")
+
+
+class SessionStore:
+    """Interface every session backend implements. Sessions are plain dicts."""
+
+    def get(self, session_id: str) -> dict | None:
+        raise NotImplementedError
+
+    def set(self, session_id: str, session: dict) -> None:
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    def update(self, session_id: str, change: Callable[[dict], dict]) -> dict | None:
+        """
+        Replace a session with `change(session)` and return the new one (None
+        if there is no session); `change` may raise to leave it untouched.
+
+        This fallback is not atomic. Shared backends must override it with one
+        read-modify-write (Redis WATCH/MULTI, a row lock, ...): the follow-up
+        limit is enforced through it.
+        """
+        session = self.get(session_id)
+        if session is None:
+            return None
+        session = change(session)
+        self.set(session_id, session)
+        return session
+
+
+class InMemorySessionStore(SessionStore):
+    """LRU-bounded dict with a sliding TTL per session."""
+
+    def __init__(self, ttl_seconds: int = CHAT_SESSION_TTL_SECONDS, max_sessions: int = CHAT_SESSION_MAX):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._data: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> dict | None:
+        with self._lock:
+            entry = self._data.get(session_id)
+            if entry is None:
+                return None
+            expires_at, session = entry
+            if expires_at < time.monotonic():
+                del self._data[session_id]
+                return None
+            self._data.move_to_end(session_id)
+            return session
+
+    def set(self, session_id: str, session: dict) -> None:
+        with self._lock:
+            self._data[session_id] = (time.monotonic() + self.ttl_seconds, session)
+            self._data.move_to_end(session_id)
+            self._evict()
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._data.pop(session_id, None)
+
+    def update(self, session_id: str, change: Callable[[dict], dict]) -> dict | None:
+        with self._lock:
+            entry = self._data.get(session_id)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            session = change(entry[1])
+            self._data[session_id] = (time.monotonic() + self.ttl_seconds, session)
+            self._data.move_to_end(session_id)
+            return session
+
+    def _evict(self):
+        """Drop expired sessions from the cold end, then enforce the size cap."""
+        now = time.monotonic()
+        while self._data:
+            oldest_id, (expires_at, _) = next(iter(self._data.items()))
+            if expires_at >= now and len(self._data) <= self.max_sessions:
+                break
+            del self._data[oldest_id]
+
+
+_BACKENDS: dict[str, Callable[[], SessionStore]] = {
+    "memory": InMemorySessionStore,
+}
+
+_store: SessionStore | None = None
+
+
+def register_backend(name: str, factory: Callable[[], SessionStore]):
+    """Make a session backend selectable through CHAT_SESSION_BACKEND."""
+    _BACKENDS[name] = factory
+
+
+def get_session_store() -> SessionStore:
+    global _store
+    if _store is None:
+        factory = _BACKENDS.get(CHAT_SESSION_BACKEND)
+        if factory is None:
+            logger.warning("Unknown backend %r — using in-memory store.", CHAT_SESSION_BACKEND)
+            factory = InMemorySessionStore
+        if factory is InMemorySessionStore and int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+            logger.warning("In-memory chat sessions are per worker; follow-ups that reach another worker "
+                           "fall back to client-sent history. Set CHAT_SESSION_BACKEND to a shared store.")
+        _store = factory()
+    return _store
+
+
+def set_session_store(store: SessionStore):
+    """Swap the active backend (e.g. at startup or in tests)."""
+    global _store
+    _store = store
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
@@ -2,90 +2,314 @@ import cv2
 import numpy as np
 import csv
 import ast
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from app.core.config import HSV_VALUES_PATH
+from typing import NamedTuple
+from PIL import Image
+from app.core.config import (
+    HSV_VALUES_PATH, OPENCV_NUM_THREADS, LEAF_ROI_ENABLED, LEAF_ROI_WORK_SIZE, LEAF_ROI_MIN_FRACTION, LEAF_ROI_PADDING,
+    LEAF_ROI_LESION_MARGIN,
+    SEVERITY_TILE_SIZE, SEVERITY_TILE_WORKERS, SEVERITY_TILED_MIN_PIXELS, SEVERITY_TILE_MIN_LEAF_FRACTION,
+)
+from app.core.metrics import timed_stage, LEAF_ROI_FRACTION
+from app.services.edge_bundle import get_bundle
+
+logger = logging.getLogger("phyto.vision_service")
+
+# Green range — healthy leaf tissue (standard default)
+GREEN_LOWER = np.array([25, 40, 40])
+GREEN_UPPER = np.array([90, 255, 255])
+
+# Disease range — default brown/yellow when the CSV has no entry
+DISEASE_LOWER = np.array([5, 50, 50])
+DISEASE_UPPER = np.array([25, 255, 255])
+
+_ROI_KERNEL = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+
+# OpenCV's pool is process-wide; by default it has one thread per core in every worker
+if OPENCV_NUM_THREADS >= 0:
+    cv2.setNumThreads(OPENCV_NUM_THREADS)
 
 # Cache for HSV values: (crop, disease) -> (lower_np_array, upper_np_array)
 HSV_DATA = {}
+_hsv_loaded = False
+_hsv_lock = threading.Lock()
+
+def read_hsv_csv(path) -> dict:
+    """(crop, disease) -> (lower, upper) HSV bounds from the calibration CSV."""
+    bounds = {}
+    with open(path, mode='r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            crop = row['Crop'].strip().lower()
+            disease = row['Disease / Pest'].strip().lower()
+
+            # Convert "[10, 50, 20]" string to list/np.array
+            lower = np.array(ast.literal_eval(row['HSV Lower Bound']))
+            upper = np.array(ast.literal_eval(row['HSV Upper Bound']))
+
+            bounds[(crop, disease)] = (lower, upper)
+    return bounds
+
 
 def load_hsv_data():
-    """Load HSV bounds from the CSV file."""
-    if not HSV_DATA and Path(HSV_VALUES_PATH).exists():
-        try:
-            with open(HSV_VALUES_PATH, mode='r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    crop = row['Crop'].strip().lower()
-                    disease = row['Disease / Pest'].strip().lower()
-                    
-                    # Convert "[10, 50, 20]" string to list/np.array
-                    lower = np.array(ast.literal_eval(row['HSV Lower Bound']))
-                    upper = np.array(ast.literal_eval(row['HSV Upper Bound']))
-                    
-                    HSV_DATA[(crop, disease)] = (lower, upper)
-            print(f"[vision_service] Loaded {len(HSV_DATA)} HSV mapping entries.")
-        except Exception as e:
-            print(f"[vision_service] Error loading HSV CSV: {e}")
-
-# Initial load
-load_hsv_data()
-
-def calculate_severity(image_bytes: bytes, crop: str = None, disease: str = None) -> float:
+    """Load HSV bounds from the edge bundle or the CSV file (once — on warmup or first use)."""
+    global _hsv_loaded
+    if _hsv_loaded:
+        return
+    # A request can arrive while the warmup is still loading: it waits for
+    # the tables instead of seeing the flag early and reading them empty
+    with _hsv_lock:
+        if _hsv_loaded:
+            return
+        bundle = get_bundle()
+        if not HSV_DATA and bundle is not None and "hsv/keys" in bundle:
+            HSV_DATA.update(bundle.hsv_bounds())
+            logger.info("Loaded %d HSV mapping entries from edge bundle %s.", len(HSV_DATA), bundle.version)
+        elif not HSV_DATA and Path(HSV_VALUES_PATH).exists():
+            try:
+                HSV_DATA.update(read_hsv_csv(HSV_VALUES_PATH))
+                logger.info("Loaded %d HSV mapping entries.", len(HSV_DATA))
+            except Exception as e:
+                logger.error("Error loading HSV CSV: %s", e)
+        _hsv_loaded = True
+
+# ── Leaf region of interest ──────────────────────────────────
+class LeafROI(NamedTuple):
+    image: np.ndarray                           # BGR crop (the whole frame if no leaf was found)
+    mask: np.ndarray | None                     # 255 inside the leaf outline, same size as image
+    box: tuple[int, int, int, int] | None       # x, y, w, h of the crop in the original frame
+    frame_shape: tuple[int, int]                # original height, width
+    frame: np.ndarray | None = None             # the whole decoded photo, when `image` is a crop of it
+
+    @property
+    def pixel_fraction(self) -> float:
+        h, w = self.image.shape[:2]
+        return (h * w) / (self.frame_shape[0] * self.frame_shape[1])
+
+    def pil_image(self) -> Image.Image:
+        """RGB PIL image of the crop, for the classifiers."""
+        return Image.fromarray(cv2.cvtColor(self.image, cv2.COLOR_BGR2RGB))
+
+    def whole_frame(self) -> "LeafROI":
+        """The uncropped photo (every leaf in it), e.g. for hotspot maps of canopy shots."""
+        frame = self.image if self.frame is None else self.frame
+        return LeafROI(frame, None, None, frame.shape[:2])
+
+    def summary(self) -> dict:
+        return {"box": list(self.box) if self.box else None, "pixel_fraction": round(self.pixel_fraction, 3)}
+
+
+def decode_image(image_bytes: bytes) -> np.ndarray | None:
+    """BGR image, or None if the bytes aren't a decodable image."""
+    return cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+@timed_stage("leaf_roi")
+def find_leaf_roi(img: np.ndarray) -> LeafROI:
+    """
+    Crop to the leaf: green mask on a downscaled copy, open/close to drop
+    specks and bridge lesions, then the largest contour's convex hull and
+    padded bounding box. Soil, sky and hands outside it are never thresholded.
+
+    Necrotic or chlorotic margins and detached lesions are not green, and
+    brown tissue can't be told from soil by colour, so the hull is grown by
+    LEAF_ROI_LESION_MARGIN to keep them in the crop.
+    """
+    h, w = img.shape[:2]
+    whole = LeafROI(img, None, None, (h, w))
+
+    scale = min(1.0, LEAF_ROI_WORK_SIZE / max(h, w))
+    small = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else img
+    mask = cv2.inRange(cv2.cvtColor(small, cv2.COLOR_BGR2HSV), GREEN_LOWER, GREEN_UPPER)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, _ROI_KERNEL)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, _ROI_KERNEL, iterations=2)
+
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return whole
+    leaf = cv2.convexHull(max(contours, key=cv2.contourArea))
+    if cv2.contourArea(leaf) < LEAF_ROI_MIN_FRACTION * small.shape[0] * small.shape[1]:
+        return whole
+
+    outline = np.zeros(small.shape[:2], np.uint8)
+    cv2.drawContours(outline, [leaf], -1, 255, cv2.FILLED)
+    _, _, bw, bh = cv2.boundingRect(leaf)
+    reach = int(LEAF_ROI_LESION_MARGIN * max(bw, bh))
+    if reach > 0:
+        outline = cv2.dilate(outline, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * reach + 1, 2 * reach + 1)))
+
+    x, y, bw, bh = cv2.boundingRect(outline)
+    pad = int(LEAF_ROI_PADDING * max(bw, bh)) + 1
+    x0, y0 = max(0, x - pad), max(0, y - pad)
+    x1, y1 = min(small.shape[1], x + bw + pad), min(small.shape[0], y + bh + pad)
+
+    # Back to full resolution; the crop is a view, not a copy
+    X0, Y0 = int(x0 / scale), int(y0 / scale)
+    X1, Y1 = min(w, int(round(x1 / scale))), min(h, int(round(y1 / scale)))
+    crop = img[Y0:Y1, X0:X1]
+    crop_mask = cv2.resize(outline[y0:y1, x0:x1], (X1 - X0, Y1 - Y0), interpolation=cv2.INTER_NEAREST)
+    return LeafROI(crop, crop_mask, (X0, Y0, X1 - X0, Y1 - Y0), (h, w), img)
+
+
+def prepare_leaf(image_bytes: bytes) -> LeafROI | None:
+    """Decode once and crop to the leaf (full frame if ROI is disabled or no leaf is found)."""
+    img = decode_image(image_bytes)
+    if img is None:
+        return None
+    roi = find_leaf_roi(img) if LEAF_ROI_ENABLED else LeafROI(img, None, None, img.shape[:2])
+    LEAF_ROI_FRACTION.observe(roi.pixel_fraction)
+    return roi
+
+
+def disease_bounds(crop: str = None, disease: str = None):
+    """(lower, upper) HSV bounds for a crop/disease from the CSV, or the default brown/yellow."""
+    disease_lower, disease_upper = DISEASE_LOWER, DISEASE_UPPER
+
+    if crop and disease:
+        crop_key = crop.strip().lower()
+        disease_key = disease.strip().lower()
+        
+        # Simple normalization for matching (e.g., 'mites_and_trips' -> 'mites and trips')
+        disease_key = disease_key.replace('_', ' ')
+        
+        # Try direct match
+        found_bounds = HSV_DATA.get((crop_key, disease_key))
+        
+        if not found_bounds:
+            # Fuzzy match: check if the predicted disease string is contained in any CSV disease string
+            for (c, d), (l, u) in HSV_DATA.items():
+                if c == crop_key and (disease_key in d or d in disease_key):
+                    found_bounds = (l, u)
+                    break
+        
+        if found_bounds:
+            disease_lower, disease_upper = found_bounds
+
+    return disease_lower, disease_upper
+
+
+# ── Pixel counting (whole frame or per tile) ─────────────────
+_tile_pool: ThreadPoolExecutor | None = None
+
+
+def _get_tile_pool() -> ThreadPoolExecutor:
+    global _tile_pool
+    if _tile_pool is None:
+        _tile_pool = ThreadPoolExecutor(max_workers=SEVERITY_TILE_WORKERS, thread_name_prefix="phyto-severity")
+    return _tile_pool
+
+
+def _count_pixels(img, leaf_mask, bounds, window) -> tuple[int, int]:
+    """(green, disease) pixel counts inside window = (y0, y1, x0, x1)."""
+    y0, y1, x0, x1 = window
+    hsv = cv2.cvtColor(img[y0:y1, x0:x1], cv2.COLOR_BGR2HSV)
+
+    # 1. Green range — healthy leaf tissue; 2. disease range from the CSV or default
+    green_mask = cv2.inRange(hsv, GREEN_LOWER, GREEN_UPPER)
+    disease_mask = cv2.inRange(hsv, *bounds)
+    if leaf_mask is not None:
+        tile_mask = leaf_mask[y0:y1, x0:x1]
+        green_mask = cv2.bitwise_and(green_mask, tile_mask)
+        disease_mask = cv2.bitwise_and(disease_mask, tile_mask)
+
+    return cv2.countNonZero(green_mask), cv2.countNonZero(disease_mask)
+
+
+def _tile_windows(height: int, width: int, tile: int) -> list[tuple[int, int, int, int]]:
+    return [
+        (y, min(y + tile, height), x, min(x + tile, width))
+        for y in range(0, height, tile)
+        for x in range(0, width, tile)
+    ]
+
+
+def _tiled_counts(img, leaf_mask, bounds, tile: int) -> list[tuple[int, int]]:
+    """Per-tile (green, disease) counts, row-major; tiles run concurrently in the pool."""
+    windows = _tile_windows(img.shape[0], img.shape[1], tile)
+    return list(_get_tile_pool().map(lambda w: _count_pixels(img, leaf_mask, bounds, w), windows))
+
+
+def _severity_pct(green: int, disease: int) -> float:
+    total_leaf = green + disease
+    if total_leaf == 0:
+        return 0.0
+    return round((disease / total_leaf) * 100, 2)
+
+
+def _split(image: bytes | LeafROI):
+    if isinstance(image, LeafROI):
+        return image.image, image.mask
+    return decode_image(image), None
+
+
+@timed_stage("severity")
+def calculate_severity(image: bytes | LeafROI, crop: str = None, disease: str = None) -> float:
     """
     Estimate disease severity as a percentage (0-100).
     Uses crop/disease specific HSV bounds from CSV if available.
+    Given a LeafROI, only pixels inside the leaf outline are counted.
+    Images above SEVERITY_TILED_MIN_PIXELS are counted tile by tile (same result).
     """
+    load_hsv_data()
     try:
-        arr = np.frombuffer(image_bytes, dtype=np.uint8)
-        img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
+        img, leaf_mask = _split(image)
 
         if img is None:
             return 0.0
 
-        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-
-        # 1. Green range — healthy leaf tissue (standard default)
-        green_lower = np.array([25, 40, 40])
-        green_upper = np.array([90, 255, 255])
-        green_mask = cv2.inRange(hsv, green_lower, green_upper)
-
-        # 2. Disease range — Lookup from CSV or use default brown/yellow
-        disease_lower = np.array([5, 50, 50])    # Default
-        disease_upper = np.array([25, 255, 255])  # Default
-
-        if crop and disease:
-            crop_key = crop.strip().lower()
-            disease_key = disease.strip().lower()
-            
-            # Simple normalization for matching (e.g., 'mites_and_trips' -> 'mites and trips')
-            disease_key = disease_key.replace('_', ' ')
-            
-            # Try direct match
-            found_bounds = HSV_DATA.get((crop_key, disease_key))
-            
-            if not found_bounds:
-                # Fuzzy match: check if the predicted disease string is contained in any CSV disease string
-                for (c, d), (l, u) in HSV_DATA.items():
-                    if c == crop_key and (disease_key in d or d in disease_key):
-                        found_bounds = (l, u)
-                        break
-            
-            if found_bounds:
-                disease_lower, disease_upper = found_bounds
-                # print(f"[vision_service] Using custom HSV bounds for {crop}/{disease}")
-
-        disease_mask = cv2.inRange(hsv, disease_lower, disease_upper)
-
-        green_pixels = cv2.countNonZero(green_mask)
-        disease_pixels = cv2.countNonZero(disease_mask)
-        total_leaf = green_pixels + disease_pixels
-
-        if total_leaf == 0:
-            return 0.0
+        bounds = disease_bounds(crop, disease)
+        height, width = img.shape[:2]
+        if height * width >= SEVERITY_TILED_MIN_PIXELS:
+            counts = _tiled_counts(img, leaf_mask, bounds, SEVERITY_TILE_SIZE)
+            green_pixels = sum(g for g, _ in counts)
+            disease_pixels = sum(d for _, d in counts)
+        else:
+            green_pixels, disease_pixels = _count_pixels(img, leaf_mask, bounds, (0, height, 0, width))
 
-        severity = (disease_pixels / total_leaf) * 100
-        return round(severity, 2)
+        return _severity_pct(green_pixels, disease_pixels)
 
     except Exception as e:
-        print(f"[vision_service] Severity calculation error: {e}")
+        logger.exception("Severity calculation error: %s", e)
         return 0.0
+
+
+@timed_stage("severity_map")
+def severity_map(image: bytes | LeafROI, crop: str = None, disease: str = None, tile: int = SEVERITY_TILE_SIZE) -> dict:
+    """
+    Tiled severity with a per-tile grid for hotspot maps.
+
+    `grid` is rows x cols of severity percentages (None where a tile holds
+    too little leaf to judge); the overall `severity` is computed from the
+    summed pixel counts, so it equals calculate_severity's. `region` is the
+    tiled area in original-frame pixels (x, y, w, h).
+    """
+    load_hsv_data()
+    img, leaf_mask = _split(image)
+    if img is None:
+        return {"severity": 0.0, "region": None, "tile_size": tile, "rows": 0, "cols": 0, "grid": []}
+
+    height, width = img.shape[:2]
+    rows, cols = -(-height // tile), -(-width // tile)
+    counts = _tiled_counts(img, leaf_mask, disease_bounds(crop, disease), tile)
+
+    grid = []
+    for r in range(rows):
+        row = []
+        for c in range(cols):
+            green, disease_px = counts[r * cols + c]
+            tile_pixels = min(tile, height - r * tile) * min(tile, width - c * tile)
+            enough_leaf = green + disease_px >= SEVERITY_TILE_MIN_LEAF_FRACTION * tile_pixels
+            row.append(_severity_pct(green, disease_px) if enough_leaf else None)
+        grid.append(row)
+
+    return {
+        "severity": _severity_pct(sum(g for g, _ in counts), sum(d for _, d in counts)),
+        "region": list(image.box) if isinstance(image, LeafROI) and image.box else [0, 0, width, height],
+        "tile_size": tile,
+        "rows": rows,
+        "cols": cols,
+        "grid": grid,
+    }
@@ -0,0 +1,172 @@
+"""
+Phyto — severity visualisation artifacts, built lazily.
+
+/api/predict registers the decoded leaf crop and its HSV bounds under the
+image hash plus a digest of the bounds (a reference, no pixel work), so a
+photo re-diagnosed with another model or label gets its own id. The first visuals request for
+that hash builds the masks once (at most VISUALS_MAX_SIDE px) and keeps
+them; each stage is encoded on demand — bilevel PNG for masks, WebP for
+photos — and the bytes are kept too. The cache is an LRU bounded by entry
+count and by the memory the retained pixels pin.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from app.core.config import VISUALS_CACHE_ENTRIES, VISUALS_CACHE_MB, VISUALS_MAX_SIDE, VISUALS_WEBP_QUALITY
+from app.core.metrics import record_cache, timed_stage
+from app.services.vision_service import GREEN_LOWER, GREEN_UPPER, LeafROI
+
+# Same stages as the reference renders in backend/visuals/
+STAGES = ("original", "hsv", "green_mask", "disease_mask", "final_result")
+MASK_STAGES = ("green_mask", "disease_mask")
+FORMATS = {"png": "image/png", "webp": "image/webp"}
+
+_OVERLAY_COLOUR = np.array([0, 0, 255], np.uint8)   # BGR red over diseased pixels
+
+
+def image_id(image_bytes: bytes) -> str:
+    return hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+
+
+def visuals_id(image_hash: str, bounds) -> str:
+    """Id of the artifacts for one photo under one set of HSV disease bounds."""
+    lower, upper = bounds
+    digest = hashlib.blake2b(np.asarray([lower, upper], np.int16).tobytes(), digest_size=4).hexdigest()
+    return f"{image_hash}-{digest}"
+
+
+def default_format(stage: str) -> str:
+    return "png" if stage in MASK_STAGES else "webp"
+
+
+class _Entry:
+    def __init__(self, leaf: LeafROI, bounds):
+        self.leaf = leaf
+        self.bounds = bounds
+        self.layers: dict[str, np.ndarray] | None = None
+        self.encoded: dict[tuple[str, str], bytes] = {}
+        self.lock = threading.Lock()
+
+    def nbytes(self) -> int:
+        """Memory this entry keeps alive (the crop is a view of the whole decoded frame)."""
+        total = sum(len(b) for b in self.encoded.values())
+        if self.layers:
+            return total + sum(layer.nbytes for layer in self.layers.values())
+        frame = self.leaf.image.base if self.leaf.image.base is not None else self.leaf.image
+        return total + frame.nbytes + (self.leaf.mask.nbytes if self.leaf.mask is not None else 0)
+
+
+class VisualsCache:
+    def __init__(self, max_entries: int = VISUALS_CACHE_ENTRIES, max_bytes: int = VISUALS_CACHE_MB * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: OrderedDict[str, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key: str, leaf: LeafROI, bounds):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                return
+            self._data[key] = _Entry(leaf, bounds)
+            self._evict()
+
+    def get(self, key: str) -> _Entry | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._data
+
+    def _evict(self):
+        """Drop from the cold end until both bounds hold (the newest entry always stays)."""
+        while len(self._data) > 1:
+            if len(self._data) <= self.max_entries and sum(e.nbytes() for e in self._data.values()) <= self.max_bytes:
+                break
+            self._data.popitem(last=False)
+
+    def shrink(self):
+        with self._lock:
+            self._evict()
+
+
+_cache = VisualsCache()
+
+
+def remember(image_hash: str, leaf: LeafROI, bounds) -> str:
+    """Called from /api/predict: keep what the visuals need; returns the visuals id."""
+    key = visuals_id(image_hash, bounds)
+    _cache.put(key, leaf, bounds)
+    return key
+
+
+def available(key: str) -> bool:
+    return key in _cache
+
+
+def _build_layers(entry: _Entry) -> dict[str, np.ndarray]:
+    img, leaf_mask = entry.leaf.image, entry.leaf.mask
+    scale = min(1.0, VISUALS_MAX_SIDE / max(img.shape[:2]))
+    if scale < 1:
+        size = (max(1, int(img.shape[1] * scale)), max(1, int(img.shape[0] * scale)))
+        img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+        if leaf_mask is not None:
+            leaf_mask = cv2.resize(leaf_mask, size, interpolation=cv2.INTER_NEAREST)
+    else:
+        img = img.copy()   # detach from the decoded frame
+
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    green_mask = cv2.inRange(hsv, GREEN_LOWER, GREEN_UPPER)
+    disease_mask = cv2.inRange(hsv, *entry.bounds)
+    if leaf_mask is not None:
+        green_mask = cv2.bitwise_and(green_mask, leaf_mask)
+        disease_mask = cv2.bitwise_and(disease_mask, leaf_mask)
+
+    final = img.copy()
+    hit = disease_mask > 0
+    final[hit] = (0.5 * final[hit] + 0.5 * _OVERLAY_COLOUR).astype(np.uint8)
+    return {"original": img, "hsv": hsv, "green_mask": green_mask, "disease_mask": disease_mask, "final_result": final}
+
+
+def _encode(layer: np.ndarray, stage: str, fmt: str) -> bytes:
+    if fmt == "webp":
+        params = [cv2.IMWRITE_WEBP_QUALITY, VISUALS_WEBP_QUALITY]
+    elif stage in MASK_STAGES:
+        params = [cv2.IMWRITE_PNG_BILEVEL, 1, cv2.IMWRITE_PNG_COMPRESSION, 9]
+    else:
+        params = [cv2.IMWRITE_PNG_COMPRESSION, 6]
+    ok, buf = cv2.imencode(f".{fmt}", layer, params)
+    if not ok:
+        raise ValueError(f"Could not encode {stage} as {fmt}")
+    return buf.tobytes()
+
+
+@timed_stage("visuals")
+def render(key: str, stage: str, fmt: str) -> bytes | None:
+    """Encoded artifact, or None if the image is no longer (or never was) cached."""
+    entry = _cache.get(key)
+    if entry is None:
+        record_cache("visuals", False)
+        return None
+
+    with entry.lock:
+        cached = entry.encoded.get((stage, fmt))
+        record_cache("visuals", cached is not None)
+        if cached is not None:
+            return cached
+        if entry.layers is None:
+            entry.layers = _build_layers(entry)
+            entry.leaf = None   # release the full-resolution frame; layers are all we need now
+        body = _encode(entry.layers[stage], stage, fmt)
+        entry.encoded[(stage, fmt)] = body
+
+    _cache.shrink()
+    return body
@@ -1,58 +1,140 @@
-import requests
-import time
-import json
-
-class WeatherService:
-    def __init__(self):
-        self.api_keys = {
-            'provider1': 'YOUR_API_KEY_1',  # Replace with actual API keys
-            'provider2': 'YOUR_API_KEY_2',  # Replace with actual API keys
-            'provider3': 'YOUR_API_KEY_3'   # Replace with actual API keys
-        }
-        self.cache = {}
-        self.rate_limit = 60  # Example rate limit, adjust per provider
-        self.last_request_time = 0
-
-    def get_weather(self, location):
-        # Check cache first
-        if location in self.cache:
-            return self.cache[location]
-        
-        # Check rate limiting
-        current_time = time.time()
-        if current_time - self.last_request_time < self.rate_limit:
-            time.sleep(self.rate_limit - (current_time - self.last_request_time))
-
-        try:
-            weather_data = self.fetch_weather_from_primary_provider(location)
-            self.cache[location] = weather_data  # Cache the result
-            self.last_request_time = time.time()
-            return weather_data
-        except Exception as e:
-            print(f"Error fetching from primary provider: {e}")
-            # Attempt to fallback to secondary provider
-            try:
-                weather_data = self.fetch_weather_from_secondary_provider(location)
-                self.cache[location] = weather_data
-                return weather_data
-            except Exception as e:
-                print(f"Error fetching from secondary provider: {e}")
-                return None
-
-    def fetch_weather_from_primary_provider(self, location):
-        response = requests.get(f'https://api.provider1.com/weather?location={location}&apikey={self.api_keys['provider1']}')
-        response.raise_for_status()  # Raise an error for bad responses
-        return response.json()
-
-    def fetch_weather_from_secondary_provider(self, location):
-        response = requests.get(f'https://api.provider2.com/weather?location={location}&apikey={self.api_keys['provider2']}')
-        response.raise_for_status()
-        return response.json()
-
-    def clear_cache(self):
-        self.cache.clear()  # Clear the cache if needed
-
-# Usage:
-# weather_service = WeatherService()
-# weather = weather_service.get_weather('New York')
-# print(weather)
\ No newline at end of file
+"""
+Phyto — current weather for the diagnosis location.
+
+Live readings come from Open-Meteo's forecast API (no key needed;
+WEATHER_API_URL points it elsewhere, e.g. at the load-test stub). Like the
+ISRO and Agmarknet lookups it is skipped in EDGE_MODE=offline and under
+QoS load shedding, sits behind its own circuit breaker, and always answers:
+without a live reading it returns the monthly climate normal for central
+Madhya Pradesh, marked `"source": "seasonal"`.
+"""
+
+import logging
+from datetime import datetime, timezone
+
+import httpx
+
+from app.core.config import WEATHER_API_URL
+from app.core import qos
+from app.core.circuit import get_breaker
+from app.core.metrics import record_upstream
+from app.services.edge_bundle import offline
+
+logger = logging.getLogger("phyto.weather_service")
+
+CURRENT_FIELDS = (
+    "temperature_2m,apparent_temperature,relative_humidity_2m,weather_code,wind_speed_10m,surface_pressure"
+)
+
+# WMO weather interpretation codes -> (condition, icon)
+WMO_CODES = {
+    0: ("Clear sky", "☀️"),
+    1: ("Mainly clear", "🌤️"),
+    2: ("Partly cloudy", "⛅"),
+    3: ("Overcast", "☁️"),
+    45: ("Fog", "🌫️"),
+    48: ("Fog", "🌫️"),
+    51: ("Light drizzle", "🌦️"),
+    53: ("Drizzle", "🌦️"),
+    55: ("Heavy drizzle", "🌦️"),
+    61: ("Light rain", "🌧️"),
+    63: ("Rain", "🌧️"),
+    65: ("Heavy rain", "🌧️"),
+    80: ("Rain showers", "🌦️"),
+    81: ("Rain showers", "🌧️"),
+    82: ("Violent rain showers", "⛈️"),
+    95: ("Thunderstorm", "⛈️"),
+    96: ("Thunderstorm with hail", "⛈️"),
+    99: ("Thunderstorm with hail", "⛈️"),
+}
+
+# Bhopal monthly normals: (temperature °C, relative humidity %, WMO code)
+MONTHLY_NORMALS = {
+    1: (17, 50, 1), 2: (20, 40, 1), 3: (25, 30, 0), 4: (30, 25, 0),
+    5: (34, 25, 0), 6: (30, 55, 2), 7: (26, 80, 63), 8: (25, 85, 63),
+    9: (26, 75, 80), 10: (25, 55, 1), 11: (21, 50, 0), 12: (18, 50, 0),
+}
+
+
+def describe(code: int | None) -> tuple[str, str]:
+    return WMO_CODES.get(code, ("Unknown", "🌡️"))
+
+
+def _seasonal_fallback() -> dict:
+    """Deterministic climate normal for the current month."""
+    temperature, humidity, code = MONTHLY_NORMALS[datetime.now(timezone.utc).month]
+    condition, icon = describe(code)
+    return {
+        "temperature": temperature,
+        "feels_like": temperature,
+        "condition": condition,
+        "icon": icon,
+        "humidity": humidity,
+        "wind_speed": 8,
+        "pressure": 1008,
+        "source": "seasonal",
+    }
+
+
+async def fetch_current(client: httpx.AsyncClient, lat: float, lon: float) -> dict:
+    """Open-Meteo `current` block for a point."""
+    params = {"latitude": lat, "longitude": lon, "current": CURRENT_FIELDS, "wind_speed_unit": "kmh"}
+    response = await client.get(WEATHER_API_URL, params=params)
+    response.raise_for_status()
+    return response.json()["current"]
+
+
+def _reading(current: dict) -> dict:
+    condition, icon = describe(current.get("weather_code"))
+    return {
+        "temperature": round(current["temperature_2m"]),
+        "feels_like": round(current.get("apparent_temperature", current["temperature_2m"])),
+        "condition": condition,
+        "icon": icon,
+        "humidity": round(current.get("relative_humidity_2m", 0)),
+        "wind_speed": round(current.get("wind_speed_10m", 0)),
+        "pressure": round(current.get("surface_pressure", 0)),
+        "source": "live",
+    }
+
+
+async def get_weather_data(lat: float, lon: float) -> dict:
+    """Current weather at (lat, lon); the seasonal normal when there is no live reading."""
+    fallback = _seasonal_fallback()
+
+    if offline():
+        record_upstream("weather", "offline")
+        return fallback
+
+    if not qos.current().live_upstreams:
+        record_upstream("weather", "shed")
+        return fallback
+
+    if not WEATHER_API_URL:
+        record_upstream("weather", "fallback")
+        return fallback
+
+    breaker = get_breaker("weather")
+    if not breaker.allow():
+        record_upstream("weather", "short_circuit")
+        return fallback
+
+    # Only the call trips the breaker, not parsing its answer
+    try:
+        async with httpx.AsyncClient(timeout=4.0) as client:
+            current = await fetch_current(client, lat, lon)
+    except Exception as e:
+        logger.warning("Weather lookup failed: %s", e)
+        breaker.failure()
+        record_upstream("weather", "error")
+        return fallback
+    breaker.success()
+
+    try:
+        reading = _reading(current)
+    except (KeyError, TypeError, ValueError) as e:
+        logger.warning("Unexpected weather payload: %s", e)
+        record_upstream("weather", "error")
+        return fallback
+    record_upstream("weather", "ok")
+    return reading
@@ -0,0 +1,119 @@
+"""
+Benchmark — /api/predict response serialization and bytes on the wire.
+
+Compares FastAPI's default path (jsonable_encoder + stdlib JSONResponse)
+with ORJSONResponse, and the body size uncompressed vs gzip vs brotli.
+
+Usage (from backend/):
+    python benchmarks/bench_serialization.py [--iterations 2000]
+"""
+
+import argparse
+import sys
+import time
+import zlib
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from app.core.compression import BROTLI_AVAILABLE  # noqa: E402
+from app.core.config import COMPRESSION_GZIP_LEVEL, COMPRESSION_BROTLI_QUALITY  # noqa: E402
+from app.core.responses import ORJSONResponse  # noqa: E402
+from app.services.remedy_service import get_remedy  # noqa: E402
+from app.services.jugaad_service import get_jugaad_remedies  # noqa: E402
+
+
+def sample_payload(disease: str = "Tomato___Late_blight") -> dict:
+    """A representative /api/predict body, built from the real remedy tables."""
+    return {
+        "disease": disease,
+        "confidence": 0.9312,
+        "model_used": "general",
+        "severity": 23.47,
+        "remedy": get_remedy(disease),
+        "jugaad_remedies": get_jugaad_remedies(disease),
+        "environmental_context": {
+            "in_wetland_zone": True,
+            "high_fungal_risk": True,
+            "zone_name": "Bhoj Wetland (Bhojtal)",
+            "swi_value": 0.312,
+            "saturation_level": "MODERATE",
+            "risk_amplifier": 1.3,
+            "bayesian_disease_risk_note": (
+                "Moderate soil moisture levels detected. Normal conditions for late-stage crop development. "
+                "Proximity to Bhoj Wetland (Bhojtal) indicates possible micro-climatic humidity pockets."
+            ),
+            "data_resolution": "500m (EOS-04 SAR)",
+            "last_updated": "2026-03-24",
+        },
+        "market_data": {
+            "commodity": "Tomato", "min_price": 1230.0, "max_price": 2870.0, "modal_price": 1998.0,
+            "unit": "Quintal", "market": "Bhopal (F&V)", "state": "Madhya Pradesh",
+            "sentiment": "Stable", "arrival_volume": 312,
+        },
+        "market_loss_data": {
+            "impact_percentage": 19.9, "loss_per_unit": 398.0, "currency": "INR",
+            "sensitivity_factor": 0.85, "recommendation": "Monitor",
+        },
+        "weather": {
+            "temperature": 31, "feels_like": 33, "condition": "Partly cloudy", "icon": "⛅",
+            "humidity": 48, "wind_speed": 11, "pressure": 1008,
+        },
+    }
+
+
+def _time_per_call(fn, iterations: int) -> float:
+    """Mean microseconds per call."""
+    fn()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def run(iterations: int) -> dict:
+    payload = sample_payload()
+    stdlib = JSONResponse(content=None)
+    fast = ORJSONResponse(content=None)
+
+    body = fast.render(payload)
+    sizes = {
+        "identity": len(body),
+        "gzip": len(zlib.compress(body, COMPRESSION_GZIP_LEVEL)) + 18,  # + gzip header/trailer
+    }
+    if BROTLI_AVAILABLE:
+        import brotli
+        sizes["br"] = len(brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY))
+
+    return {
+        "serialize_us": {
+            "fastapi_default": _time_per_call(lambda: stdlib.render(jsonable_encoder(payload)), iterations),
+            "stdlib_render": _time_per_call(lambda: stdlib.render(payload), iterations),
+            "orjson_render": _time_per_call(lambda: fast.render(payload), iterations),
+        },
+        "bytes": sizes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serialization / wire-size benchmark")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    results = run(args.iterations)
+    base = results["serialize_us"]["fastapi_default"]
+    print(f"{'serializer':<18}{'µs/call':>10}{'speedup':>10}")
+    for name, us in results["serialize_us"].items():
+        print(f"{name:<18}{us:>10.1f}{base / us:>9.1f}x")
+
+    identity = results["bytes"]["identity"]
+    print(f"\n{'encoding':<18}{'bytes':>10}{'ratio':>10}")
+    for name, size in results["bytes"].items():
+        print(f"{name:<18}{size:>10}{size / identity:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Parity check + timing — fused Preprocessor vs the torchvision transforms it
+replaced (Resize → ToTensor [→ Normalize]).
+
+Runs every model input size over synthetic leaves at several resolutions
+and colour modes, single-image and batched, and fails (exit 1) if any
+output differs by more than the tolerance. Timings are reported for the
+full pipeline (dominated by the PIL resize both paths share) and for the
+convert + normalize step on its own.
+
+Usage (from backend/):
+    python benchmarks/preprocess_parity.py [--tolerance 1e-5] [--iterations 50]
+"""
+
+import argparse
+import io
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import torch  # noqa: E402
+from PIL import Image  # noqa: E402
+from torchvision import transforms  # noqa: E402
+
+from app.core.config import IMAGE_SIZE_GENERIC, IMAGE_SIZE_CUSTOM, IMAGENET_MEAN, IMAGENET_STD  # noqa: E402
+from app.services.preprocess import Preprocessor  # noqa: E402
+from synthetic import synthetic_leaf  # noqa: E402
+
+RESOLUTIONS = [(96, 64), (640, 480), (1280, 960), (4000, 3000)]
+MODES = ["RGB", "RGBA", "L"]
+
+
+def reference_pipelines() -> dict:
+    """The pre-fusion ModelManager transforms, verbatim."""
+    return {
+        "generic": (
+            transforms.Compose([
+                transforms.Resize((IMAGE_SIZE_GENERIC, IMAGE_SIZE_GENERIC)),
+                transforms.ToTensor(),
+            ]),
+            Preprocessor(IMAGE_SIZE_GENERIC),
+        ),
+        "custom": (
+            transforms.Compose([
+                transforms.Resize((IMAGE_SIZE_CUSTOM, IMAGE_SIZE_CUSTOM)),
+                transforms.ToTensor(),
+                transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD),
+            ]),
+            Preprocessor(IMAGE_SIZE_CUSTOM, IMAGENET_MEAN, IMAGENET_STD),
+        ),
+    }
+
+
+def images() -> dict:
+    out = {}
+    for w, h in RESOLUTIONS:
+        base = Image.open(io.BytesIO(synthetic_leaf(w, h)))
+        for mode in MODES:
+            out[f"{w}x{h}/{mode}"] = base.convert(mode)
+    return out
+
+
+def check(tolerance: float) -> list[str]:
+    failures = []
+    samples = images()
+    for name, (reference, fused) in reference_pipelines().items():
+        worst = 0.0
+        for label, image in samples.items():
+            # Production decodes with .convert("RGB") before either path
+            expected = reference(image.convert("RGB")).unsqueeze(0)
+            diff = (fused(image) - expected).abs().max().item()
+            worst = max(worst, diff)
+            if diff > tolerance:
+                failures.append(f"{name}/{label}: single max abs diff {diff:.2e}")
+
+        batch_images = [img for label, img in samples.items() if label.endswith("/RGB")]
+        expected = torch.stack([reference(img) for img in batch_images])
+        batched = fused.batch(batch_images)
+        diff = (batched - expected).abs().max().item()
+        worst = max(worst, diff)
+        if diff > tolerance:
+            failures.append(f"{name}/batch: max abs diff {diff:.2e}")
+        if not batched.is_contiguous(memory_format=torch.channels_last):
+            failures.append(f"{name}/batch: buffer is not channels_last")
+        print(f"{name:<8} max abs diff {worst:.2e} over {len(samples)} images + batch of {len(batch_images)}")
+    return failures
+
+
+def _median_us(fn, iterations: int) -> float:
+    fn()
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1e6)
+    return statistics.median(samples)
+
+
+def timing(iterations: int):
+    """Median µs per image — full pipeline, and the post-resize part the fusion replaced."""
+    image = Image.open(io.BytesIO(synthetic_leaf(1280, 960))).convert("RGB")
+    print(f"\n{'pipeline':<28}{'torchvision µs':>16}{'fused µs':>12}{'speedup':>10}")
+    for name, (reference, fused) in reference_pipelines().items():
+        resized = image.resize((fused.size, fused.size), Image.BILINEAR)
+        for label, source in (("full 1280x960", image), ("convert+normalize", resized)):
+            before = _median_us(lambda: reference(source).unsqueeze(0), iterations)
+            after = _median_us(lambda: fused(source), iterations)
+            print(f"{name + ' ' + label:<28}{before:>16.0f}{after:>12.0f}{before / after:>9.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fused preprocessing parity check")
+    parser.add_argument("--tolerance", type=float, default=1e-5)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    failures = check(args.tolerance)
+    timing(args.iterations)
+    if failures:
+        print(f"\n{len(failures)} parity failure(s) beyond {args.tolerance:g}:")
+        for line in failures:
+            print(f"  ✗ {line}")
+        sys.exit(1)
+    print(f"\nParity OK (tolerance {args.tolerance:g}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+Benchmark suite — offline, reproducible timings for the hot paths.
+
+Covers ModelManager.predict (per model and the auto cascade), preprocessing
+and batched forward passes per architecture (randomly initialised weights,
+synthetic images), leaf-ROI extraction, the image quality gate, calculate_severity at several
+resolutions (whole frame and leaf crop), wetland point lookups and the
+bulk wetland join for 50k plots, remedy lookups, outbreak radius/heatmap queries over a synthetic aggregate of
+2M diagnoses, bulk loss estimates for 1M plots and full
+diagnosis-response serialization. No network or
+model files needed.
+
+Usage (from backend/):
+    python benchmarks/suite.py --output results.json
+    python benchmarks/suite.py --only severity remedy --quick
+    python benchmarks/suite.py --compare baseline.json --threshold 0.15
+
+With --compare, cases whose median got slower than the baseline by more
+than the threshold are flagged and the exit code is 1.
+"""
+
+import os
+
+# Offline and deterministic: no upstream keys, random weights instead of .pth files
+os.environ.update({
+    "MODEL_RANDOM_WEIGHTS": "1", "WARMUP_ON_STARTUP": "0",
+    "BHUVAN_API_KEY": "", "BHOONIDHI_API_KEY": "", "AGMARKNET_API_KEY": "",
+})
+
+import argparse  # noqa: E402
+import io  # noqa: E402
+import json  # noqa: E402
+import platform  # noqa: E402
+import statistics  # noqa: E402
+import sys  # noqa: E402
+import tempfile  # noqa: E402
+import time  # noqa: E402
+from datetime import datetime, timezone  # noqa: E402
+from functools import partial  # noqa: E402
+from pathlib import Path  # noqa: E402
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+import torch  # noqa: E402
+
+from bench_serialization import sample_payload  # noqa: E402
+from synthetic import SEED, synthetic_leaf, synthetic_outbreak_db, synthetic_waterbodies  # noqa: E402
+
+MODEL_KEYS = ["general", "soybean", "wheat", "chili"]
+BATCH_SIZES = [1, 4, 8]
+SEVERITY_RESOLUTIONS = [(256, 256), (1024, 768), (2048, 1536), (4000, 3000)]
+
+CASES = {}
+
+
+def register(group: str, name: str, setup, repeat: int = 20, quick_repeat: int = 5):
+    """`setup()` prepares inputs and returns the zero-arg callable to time."""
+    CASES[f"{group}/{name}"] = (group, setup, repeat, quick_repeat)
+
+
+# ── Cases ──────────────────────────────────────────────
+def _manager(model_key: str):
+    from app.services.ml_service import ModelManager
+    torch.manual_seed(SEED)
+    manager = ModelManager()
+    manager.warmup(model_key)
+    return manager
+
+
+def predict_case(model_key: str):
+    manager = _manager("general" if model_key == "auto" else model_key)
+    image = synthetic_leaf(640, 480)
+    return lambda: manager.predict(image, model_key)
+
+
+def forward_case(model_key: str, batch_size: int):
+    manager = _manager(model_key)
+    size = 128 if model_key == "general" else 224
+    batch = torch.rand(batch_size, 3, size, size, generator=torch.Generator().manual_seed(SEED))
+    batch = batch.contiguous(memory_format=torch.channels_last)
+
+    def run():
+        with torch.inference_mode():
+            manager.model(batch)
+    return run
+
+
+def preprocess_case(model_key: str, batch_size: int):
+    from PIL import Image
+    manager = _manager(model_key)
+    preprocess = manager.preprocess_generic if model_key == "general" else manager.preprocess_custom
+    images = [Image.open(io.BytesIO(synthetic_leaf(640, 480))).convert("RGB") for _ in range(batch_size)]
+    return lambda: preprocess.batch(images)
+
+
+def severity_case(width: int, height: int):
+    from app.services.vision_service import calculate_severity
+    image = synthetic_leaf(width, height)
+    return lambda: calculate_severity(image, crop="Tomato", disease="Late_blight")
+
+
+def roi_case(width: int, height: int):
+    from app.services.vision_service import prepare_leaf
+    image = synthetic_leaf(width, height)
+    return lambda: prepare_leaf(image)
+
+
+def severity_roi_case(width: int, height: int):
+    from app.services.vision_service import calculate_severity, prepare_leaf
+    leaf = prepare_leaf(synthetic_leaf(width, height))
+    return lambda: calculate_severity(leaf, crop="Tomato", disease="Late_blight")
+
+
+def quality_case(width: int, height: int):
+    from app.services.quality_gate import measure
+    image = synthetic_leaf(width, height)
+    return lambda: measure(image)
+
+
+def severity_map_case(width: int, height: int):
+    from app.services.vision_service import prepare_leaf, severity_map
+    leaf = prepare_leaf(synthetic_leaf(width, height))
+    return lambda: severity_map(leaf.whole_frame(), crop="Tomato", disease="Late_blight")
+
+
+def wetland_case():
+    from app.services.isro_service import find_wetland_zone
+    features = synthetic_waterbodies(200)
+    rng = np.random.default_rng(SEED)
+    points = [(rng.uniform(23.15, 23.35), rng.uniform(77.30, 77.50)) for _ in range(20)]
+
+    def run():
+        for lat, lon in points:
+            find_wetland_zone(features, lat, lon)
+    return run
+
+
+def wetland_bulk_case(n: int):
+    from app.services.geo_enrichment import _wetlands, make_plots
+    features = synthetic_waterbodies(200)
+    rng = np.random.default_rng(SEED)
+    plots = make_plots(None, rng.uniform(23.15, 23.35, n), rng.uniform(77.30, 77.50, n))
+    return lambda: _wetlands(plots, [features])
+
+
+def remedy_case():
+    from app.services.remedy_service import get_remedy
+    from app.services.jugaad_service import get_jugaad_remedies
+    labels = [
+        ("Tomato___Late_blight", None), ("tomato late blight", None),
+        ("Healthy", "soybean"), ("Black Rust", "wheat"), ("Unknown_label", None),
+    ]
+
+    def run():
+        for label, crop in labels:
+            get_remedy(label, crop)
+            get_jugaad_remedies(label, crop)
+    return run
+
+
+def _outbreak_store():
+    from app.services.outbreak_service import SQLiteOutbreakStore
+    path = Path(tempfile.mkdtemp()) / "outbreaks.sqlite3"
+    synthetic_outbreak_db(path, diagnoses=2_000_000)
+    return SQLiteOutbreakStore(path)
+
+
+def outbreak_radius_case(radius_km: float, days: int):
+    from app.services.outbreak_service import radius_summary
+    store = _outbreak_store()
+    return lambda: radius_summary(store, 23.2599, 77.4126, radius_km, days, "late blight")
+
+
+def outbreak_heatmap_case(zoom: str):
+    from app.services.outbreak_service import heatmap
+    store = _outbreak_store()
+    # Roughly Madhya Pradesh at precision 4 (~39 x 20 km, coarse rollup), a district at precision 6
+    if zoom == "state":
+        return lambda: heatmap(store, 21.0, 74.0, 26.9, 82.8, days=30, precision=4)
+    return lambda: heatmap(store, 23.0, 77.1, 23.5, 77.7, days=30, precision=6)
+
+
+def loss_bulk_case(n: int):
+    from app.services.loss_engine import estimate_bulk
+    rng = np.random.default_rng(SEED)
+    crops = np.array(["Tomato", "Potato", "Soybean", "Corn", "Grapes", "Wheat"])
+    columns = {
+        "commodity": crops[rng.integers(0, len(crops), n)].tolist(),
+        "severity": rng.uniform(0, 60, n).round(2).tolist(),
+        "area_ha": rng.uniform(0.2, 5, n).round(2).tolist(),
+        "yield_q_per_ha": rng.uniform(15, 300, n).round(1).tolist(),
+        "district": np.array(["Bhopal", "Sehore", "Raisen", "Vidisha"])[rng.integers(0, 4, n)].tolist(),
+    }
+    prices = {"Tomato": 1950, "Potato": 1350, "Soyabean": 4750, "Maize": 2150, "Grapes": 4400, "Wheat": 2500}
+    return lambda: estimate_bulk(columns, prices)
+
+
+def serialize_case(default_path: bool):
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from app.core.responses import ORJSONResponse
+    payload = sample_payload()
+    if default_path:
+        response = JSONResponse(content=None)
+        return lambda: response.render(jsonable_encoder(payload))
+    response = ORJSONResponse(content=None)
+    return lambda: response.render(payload)
+
+
+for key in MODEL_KEYS:
+    register("predict", key, partial(predict_case, key), repeat=20, quick_repeat=5)
+    for bs in BATCH_SIZES:
+        register("forward", f"{key}/bs{bs}", partial(forward_case, key, bs), repeat=10, quick_repeat=3)
+register("predict", "auto", partial(predict_case, "auto"), repeat=20, quick_repeat=5)
+for key in ("general", "wheat"):
+    for bs in (1, 8):
+        register("preprocess", f"{key}/bs{bs}", partial(preprocess_case, key, bs), repeat=30, quick_repeat=5)
+for w, h in SEVERITY_RESOLUTIONS:
+    register("severity", f"{w}x{h}", partial(severity_case, w, h), repeat=20 if w < 2000 else 8, quick_repeat=3)
+    register("severity", f"{w}x{h}/roi", partial(severity_roi_case, w, h), repeat=20 if w < 2000 else 8, quick_repeat=3)
+    register("roi", f"decode+crop/{w}x{h}", partial(roi_case, w, h), repeat=20 if w < 2000 else 8, quick_repeat=3)
+    register("quality", f"gate/{w}x{h}", partial(quality_case, w, h), repeat=20, quick_repeat=5)
+register("severity", "5000x4000/tiled", partial(severity_case, 5000, 4000), repeat=5, quick_repeat=2)
+register("severity", "5000x4000/map", partial(severity_map_case, 5000, 4000), repeat=5, quick_repeat=2)
+register("geo", "wetland_lookup_20pts_200polys", wetland_case, repeat=20, quick_repeat=5)
+register("geo", "wetland_bulk_50k_pts_200polys", partial(wetland_bulk_case, 50_000), repeat=10, quick_repeat=3)
+register("outbreak", "radius_5km_14d", partial(outbreak_radius_case, 5.0, 14), repeat=50, quick_repeat=10)
+register("outbreak", "radius_50km_90d", partial(outbreak_radius_case, 50.0, 90), repeat=20, quick_repeat=5)
+register("outbreak", "heatmap_state_30d", partial(outbreak_heatmap_case, "state"), repeat=20, quick_repeat=5)
+register("outbreak", "heatmap_district_30d", partial(outbreak_heatmap_case, "district"), repeat=20, quick_repeat=5)
+register("loss", "bulk_1M_plots", partial(loss_bulk_case, 1_000_000), repeat=5, quick_repeat=2)
+register("remedy", "lookup_mixed", remedy_case, repeat=200, quick_repeat=50)
+register("serialize", "orjson_response", partial(serialize_case, False), repeat=500, quick_repeat=100)
+register("serialize", "fastapi_default", partial(serialize_case, True), repeat=500, quick_repeat=100)
+
+
+# ── Runner ─────────────────────────────────────────────
+def run_case(name: str, quick: bool) -> dict:
+    group, setup, repeat, quick_repeat = CASES[name]
+    fn = setup()
+    fn()  # warm caches / lazy imports
+    n = quick_repeat if quick else repeat
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return {
+        "group": group,
+        "iterations": n,
+        "median_ms": statistics.median(samples),
+        "mean_ms": statistics.fmean(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(0.95 * len(samples)))],
+        "min_ms": samples[0],
+    }
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Cases whose median regressed by more than `threshold` (fraction)."""
+    regressions = []
+    for name, current in results["cases"].items():
+        before = baseline.get("cases", {}).get(name)
+        if not before:
+            continue
+        ratio = current["median_ms"] / before["median_ms"] if before["median_ms"] else 1.0
+        if ratio > 1 + threshold:
+            regressions.append(f"{name}: {before['median_ms']:.3f} ms -> {current['median_ms']:.3f} ms (+{(ratio - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="*", help="Groups or case-name prefixes to run")
+    parser.add_argument("--quick", action="store_true", help="Fewer iterations (smoke run)")
+    parser.add_argument("--threads", type=int, help="torch.set_num_threads for the run")
+    parser.add_argument("--output", type=Path, help="Write results JSON here")
+    parser.add_argument("--compare", type=Path, help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed median slowdown (0.15 = 15%%)")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(SEED)
+
+    names = [
+        n for n in CASES
+        if not args.only or any(n == o or n.startswith(o.rstrip("/") + "/") for o in args.only)
+    ]
+    results = {
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": environment(),
+        "cases": {},
+    }
+
+    print(f"{'case':<36}{'median ms':>12}{'p95 ms':>12}{'n':>6}")
+    for name in names:
+        r = run_case(name, args.quick)
+        results["cases"][name] = r
+        print(f"{name:<36}{r['median_ms']:>12.3f}{r['p95_ms']:>12.3f}{r['iterations']:>6}")
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+        print(f"\nWrote {args.output}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold * 100:.0f}%:")
+            for line in regressions:
+                print(f"  ✗ {line}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.threshold * 100:.0f}% against {args.compare}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Synthetic inputs shared by the benchmark suite and the load-test harness —
+seeded, so every run sees the same pixels and polygons.
+"""
+
+import cv2
+import numpy as np
+
+SEED = 1234
+
+
+def synthetic_leaf(width: int, height: int) -> bytes:
+    """JPEG of a green 'leaf' with brown lesions on a soil-coloured background."""
+    rng = np.random.default_rng(SEED)
+    img = np.empty((height, width, 3), np.uint8)
+    img[:] = (40, 70, 110)                                              # soil (BGR)
+    cv2.ellipse(img, (width // 2, height // 2), (width // 3, height // 3), 30, 0, 360, (40, 160, 60), -1)
+    for _ in range(25):
+        x, y = rng.integers(width // 4, 3 * width // 4), rng.integers(height // 4, 3 * height // 4)
+        cv2.circle(img, (int(x), int(y)), int(rng.integers(3, max(4, width // 40))), (30, 90, 150), -1)
+    noise = rng.integers(0, 12, img.shape, dtype=np.uint8)
+    ok, buf = cv2.imencode(".jpg", cv2.add(img, noise), [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return buf.tobytes()
+
+
+def synthetic_waterbodies(n: int = 200) -> list[dict]:
+    """GeoJSON-like polygons scattered over the Bhopal bbox, Bhojtal-sized and smaller."""
+    rng = np.random.default_rng(SEED)
+    features = []
+    for i in range(n):
+        cx, cy = rng.uniform(77.30, 77.50), rng.uniform(23.15, 23.35)
+        r = rng.uniform(0.002, 0.02)
+        angles = np.linspace(0, 2 * np.pi, 24, endpoint=False)
+        ring = [[float(cx + r * np.cos(a)), float(cy + r * 0.7 * np.sin(a))] for a in angles]
+        ring.append(ring[0])
+        features.append({"geometry": {"type": "Polygon", "coordinates": [ring]}, "properties": {"name": f"wb-{i}"}})
+    return features
+
+
+def synthetic_outbreak_db(path, diagnoses: int = 2_000_000, cells: int = 4000, days: int = 365) -> int:
+    """SQLite history file whose outbreak aggregate holds `diagnoses` located cases over Madhya Pradesh.
+
+    Writes the aggregate rows directly (what the insert trigger would have
+    produced), so building a multi-million-diagnosis store takes seconds.
+    Returns the number of fine aggregate rows.
+    """
+    import sqlite3
+    from datetime import date, timedelta
+    from app.services import geohash
+    from app.services.history_service import ensure_sqlite_schema
+    from app.core.config import OUTBREAK_TABLE, OUTBREAK_CELL_PRECISION, OUTBREAK_COARSE_PRECISION
+
+    rng = np.random.default_rng(SEED)
+    labels = ["Tomato___Late_blight", "Potato___Late_blight", "Tomato___Early_blight", "Soybean___Healthy", "Wheat___Brown_rust"]
+    # Clustered around a few district towns, as real uploads would be
+    towns = rng.uniform((21.5, 74.5), (26.0, 82.0), size=(12, 2))
+    towns[0] = (23.2599, 77.4126)   # Bhopal, where the radius cases are centred
+    points = towns[rng.integers(0, len(towns), cells)] + rng.normal(0, 0.15, (cells, 2))
+    cell_ids = sorted({geohash.encode(lat, lon, OUTBREAK_CELL_PRECISION) for lat, lon in points})
+    today = date.today()
+
+    rows = {}
+    per_row = max(1, diagnoses // (len(cell_ids) * days // 4))
+    remaining = diagnoses
+    while remaining > 0:
+        n = min(remaining, 200_000)
+        c = rng.integers(0, len(cell_ids), n // per_row + 1)
+        d = rng.integers(0, days, len(c))
+        lab = rng.integers(0, len(labels), len(c))
+        for ci, di, li in zip(c.tolist(), d.tolist(), lab.tolist()):
+            key = (cell_ids[ci], (today - timedelta(days=di)).isoformat(), labels[li])
+            rows[key] = rows.get(key, 0) + per_row
+        remaining -= n
+
+    conn = sqlite3.connect(path)
+    ensure_sqlite_schema(conn)
+    coarse = f"{OUTBREAK_TABLE}_coarse"
+    with conn:
+        conn.execute(f"DELETE FROM {OUTBREAK_TABLE}")
+        conn.execute(f"DELETE FROM {coarse}")
+        conn.executemany(
+            f"INSERT INTO {OUTBREAK_TABLE} (cell, day, label, cases, severity_sum, loss_sum) VALUES (?, ?, ?, ?, ?, ?)",
+            [(cell, day, label, cases, cases * 18.0, cases * 250.0) for (cell, day, label), cases in rows.items()],
+        )
+        conn.execute(
+            f"INSERT INTO {coarse} SELECT substr(cell, 1, {OUTBREAK_COARSE_PRECISION}), day, label, "
+            f"SUM(cases), SUM(severity_sum), SUM(loss_sum) FROM {OUTBREAK_TABLE} GROUP BY 1, 2, 3"
+        )
+    conn.close()
+    return len(rows)
@@ -0,0 +1,335 @@
+"""
+Load test — drive /api/predict (and optionally /chat/advisory) at a fixed
+concurrency against local upstream stubs, then report throughput, latency
+percentiles and per-stage / per-upstream error and fallback rates.
+
+By default it starts the stubs (loadtest/stubs.py) and the app itself
+(uvicorn, random model weights, upstreams pointed at the stubs). Use
+--app-url to target an already running app instead — it must have been
+started with the environment printed by --print-env.
+
+Usage (from backend/):
+    python loadtest/run.py --concurrency 16 --duration 60
+    python loadtest/run.py --models general=0.5,soybean=0.2,wheat=0.2,chili=0.1 \\
+        --sizes 640x480=0.6,1600x1200=0.3,4000x3000=0.1 --advisory-share 0.1
+    python loadtest/run.py --latency gemini=2.0 --error-rate agmarknet=0.1 --json out.json
+    python loadtest/run.py --models auto=0.7,wheat=0.3     # cascade early-exit rate / FLOPs saved
+
+Stage and upstream numbers come from the app's /metrics before and after the
+run. Each uvicorn worker keeps its own registry, so with --workers > 1 they
+cover only the worker that answered the scrape.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR / "benchmarks"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import httpx  # noqa: E402
+
+from stubs import add_knob_arguments, app_env, knob_arguments  # noqa: E402
+from synthetic import synthetic_leaf  # noqa: E402
+
+# Inside the Bhojtal stub polygon, so the wetland path is exercised
+DEFAULT_LAT, DEFAULT_LON = 23.25, 77.38
+
+METRIC_LINE = re.compile(r'^(\w+)(?:\{([^}]*)\})? ([0-9.eE+-]+)$')
+REPORTED_SERIES = (
+    "phyto_stage_seconds_sum", "phyto_stage_seconds_count", "phyto_upstream_events_total",
+    "phyto_cascade_exits_total", "phyto_cascade_gflops_saved_total",
+)
+LABEL = re.compile(r'(\w+)="([^"]*)"')
+
+
+# ── Traffic mix ────────────────────────────────────────
+def parse_weights(spec: str) -> list[tuple[str, float]]:
+    """'general=0.6,wheat=0.4' -> [('general', 0.6), ('wheat', 0.4)]"""
+    pairs = []
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        pairs.append((name.strip(), float(weight or 1)))
+    return pairs
+
+
+def pick(weights: list[tuple[str, float]]) -> str:
+    return random.choices([n for n, _ in weights], [w for _, w in weights])[0]
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def summarize(latencies: list[float]) -> dict:
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "p50_ms": percentile(values, 0.50) * 1000,
+        "p90_ms": percentile(values, 0.90) * 1000,
+        "p95_ms": percentile(values, 0.95) * 1000,
+        "p99_ms": percentile(values, 0.99) * 1000,
+        "max_ms": (values[-1] if values else 0.0) * 1000,
+    }
+
+
+# ── /metrics scraping ──────────────────────────────────
+def scrape(client: httpx.Client, app_url: str) -> dict:
+    """{(metric, frozenset(labels)): value} for the series the report uses."""
+    text = client.get(f"{app_url}/metrics").text
+    series = {}
+    for line in text.splitlines():
+        match = METRIC_LINE.match(line)
+        if not match:
+            continue
+        name, labels, value = match.groups()
+        if name in REPORTED_SERIES:
+            series[(name, frozenset(LABEL.findall(labels or "")))] = float(value)
+    return series
+
+
+def metric_deltas(before: dict, after: dict) -> dict:
+    stages = defaultdict(lambda: {"count": 0.0, "sum": 0.0})
+    upstreams = defaultdict(Counter)
+    exits = Counter()
+    gflops_saved = 0.0
+    for (name, labels), value in after.items():
+        delta = value - before.get((name, labels), 0.0)
+        if not delta:
+            continue
+        labels = dict(labels)
+        if name == "phyto_cascade_gflops_saved_total":
+            gflops_saved += delta
+            continue
+        if name == "phyto_cascade_exits_total":
+            exits[labels["exit"]] += delta
+            continue
+        if name == "phyto_upstream_events_total":
+            upstreams[labels["upstream"]][labels["outcome"]] += delta
+            continue
+        key = labels["stage"] + (f"[{labels['model_key']}]" if labels.get("model_key") else "")
+        stages[key]["sum" if name.endswith("_sum") else "count"] += delta
+
+    cascaded = sum(exits.values())
+    return {
+        "cascade": {
+            "requests": int(cascaded),
+            "exits": {k: int(v) for k, v in sorted(exits.items())},
+            "early_exit_rate": exits["early"] / cascaded if cascaded else 0.0,
+            "mean_gflops_saved": gflops_saved / cascaded if cascaded else 0.0,
+        },
+        "stages": {
+            key: {"calls": int(s["count"]), "mean_ms": s["sum"] / s["count"] * 1000 if s["count"] else 0.0}
+            for key, s in sorted(stages.items())
+        },
+        "upstreams": {
+            name: {
+                "calls": int(sum(outcomes.values())),
+                **{f"{o}_rate": outcomes[o] / sum(outcomes.values()) for o in ("ok", "error", "fallback")},
+            }
+            for name, outcomes in sorted(upstreams.items())
+        },
+    }
+
+
+# ── Process management ─────────────────────────────────
+def start_process(argv: list[str], env: dict) -> subprocess.Popen:
+    return subprocess.Popen(argv, cwd=BACKEND_DIR, env={**os.environ, **env})
+
+
+def wait_ready(url: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise SystemExit(f"Timed out waiting for {url}")
+
+
+# ── Load generation ────────────────────────────────────
+async def worker(client, app_url, args, models, sizes, images, deadline, results):
+    while time.monotonic() < deadline:
+        if random.random() < args.advisory_share:
+            kind = "advisory"
+            # Low confidence skips the pre-generated corpus and reaches Gemini
+            request = client.post(f"{app_url}/api/chat/advisory", json={
+                "disease": "Tomato___Late_blight", "confidence": random.uniform(0.3, 0.6),
+                "severity": random.uniform(5, 60),
+            })
+        else:
+            model, size = pick(models), pick(sizes)
+            kind = f"predict/{model}/{size}"
+            request = client.post(
+                f"{app_url}/api/predict",
+                params={"lat": args.lat, "lon": args.lon},
+                data={"model_key": model},
+                files={"file": ("leaf.jpg", images[size], "image/jpeg")},
+            )
+        t0 = time.perf_counter()
+        try:
+            status = str((await request).status_code)
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        results.append((kind, status, time.perf_counter() - t0))
+
+
+async def drive(app_url: str, args, models, sizes, images) -> tuple[list, float]:
+    results: list[tuple[str, str, float]] = []
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=args.request_timeout, limits=limits) as client:
+        t0 = time.monotonic()
+        deadline = t0 + args.duration
+        await asyncio.gather(*[
+            worker(client, app_url, args, models, sizes, images, deadline, results)
+            for _ in range(args.concurrency)
+        ])
+        elapsed = time.monotonic() - t0
+    return results, elapsed
+
+
+def build_report(results, elapsed, deltas, args) -> dict:
+    by_kind = defaultdict(list)
+    by_model = defaultdict(list)
+    by_size = defaultdict(list)
+    statuses = Counter()
+    for kind, status, seconds in results:
+        statuses[status] += 1
+        by_kind[kind.split("/")[0]].append(seconds)
+        if kind.startswith("predict/"):
+            _, model, size = kind.split("/")
+            by_model[model].append(seconds)
+            by_size[size].append(seconds)
+
+    ok = statuses.get("200", 0)
+    return {
+        "config": {
+            "concurrency": args.concurrency, "duration_s": args.duration, "workers": args.workers,
+            "models": args.models, "sizes": args.sizes, "advisory_share": args.advisory_share,
+        },
+        "requests": len(results),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(results) / elapsed if elapsed else 0.0,
+        "error_rate": 1 - ok / len(results) if results else 0.0,
+        "statuses": dict(statuses),
+        "latency": {kind: summarize(v) for kind, v in by_kind.items()},
+        "latency_by_model": {m: summarize(v) for m, v in sorted(by_model.items())},
+        "latency_by_size": {s: summarize(v) for s, v in sorted(by_size.items())},
+        **deltas,
+    }
+
+
+def print_report(report: dict):
+    print(f"\n{report['requests']} requests in {report['elapsed_s']:.1f} s — "
+          f"{report['throughput_rps']:.1f} req/s, error rate {report['error_rate'] * 100:.1f}%")
+    print("statuses: " + ", ".join(f"{k}={v}" for k, v in sorted(report["statuses"].items())))
+
+    header = f"{'':<22}{'n':>7}{'p50 ms':>10}{'p90 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    for title, rows in (("endpoint", report["latency"]), ("model_key", report["latency_by_model"]),
+                        ("image size", report["latency_by_size"])):
+        if not rows:
+            continue
+        print(f"\n{title:<22}{header[22:]}")
+        for name, s in rows.items():
+            print(f"{name:<22}{s['count']:>7}{s['p50_ms']:>10.1f}{s['p90_ms']:>10.1f}"
+                  f"{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}")
+
+    if report["stages"]:
+        print(f"\n{'stage':<28}{'calls':>7}{'mean ms':>10}")
+        for name, s in report["stages"].items():
+            print(f"{name:<28}{s['calls']:>7}{s['mean_ms']:>10.1f}")
+    cascade = report["cascade"]
+    if cascade["requests"]:
+        print(f"\ncascade (model_key=auto): {cascade['requests']} requests, "
+              f"early exit {cascade['early_exit_rate'] * 100:.1f}%, "
+              f"{cascade['mean_gflops_saved']:.2f} GFLOPs saved per request vs. the specialist")
+        print("  exits: " + ", ".join(f"{k}={v}" for k, v in cascade["exits"].items()))
+    if report["upstreams"]:
+        print(f"\n{'upstream':<14}{'calls':>7}{'ok':>8}{'error':>8}{'fallback':>10}")
+        for name, u in report["upstreams"].items():
+            print(f"{name:<14}{u['calls']:>7}{u['ok_rate'] * 100:>7.1f}%{u['error_rate'] * 100:>7.1f}%"
+                  f"{u['fallback_rate'] * 100:>9.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app-url", help="Target a running app instead of starting one")
+    parser.add_argument("--app-port", type=int, default=8100)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the spawned app")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent in-flight requests")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load")
+    parser.add_argument("--request-timeout", type=float, default=60.0)
+    parser.add_argument("--ready-timeout", type=float, default=120.0, help="Seconds to wait for /health/ready")
+    parser.add_argument("--models", default="general=0.6,soybean=0.15,wheat=0.15,chili=0.1")
+    parser.add_argument("--sizes", default="640x480=0.5,1280x960=0.3,4000x3000=0.2")
+    parser.add_argument("--advisory-share", type=float, default=0.0, help="Fraction of requests to /chat/advisory")
+    parser.add_argument("--lat", type=float, default=DEFAULT_LAT)
+    parser.add_argument("--lon", type=float, default=DEFAULT_LON)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--json", type=Path, help="Write the report as JSON here")
+    parser.add_argument("--print-env", action="store_true", help="Print the app environment for the stubs and exit")
+    add_knob_arguments(parser)
+    args = parser.parse_args()
+
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    env = {**app_env(stub_url), "MODEL_RANDOM_WEIGHTS": "1"}
+    if args.print_env:
+        for key, value in env.items():
+            print(f"{key}={value}")
+        return
+
+    random.seed(args.seed)
+    models, sizes = parse_weights(args.models), parse_weights(args.sizes)
+    images = {}
+    for size, _ in sizes:
+        w, h = (int(v) for v in size.split("x"))
+        images[size] = synthetic_leaf(w, h)
+
+    processes = [start_process(
+        [sys.executable, "loadtest/stubs.py", "--port", str(args.stub_port), "--seed", str(args.seed),
+         *knob_arguments(args)], {},
+    )]
+    try:
+        wait_ready(f"{stub_url}/stats", 30)
+        app_url = args.app_url
+        if not app_url:
+            app_url = f"http://127.0.0.1:{args.app_port}"
+            processes.append(start_process(
+                [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.app_port),
+                 "--workers", str(args.workers), "--log-level", "warning"], env,
+            ))
+        wait_ready(f"{app_url}/health/ready", args.ready_timeout)
+
+        with httpx.Client(timeout=10) as client:
+            before = scrape(client, app_url)
+            print(f"[loadtest] {args.concurrency} concurrent for {args.duration:.0f}s against {app_url}")
+            results, elapsed = asyncio.run(drive(app_url, args, models, sizes, images))
+            deltas = metric_deltas(before, scrape(client, app_url))
+    finally:
+        for proc in reversed(processes):
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    report = build_report(results, elapsed, deltas, args)
+    print_report(report)
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+        print(f"\nWrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
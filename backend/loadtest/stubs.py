@@ -0,0 +1,236 @@
+"""
+Local stand-ins for the upstreams /api/predict and /chat/advisory call —
+Bhuvan WFS, Bhoonidhi STAC, data.gov.in (Agmarknet), Open-Meteo weather and
+Gemini — so load tests never touch government APIs, public rate limits or a
+paid key.
+
+Each stub has its own latency / jitter / error / timeout knobs:
+
+    python loadtest/stubs.py --port 9100 \\
+        --latency bhuvan=0.25 --jitter bhuvan=0.1 --error-rate agmarknet=0.05 \\
+        --timeout-rate bhoonidhi=0.02
+
+Latencies are seconds (mean, with uniform ± jitter). An "error" is an HTTP
+503; a "timeout" sleeps past the client timeouts in the services (8–10 s).
+"""
+
+import argparse
+import asyncio
+import json
+import random
+from datetime import datetime, timedelta, timezone
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+STUBS = ["bhuvan", "bhoonidhi", "agmarknet", "weather", "gemini"]
+TIMEOUT_SLEEP_SECONDS = 15.0
+
+# Rough outline of Bhojtal, so wetland lookups inside Bhopal actually hit
+BHOJTAL_POLYGON = [[
+    [77.30, 23.22], [77.40, 23.20], [77.45, 23.25], [77.42, 23.29], [77.33, 23.28], [77.30, 23.22],
+]]
+
+ADVISORY_TEXT = json.dumps({
+    "english": {
+        "summary": "Stub advisory: remove infected leaves and avoid overhead irrigation.",
+        "commercial_remedy": {
+            "product": "Copper oxychloride 50% WP", "dosage": "3 g per litre",
+            "frequency": "Every 10 days", "notes": "Load-test stub.",
+        },
+        "traditional_remedy": {
+            "recipe": "Neem oil 5 ml per litre of water", "frequency": "Every 7 days", "notes": "Load-test stub.",
+        },
+    },
+    "hindi": {
+        "summary": "स्टब सलाह: संक्रमित पत्तियां हटाएं और ऊपर से सिंचाई न करें।",
+        "commercial_remedy": {
+            "product": "कॉपर ऑक्सीक्लोराइड 50% WP", "dosage": "3 ग्राम प्रति लीटर",
+            "frequency": "हर 10 दिन", "notes": "लोड-टेस्ट स्टब।",
+        },
+        "traditional_remedy": {
+            "recipe": "नीम तेल 5 मिली प्रति लीटर पानी", "frequency": "हर 7 दिन", "notes": "लोड-टेस्ट स्टब।",
+        },
+    },
+}, ensure_ascii=False)
+
+
+class StubProfile:
+    def __init__(self, latency=0.05, jitter=0.0, error_rate=0.0, timeout_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.calls = 0
+
+    async def apply(self) -> JSONResponse | None:
+        """Sleep for this call's latency; return an error response if one was drawn."""
+        self.calls += 1
+        roll = random.random()
+        if roll < self.timeout_rate:
+            await asyncio.sleep(TIMEOUT_SLEEP_SECONDS)
+        delay = max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+        await asyncio.sleep(delay)
+        if roll < self.timeout_rate + self.error_rate:
+            return JSONResponse({"error": "stub upstream failure"}, status_code=503)
+        return None
+
+
+def create_app(profiles: dict[str, StubProfile]) -> FastAPI:
+    app = FastAPI(title="Phyto upstream stubs")
+
+    @app.get("/bhuvan/wfs")
+    async def bhuvan_wfs():
+        if (failure := await profiles["bhuvan"].apply()) is not None:
+            return failure
+        return {
+            "type": "FeatureCollection",
+            "features": [{
+                "type": "Feature",
+                "properties": {"name": "Bhoj Wetland (Bhojtal)"},
+                "geometry": {"type": "Polygon", "coordinates": BHOJTAL_POLYGON},
+            }],
+        }
+
+    @app.get("/bhoonidhi/collections/{collection}/items")
+    async def bhoonidhi_items(collection: str):
+        if (failure := await profiles["bhoonidhi"].apply()) is not None:
+            return failure
+        today = datetime.now(timezone.utc)
+        return {
+            "type": "FeatureCollection",
+            "features": [
+                {
+                    "type": "Feature",
+                    "properties": {
+                        "datetime": (today - timedelta(days=d)).isoformat(),
+                        "swi": round(random.uniform(0.1, 0.8), 3),
+                    },
+                }
+                for d in (1, 7, 13)
+            ],
+        }
+
+    @app.get("/agmarknet/resource/{resource_id}")
+    async def agmarknet_resource(resource_id: str, request: Request):
+        if (failure := await profiles["agmarknet"].apply()) is not None:
+            return failure
+        commodity = request.query_params.get("filters[commodity]", "Tomato")
+        modal = random.randint(1200, 3000)
+        return {
+            "records": [{
+                "commodity": commodity, "market": "Bhopal", "state": "Madhya Pradesh",
+                "min_price": str(modal - 400), "max_price": str(modal + 600), "modal_price": str(modal),
+            }],
+        }
+
+    @app.get("/weather/forecast")
+    async def weather_forecast():
+        if (failure := await profiles["weather"].apply()) is not None:
+            return failure
+        temperature = round(random.uniform(22, 34), 1)
+        return {
+            "current": {
+                "temperature_2m": temperature,
+                "apparent_temperature": temperature + 1.5,
+                "relative_humidity_2m": random.randint(30, 90),
+                "weather_code": random.choice([0, 1, 2, 3, 61, 80]),
+                "wind_speed_10m": round(random.uniform(2, 20), 1),
+                "surface_pressure": round(random.uniform(1000, 1015), 1),
+            },
+        }
+
+    # google-genai: POST {base_url}/v1beta/models/{model}:generateContent
+    @app.post("/gemini/{version}/models/{model}:generateContent")
+    async def gemini_generate(version: str, model: str):
+        if (failure := await profiles["gemini"].apply()) is not None:
+            return failure
+        return {
+            "candidates": [{
+                "content": {"role": "model", "parts": [{"text": ADVISORY_TEXT}]},
+                "finishReason": "STOP",
+            }],
+            "modelVersion": model,
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return {name: p.calls for name, p in profiles.items()}
+
+    return app
+
+
+def app_env(base_url: str) -> dict[str, str]:
+    """Environment that points the Phyto services at stubs served from `base_url`."""
+    return {
+        "BHUVAN_WFS_BASE": f"{base_url}/bhuvan/wfs",
+        "BHOONIDHI_STAC_BASE": f"{base_url}/bhoonidhi",
+        "AGMARKNET_API_URL": f"{base_url}/agmarknet/resource/9ef84268-d588-465a-a308-a864a43d0070",
+        "WEATHER_API_URL": f"{base_url}/weather/forecast",
+        "GEMINI_BASE_URL": f"{base_url}/gemini",
+        "BHUVAN_API_KEY": "stub", "BHOONIDHI_API_KEY": "stub",
+        "AGMARKNET_API_KEY": "stub", "GEMINI_API_KEY": "stub",
+    }
+
+
+def parse_knobs(items: list[str] | None) -> dict[str, float]:
+    """['bhuvan=0.2', 'gemini=1.5'] -> {'bhuvan': 0.2, 'gemini': 1.5} ('all=' applies to every stub)."""
+    values = {}
+    for item in items or []:
+        name, _, value = item.partition("=")
+        if name not in STUBS and name != "all":
+            raise SystemExit(f"Unknown stub '{name}' (expected one of {', '.join(STUBS)} or all)")
+        for target in STUBS if name == "all" else [name]:
+            values[target] = float(value)
+    return values
+
+
+def add_knob_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", nargs="*", metavar="STUB=SECONDS", help="Mean latency per stub")
+    parser.add_argument("--jitter", nargs="*", metavar="STUB=SECONDS", help="Uniform ± jitter per stub")
+    parser.add_argument("--error-rate", nargs="*", metavar="STUB=FRACTION", help="Share of HTTP 503s per stub")
+    parser.add_argument("--timeout-rate", nargs="*", metavar="STUB=FRACTION", help="Share of hung calls per stub")
+
+
+def knob_arguments(args: argparse.Namespace) -> list[str]:
+    """Re-serialise the knob flags for the stub subprocess."""
+    argv = []
+    for flag in ("latency", "jitter", "error_rate", "timeout_rate"):
+        values = getattr(args, flag)
+        if values:
+            argv += [f"--{flag.replace('_', '-')}", *values]
+    return argv
+
+
+def build_profiles(args: argparse.Namespace) -> dict[str, StubProfile]:
+    latency, jitter = parse_knobs(args.latency), parse_knobs(args.jitter)
+    errors, timeouts = parse_knobs(args.error_rate), parse_knobs(args.timeout_rate)
+    default_latency = {"bhuvan": 0.15, "bhoonidhi": 0.2, "agmarknet": 0.1, "weather": 0.1, "gemini": 1.0}
+    return {
+        name: StubProfile(
+            latency=latency.get(name, default_latency[name]),
+            jitter=jitter.get(name, default_latency[name] / 4),
+            error_rate=errors.get(name, 0.0),
+            timeout_rate=timeouts.get(name, 0.0),
+        )
+        for name in STUBS
+    }
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--seed", type=int, help="Seed the latency / failure draws")
+    add_knob_arguments(parser)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    uvicorn.run(create_app(build_profiles(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Offline job — find the worker / thread-pool layout that serves the most
+diagnoses per second on this machine, and write it to data/tuning.json
+(TUNING_PATH), which the app reads at startup.
+
+Usage (from backend/):
+    python scripts/autotune.py                        # full sweep, ~20 s per configuration
+    python scripts/autotune.py --quick                # shorter runs, fewer combinations
+    python scripts/autotune.py --max-p95-ms 800 --duration 30
+
+Every configuration runs W worker processes side by side (like uvicorn
+--workers W), each with torch.set_num_threads(T) and cv2.setNumThreads(C),
+driving the real models (random weights if the .pth files are missing) and
+severity estimation with synthetic leaves of mixed sizes as fast as they
+can. Only layouts with W × T ≤ cores are tried, plus a baseline with the
+library defaults (every pool sized to the core count in every worker). The
+inference batch size is swept separately on single-process forward passes.
+
+The recommendation is the layout with the highest throughput whose p95
+latency stays under --max-p95-ms. Thread counts and the batch size are
+applied automatically at startup; the worker count cannot be set from inside
+the app, so start the server with the printed WEB_CONCURRENCY. A tuning
+file recorded on a machine with a different core count is ignored.
+"""
+
+import os
+
+# Measure the library defaults, not a previous tuning file; real weights when the
+# .pth files are present, random ones otherwise
+OUTPUT_PATH = os.getenv("TUNING_PATH")
+os.environ.update({
+    "TUNING_PATH": os.devnull, "WARMUP_ON_STARTUP": "0", "INFERENCE_MODE": "local", "MODEL_RANDOM_WEIGHTS": "1",
+})
+
+import argparse  # noqa: E402
+import json  # noqa: E402
+import multiprocessing as mp  # noqa: E402
+import platform  # noqa: E402
+import statistics  # noqa: E402
+import sys  # noqa: E402
+import time  # noqa: E402
+from datetime import datetime, timezone  # noqa: E402
+from pathlib import Path  # noqa: E402
+
+BACKEND = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND))
+sys.path.insert(0, str(BACKEND / "benchmarks"))
+
+# Mixed request sizes: phone photos dominate, with a few thumbnails and full-resolution uploads
+IMAGE_SIZES = [(640, 480)] * 5 + [(1024, 768)] * 3 + [(256, 256), (2048, 1536)]
+BATCH_SIZES = [1, 2, 4, 8, 16]
+BATCH_TOLERANCE = 0.05    # smallest batch within 5% of the best throughput wins
+
+
+def _worker(config: dict, model_key: str, duration: float, barrier, results):
+    """One simulated uvicorn worker: pin the pools, load the model, serve synthetic requests."""
+    os.environ.update({
+        "TORCH_INTEROP_THREADS": str(config["torch_interop_threads"]),
+        "TORCH_NUM_THREADS": str(config["torch_threads"]),
+        "OPENCV_NUM_THREADS": str(config["opencv_threads"]),
+        "SEVERITY_TILE_WORKERS": str(config["severity_tile_workers"]),
+    })
+    from synthetic import synthetic_leaf
+    from app.services.ml_service import ModelManager
+    from app.services.vision_service import calculate_severity, prepare_leaf
+
+    manager = ModelManager()
+    manager.warmup(model_key)
+    images = [synthetic_leaf(w, h) for w, h in IMAGE_SIZES]
+    for image in images[:2]:
+        manager.predict(image, model_key)
+        calculate_severity(prepare_leaf(image))
+
+    barrier.wait()
+    latencies = []
+    deadline = time.perf_counter() + duration
+    i = 0
+    while time.perf_counter() < deadline:
+        image = images[i % len(images)]
+        started = time.perf_counter()
+        result = manager.predict(image, model_key)
+        leaf = prepare_leaf(image)
+        if leaf is not None:
+            calculate_severity(leaf, disease=result.get("disease"))
+        latencies.append(time.perf_counter() - started)
+        i += 1
+    results.put(latencies)
+
+
+def run_config(config: dict, model_key: str, duration: float) -> dict:
+    ctx = mp.get_context("spawn")
+    workers = config["workers"]
+    barrier, results = ctx.Barrier(workers + 1), ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(config, model_key, duration, barrier, results)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    barrier.wait()
+    started = time.perf_counter()
+    latencies = [lat for _ in procs for lat in results.get()]
+    elapsed = time.perf_counter() - started
+    for p in procs:
+        p.join()
+
+    latencies.sort()
+    return {
+        **config,
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 1),
+    }
+
+
+def sweep_batch(model_key: str, threads: int, batch_sizes: list[int], duration: float) -> dict[int, float]:
+    """Images/s of the bare forward pass per batch size, in this process."""
+    import torch
+    from app.services.ml_service import ModelManager
+
+    torch.set_num_threads(threads)
+    manager = ModelManager()
+    manager.warmup(model_key)
+    size = 128 if model_key == "general" else 224
+    throughput = {}
+    with torch.inference_mode():
+        for batch_size in batch_sizes:
+            batch = torch.rand(batch_size, 3, size, size).contiguous(memory_format=torch.channels_last)
+            manager.model(batch)
+            done, started = 0, time.perf_counter()
+            while time.perf_counter() - started < duration:
+                manager.model(batch)
+                done += batch_size
+            throughput[batch_size] = round(done / (time.perf_counter() - started), 1)
+    return throughput
+
+
+def candidates(cores: int, quick: bool) -> list[dict]:
+    counts = [n for n in (1, 2, 4, 8, 16, 32, 64) if n <= cores]
+    if cores not in counts:
+        counts.append(cores)
+    configs = []
+    for workers in counts:
+        for threads in counts:
+            if workers * threads > cores or (quick and workers * threads != cores):
+                continue
+            for opencv in sorted({1, threads}):
+                configs.append({
+                    "workers": workers, "torch_threads": threads, "torch_interop_threads": 1,
+                    "opencv_threads": opencv, "severity_tile_workers": opencv,
+                })
+    return configs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="general", help="Model the synthetic load runs (default: general)")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of load per configuration")
+    parser.add_argument("--max-p95-ms", type=float, default=1000.0, help="Latency budget a layout must meet")
+    parser.add_argument("--max-workers", type=int, help="Cap on worker processes (default: core count)")
+    parser.add_argument("--quick", action="store_true", help="3 s runs, only layouts that use every core")
+    parser.add_argument("-o", "--output", help="Tuning file to write (default: TUNING_PATH)")
+    args = parser.parse_args()
+
+    from app.core.config import DATA_DIR
+    output = Path(args.output or OUTPUT_PATH or DATA_DIR / "tuning.json")
+    duration = 3.0 if args.quick else args.duration
+    cores = os.cpu_count() or 1
+
+    configs = [c for c in candidates(cores, args.quick) if not args.max_workers or c["workers"] <= args.max_workers]
+    # Library defaults at the most workers tried: 0 / -1 leave torch's and OpenCV's own pool sizes
+    baseline_config = {
+        "workers": configs[-1]["workers"], "torch_threads": 0, "torch_interop_threads": 0,
+        "opencv_threads": -1, "severity_tile_workers": min(4, cores),
+    }
+    print(f"{cores} cores — {len(configs)} layouts + baseline, {duration:.0f}s each, model '{args.model}'")
+
+    results = []
+    for config in [baseline_config] + configs:
+        result = run_config(config, args.model, duration)
+        results.append(result)
+        print(
+            f"  workers={result['workers']:<3} torch={result['torch_threads']:<3} opencv={result['opencv_threads']:<3} "
+            f"{result['rps']:8.2f} req/s  p50 {result['p50_ms']:7.1f} ms  p95 {result['p95_ms']:7.1f} ms"
+        )
+    baseline = results[0]
+
+    # The defaults stay eligible: on some machines they are already the best layout
+    within = [r for r in results if r["p95_ms"] <= args.max_p95_ms]
+    if not within:
+        print(f"No layout met p95 ≤ {args.max_p95_ms:.0f} ms — recommending the lowest-latency one")
+        best = min(results, key=lambda r: r["p95_ms"])
+    else:
+        best = max(within, key=lambda r: (r["rps"], -r["workers"]))
+
+    batches = sweep_batch(args.model, cores, BATCH_SIZES[:3] if args.quick else BATCH_SIZES, min(duration, 5.0))
+    top = max(batches.values())
+    batch_size = min(b for b, ips in batches.items() if ips >= top * (1 - BATCH_TOLERANCE))
+    print("  batch images/s: " + ", ".join(f"{b}: {ips}" for b, ips in batches.items()) + f" → {batch_size}")
+
+    recommended = {
+        "workers": best["workers"],
+        "torch_threads": best["torch_threads"],
+        "torch_interop_threads": best["torch_interop_threads"],
+        "opencv_threads": best["opencv_threads"],
+        "severity_tile_workers": best["severity_tile_workers"],
+        "inference_max_batch": batch_size,
+        "inference_server_threads": cores,
+    }
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "cpu_count": cores,
+        "host": {"machine": platform.machine(), "processor": platform.processor(), "python": platform.python_version()},
+        "model": args.model,
+        "duration_s": duration,
+        "max_p95_ms": args.max_p95_ms,
+        "recommended": recommended,
+        "baseline": baseline,
+        "results": results[1:],
+        "batch_images_per_s": batches,
+    }, indent=2), encoding="utf-8")
+
+    gain = (best["rps"] / baseline["rps"] - 1) * 100 if baseline["rps"] else 0.0
+    print(f"Recommended: {recommended} ({best['rps']} req/s, {gain:+.0f}% vs library defaults)")
+    print(f"Wrote {output}. Start the API with:")
+    print(f"  WEB_CONCURRENCY={best['workers']} uvicorn app.main:app --host 0.0.0.0 --port 8000")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Offline job — build the edge bundle (data/edge_bundle.bin) that kiosks read
+when they cannot reach Bhuvan, Bhoonidhi or Agmarknet.
+
+Usage (from backend/):
+    python scripts/build_edge_bundle.py                              # fetch live data for EDGE_BUNDLE_AOI
+    python scripts/build_edge_bundle.py --waterbodies lakes.geojson  # waterbodies from a file instead of WFS
+    python scripts/build_edge_bundle.py --aoi 77.0,23.0,78.0,23.6 -o /media/usb/edge_bundle.bin
+
+Run it while online, with the API keys set, and copy the file to the
+kiosks. Anything that cannot be fetched is left out of the bundle (prices
+fall back to the seasonal base prices without the random daily variation),
+and the services keep their built-in fallbacks for what is missing.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.config import (  # noqa: E402
+    AGMARKNET_API_KEY, BHOONIDHI_API_KEY, BHUVAN_API_KEY, EDGE_BUNDLE_AOI, EDGE_BUNDLE_PATH,
+    EDGE_BUNDLE_SWI_CELL_DEG, HSV_VALUES_PATH, JUGAAD_REMEDIES_PATH, REMEDIES_PATH,
+)
+from app.services import edge_bundle  # noqa: E402
+from app.services.agmarknet_service import BASE_PRICES, COMMODITY_MAP, fetch_latest_record  # noqa: E402
+from app.services.isro_service import BUFFER_DEG, fetch_swi_items, fetch_waterbodies  # noqa: E402
+
+STAC_LIMIT = 500
+
+
+def _aoi(text: str) -> tuple[float, float, float, float]:
+    min_lon, min_lat, max_lon, max_lat = (float(v) for v in text.split(","))
+    if not (min_lon < max_lon and min_lat < max_lat):
+        raise argparse.ArgumentTypeError("AOI must be minlon,minlat,maxlon,maxlat")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+async def _fetch(aoi, waterbodies_path: str | None, scenes_path: str | None):
+    """(waterbody features, SWI scenes, {commodity: price}) — files win over live fetches."""
+    bbox = ",".join(str(v) for v in aoi)
+    async with httpx.AsyncClient(timeout=60.0) as client:
+        if waterbodies_path:
+            features = json.loads(Path(waterbodies_path).read_text(encoding="utf-8"))["features"]
+        elif BHUVAN_API_KEY:
+            features = await fetch_waterbodies(client, bbox)
+        else:
+            features = None
+
+        if scenes_path:
+            scenes = json.loads(Path(scenes_path).read_text(encoding="utf-8"))["features"]
+        elif BHOONIDHI_API_KEY:
+            scenes = await fetch_swi_items(client, bbox, STAC_LIMIT)
+        else:
+            scenes = None
+
+        prices = {}
+        for commodity in sorted(set(COMMODITY_MAP.values()) | BASE_PRICES.keys()):
+            record = None
+            if AGMARKNET_API_KEY:
+                try:
+                    record = await fetch_latest_record(client, commodity)
+                except Exception as e:
+                    print(f"  agmarknet {commodity}: {e}")
+            if record is not None:
+                prices[commodity] = {
+                    "min_price": float(record["min_price"]),
+                    "max_price": float(record["max_price"]),
+                    "modal_price": float(record["modal_price"]),
+                    "market": record.get("market", "Bhopal (F&V)"),
+                    "state": record.get("state", "Madhya Pradesh"),
+                    "date": record.get("arrival_date"),
+                    "source": "agmarknet",
+                }
+            elif commodity in BASE_PRICES:
+                base = BASE_PRICES[commodity]
+                prices[commodity] = {
+                    "min_price": float(base["min"]),
+                    "max_price": float(base["max"]),
+                    "modal_price": float(base["modal"]),
+                    "market": "Bhopal (F&V)",
+                    "state": "Madhya Pradesh",
+                    "date": None,
+                    "source": "seasonal",
+                }
+    return features, scenes, prices
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-o", "--output", default=str(EDGE_BUNDLE_PATH), help="Bundle file to write")
+    parser.add_argument("--aoi", type=_aoi, default=_aoi(EDGE_BUNDLE_AOI), help="minlon,minlat,maxlon,maxlat")
+    parser.add_argument("--cell", type=float, default=EDGE_BUNDLE_SWI_CELL_DEG, help="SWI grid cell size in degrees")
+    parser.add_argument("--waterbodies", help="GeoJSON FeatureCollection of waterbodies (default: Bhuvan WFS)")
+    parser.add_argument("--swi-scenes", help="STAC FeatureCollection of SWI scenes (default: Bhoonidhi)")
+    args = parser.parse_args()
+
+    features, scenes, prices = asyncio.run(_fetch(args.aoi, args.waterbodies, args.swi_scenes))
+    arrays, documents, meta = {}, {"prices": prices}, {"aoi": list(args.aoi)}
+
+    if features:
+        packed, names = edge_bundle.pack_waterbodies(features, BUFFER_DEG)
+        arrays.update(packed)
+        documents["waterbody/names"] = names
+        meta["waterbody"] = {"features": len(features), "polygons": len(names), "buffer_deg": BUFFER_DEG}
+    print(f"waterbodies: {len(features) if features else 'none'}")
+
+    if scenes:
+        grid, used = edge_bundle.paint_swi_grid(scenes, args.aoi, args.cell)
+        if used:
+            arrays["swi/grid"] = grid
+            meta["swi"] = {"bounds": list(args.aoi), "cell_deg": args.cell, "scenes": used}
+        print(f"swi: {used} scenes, {int(np.count_nonzero(~np.isnan(grid)))}/{grid.size} cells covered")
+    else:
+        print("swi: none")
+
+    live = sum(p["source"] == "agmarknet" for p in prices.values())
+    print(f"prices: {len(prices)} commodities ({live} live)")
+
+    if Path(HSV_VALUES_PATH).exists():
+        from app.services.vision_service import read_hsv_csv
+        hsv = read_hsv_csv(HSV_VALUES_PATH)
+        documents["hsv/keys"] = [list(key) for key in hsv]
+        arrays["hsv/lower"] = np.array([lower for lower, _ in hsv.values()], dtype=np.int64).reshape(-1, 3)
+        arrays["hsv/upper"] = np.array([upper for _, upper in hsv.values()], dtype=np.int64).reshape(-1, 3)
+        print(f"hsv: {len(hsv)} entries")
+
+    for name, path in (("remedies", REMEDIES_PATH), ("jugaad_remedies", JUGAAD_REMEDIES_PATH)):
+        if Path(path).exists():
+            documents[name] = json.loads(Path(path).read_text(encoding="utf-8"))
+            print(f"{name}: {len(documents[name])} entries")
+
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    version = edge_bundle.write_bundle(Path(args.output), arrays, documents, meta)
+    print(f"Wrote {args.output} — version {version}, {Path(args.output).stat().st_size / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
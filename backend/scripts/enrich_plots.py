@@ -0,0 +1,61 @@
+"""
+Offline job — enrich a CSV of farm plots with wetland proximity and soil
+wetness, the same way POST /api/enrich/bulk does, without going through
+the API.
+
+Usage (from backend/):
+    python scripts/enrich_plots.py plots.csv -o enriched.csv
+    python scripts/enrich_plots.py plots.csv --format geojson -o enriched.geojson
+    cat plots.csv | python scripts/enrich_plots.py - > enriched.csv
+
+The input needs `lat` and `lon` columns; an `id` or `plot_id` column is
+carried through.
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services import geo_enrichment  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="CSV file, or - for stdin")
+    parser.add_argument("--format", choices=("csv", "geojson"), default="csv")
+    parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+    args = parser.parse_args()
+
+    text = sys.stdin.read() if args.input == "-" else Path(args.input).read_text(encoding="utf-8-sig")
+    try:
+        plots = geo_enrichment.parse_csv(text)
+    except ValueError as e:
+        sys.exit(f"error: {e}")
+
+    started = time.perf_counter()
+    result = asyncio.run(geo_enrichment.enrich(plots))
+    chunks = geo_enrichment.iter_csv(result) if args.format == "csv" else geo_enrichment.iter_geojson(result)
+
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+    stats = result.stats
+    print(
+        f"{stats['plots']} plots, {stats['tiles']} tiles, {stats['upstream_requests']} upstream requests "
+        f"({stats['upstream_failures']} failed), "
+        f"{stats['in_wetland_zone']} in a wetland zone ({time.perf_counter() - started:.2f}s)",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Offline job — pregenerate the bilingual advisory for every model's disease
+labels × severity band and write them to the advisory corpus
+(data/advisory_corpus.json), which `generate_advisory` serves first.
+
+Usage (from backend/):
+    python scripts/pregenerate_advisories.py              # fill in missing entries
+    python scripts/pregenerate_advisories.py --force      # regenerate everything
+    python scripts/pregenerate_advisories.py --labels general/Tomato___Late_blight soybean/Healthy
+
+Progress is saved as it goes, so a run that hits the Gemini quota can simply
+be restarted later.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.advisory_corpus import (  # noqa: E402
+    ALL_LABELS, AdvisoryCorpus, band_midpoints, entry_key, load_corpus, save_corpus,
+)
+from app.services.llm_service import PROMPT_VERSION, generate_live_advisory  # noqa: E402
+
+SAVE_EVERY = 10
+MAX_CONSECUTIVE_FAILURES = 5
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--labels", nargs="*", help="Only these model_key/label pairs (default: every model's labels)")
+    parser.add_argument("--force", action="store_true", help="Regenerate entries that already exist")
+    parser.add_argument("--confidence", type=float, default=0.9, help="Confidence quoted in the prompt")
+    parser.add_argument("--sleep", type=float, default=1.0, help="Seconds between Gemini calls")
+    args = parser.parse_args()
+
+    corpus = AdvisoryCorpus() if args.force else load_corpus(PROMPT_VERSION)
+    labels = [tuple(pair.split("/", 1)) for pair in args.labels] if args.labels else ALL_LABELS
+    unknown = [pair for pair in args.labels or () if tuple(pair.split("/", 1)) not in ALL_LABELS]
+    if unknown:
+        parser.error(f"--labels expects model_key/label pairs such as wheat/Healthy; unknown: {', '.join(unknown)}")
+    bands = band_midpoints(corpus.bands)
+
+    todo = [
+        (model_key, label, band, severity)
+        for model_key, label in labels
+        for band, severity in bands.items()
+        if band not in corpus.entries.get(entry_key(model_key, label), {})
+    ]
+    print(f"{len(todo)} advisories to generate ({len(labels)} labels × {len(bands)} bands, prompt {PROMPT_VERSION}).")
+
+    done = failures = 0
+    for model_key, label, band, severity in todo:
+        key = entry_key(model_key, label)
+        try:
+            advisory = generate_live_advisory(label, args.confidence, severity, model_key)
+        except Exception as e:
+            failures += 1
+            print(f"  ✗ {key} [{band}]: {e}")
+            if failures >= MAX_CONSECUTIVE_FAILURES:
+                print("Too many consecutive failures (quota?) — stopping; rerun later to resume.")
+                break
+            continue
+
+        failures = 0
+        corpus.entries.setdefault(key, {})[band] = advisory
+        done += 1
+        print(f"  ✓ {key} [{band}]")
+        if done % SAVE_EVERY == 0:
+            save_corpus(corpus, PROMPT_VERSION)
+        time.sleep(args.sleep)
+
+    if done:
+        version = save_corpus(corpus, PROMPT_VERSION)
+        print(f"Wrote corpus v{version}: {len(corpus)} advisories ({done} new).")
+    else:
+        print("Nothing new written.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Startup profile — what importing the app costs, `-X importtime` style.
+
+Runs `python -X importtime -c "import app.main"` in a fresh interpreter,
+reports the wall time and the import cost per package, and flags any heavy
+dependency (torch, cv2, ...) that leaked onto the import path. With
+--warmup it also times the background warmup (time-to-ready).
+
+Usage (from backend/):
+    python scripts/startup_profile.py [--top 15] [--warmup] [--json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Must not be imported until warmup / first use
+HEAVY_MODULES = ["torch", "torchvision", "cv2", "shapely", "google.genai", "supabase", "PIL"]
+
+
+def profile_import(module: str = "app.main") -> dict:
+    code = (
+        "import time, sys; t0 = time.perf_counter(); "
+        f"import {module}; "
+        "print('WALL', time.perf_counter() - t0); "
+        f"print('HEAVY', *[m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+    )
+    env = {**os.environ, "PYTHONPATH": str(BACKEND_DIR)}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else "import failed")
+
+    marks = {line.split()[0]: line.split()[1:] for line in proc.stdout.splitlines() if line.startswith(("WALL", "HEAVY"))}
+    wall_s, leaked = float(marks["WALL"][0]), marks["HEAVY"]
+
+    # "import time:       self [us] |  cumulative | imported package"
+    # Sum self time per root package, so "fastapi.routing" counts towards fastapi.
+    by_package: dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        root = name.strip().split(".")[0]
+        by_package[root] = by_package.get(root, 0) + int(self_us)
+
+    top = sorted(by_package.items(), key=lambda x: x[1], reverse=True)
+    return {"wall_seconds": wall_s, "heavy_modules_imported": leaked, "top_imports": top}
+
+
+def profile_warmup() -> dict:
+    sys.path.insert(0, str(BACKEND_DIR))
+    from app.core import warmup
+
+    t0 = time.perf_counter()
+    warmup.run_warmup()
+    return {"seconds": time.perf_counter() - t0, **warmup.readiness()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile app import and warmup time")
+    parser.add_argument("--top", type=int, default=15, help="How many imports to list")
+    parser.add_argument("--warmup", action="store_true", help="Also time the warmup (time-to-ready)")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable JSON")
+    args = parser.parse_args()
+
+    report = {"import": profile_import()}
+    report["import"]["top_imports"] = report["import"]["top_imports"][:args.top]
+    if args.warmup:
+        report["warmup"] = profile_warmup()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    imp = report["import"]
+    print(f"import app.main: {imp['wall_seconds'] * 1000:.0f} ms (time-to-live)")
+    print(f"heavy modules on import path: {', '.join(imp['heavy_modules_imported']) or 'none'}")
+    print(f"\n{'self ms':>10}  package")
+    for name, us in imp["top_imports"]:
+        print(f"{us / 1000:>10.1f}  {name}")
+
+    if args.warmup:
+        w = report["warmup"]
+        print(f"\nwarmup: {w['seconds']:.2f} s (time-to-ready) — ready={w['ready']}")
+        for name, step in w["steps"].items():
+            detail = f"{step['seconds']:.3f} s" if step["status"] == "ok" else f"ERROR: {step['error']}"
+            print(f"  {name:<10} {detail}")
+
+
+if __name__ == "__main__":
+    main()
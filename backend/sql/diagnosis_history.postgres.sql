@@ -0,0 +1,104 @@
+-- Phyto — diagnosis history and outbreak aggregates (Supabase / Postgres).
+-- Run once in the Supabase SQL editor. The SQLite stand-in creates the same
+-- tables itself (app/services/history_service.py).
+
+-- Raw records, bulk-inserted by the history writer
+create table if not exists diagnosis_history (
+    id bigint generated always as identity primary key,
+    image_hash text,
+    label text,
+    model_used text,
+    confidence real,
+    severity real,
+    lat double precision,
+    lon double precision,
+    geohash text,                       -- precision 7, null without a location
+    commodity text,
+    impact_pct real,
+    loss_per_unit real,
+    created_at timestamptz not null
+);
+create index if not exists diagnosis_history_created_at on diagnosis_history (created_at);
+alter table diagnosis_history add column if not exists geohash text;
+
+-- Outbreak aggregates: one row per (geohash cell, UTC day, label) at two cell
+-- sizes (6 chars ~1.2 km for radius queries, 4 chars ~39 km for zoomed-out
+-- heatmaps), maintained by the statement trigger below in the same
+-- transaction as the insert.
+--
+-- The cell sizes must equal OUTBREAK_CELL_PRECISION / OUTBREAK_COARSE_PRECISION
+-- in app/core/config.py. They are defined once, in outbreak_precisions(); the
+-- history writer reads it at startup and refuses to write (spilling to disk
+-- instead) when it disagrees. After changing them, re-run this file and
+-- truncate and rebuild both aggregate tables from diagnosis_history.
+create or replace function outbreak_precisions(out cell integer, out coarse integer)
+language sql immutable as $$ select 6, 4 $$;
+
+-- cell is compared as a byte string ("C" collation): the read side turns each
+-- prefix p into the primary-key range [p, p || '~'), which only holds when
+-- '~' sorts after every geohash character
+create table if not exists diagnosis_outbreak_daily (
+    cell text collate "C" not null,
+    day date not null,
+    label text not null,
+    cases integer not null default 0,
+    severity_sum double precision not null default 0,
+    loss_sum double precision not null default 0,
+    primary key (cell, day, label)
+);
+create table if not exists diagnosis_outbreak_daily_coarse (like diagnosis_outbreak_daily including all);
+alter table diagnosis_outbreak_daily alter column cell type text collate "C";
+alter table diagnosis_outbreak_daily_coarse alter column cell type text collate "C";
+
+create or replace function diagnosis_outbreak_add() returns trigger language plpgsql as $$
+declare
+    p record;
+begin
+    select * into p from outbreak_precisions();
+    insert into diagnosis_outbreak_daily as o (cell, day, label, cases, severity_sum, loss_sum)
+    select left(geohash, p.cell), (created_at at time zone 'utc')::date, label,
+           count(*), coalesce(sum(severity), 0), coalesce(sum(loss_per_unit), 0)
+    from new_rows
+    where geohash is not null
+    group by 1, 2, 3
+    on conflict (cell, day, label) do update set
+        cases = o.cases + excluded.cases,
+        severity_sum = o.severity_sum + excluded.severity_sum,
+        loss_sum = o.loss_sum + excluded.loss_sum;
+
+    insert into diagnosis_outbreak_daily_coarse as o (cell, day, label, cases, severity_sum, loss_sum)
+    select left(geohash, p.coarse), (created_at at time zone 'utc')::date, label,
+           count(*), coalesce(sum(severity), 0), coalesce(sum(loss_per_unit), 0)
+    from new_rows
+    where geohash is not null
+    group by 1, 2, 3
+    on conflict (cell, day, label) do update set
+        cases = o.cases + excluded.cases,
+        severity_sum = o.severity_sum + excluded.severity_sum,
+        loss_sum = o.loss_sum + excluded.loss_sum;
+    return null;
+end $$;
+
+drop trigger if exists diagnosis_outbreak_add on diagnosis_history;
+create trigger diagnosis_outbreak_add after insert on diagnosis_history
+    referencing new table as new_rows
+    for each statement execute function diagnosis_outbreak_add();
+
+-- Read side for /api/outbreaks: per-cell totals under a set of geohash prefixes.
+-- Joining the prefixes as [p, p || '~') ranges gets one primary-key range
+-- scan per prefix; a starts-with operator (^@) cannot use the btree.
+create or replace function outbreak_cells(prefixes text[], since date, coarse boolean default false)
+returns table (cell text, label text, cases bigint, severity_sum double precision, loss_sum double precision)
+language sql stable as $$
+    select o.cell, o.label, sum(o.cases), sum(o.severity_sum), sum(o.loss_sum)
+    from unnest(prefixes) as p(prefix)
+    join diagnosis_outbreak_daily o on o.cell >= p.prefix and o.cell < p.prefix || '~'
+    where not coarse and o.day >= since
+    group by o.cell, o.label
+    union all
+    select o.cell, o.label, sum(o.cases), sum(o.severity_sum), sum(o.loss_sum)
+    from unnest(prefixes) as p(prefix)
+    join diagnosis_outbreak_daily_coarse o on o.cell >= p.prefix and o.cell < p.prefix || '~'
+    where coarse and o.day >= since
+    group by o.cell, o.label
+$$;
@@ -10,13 +10,14 @@ const MAX_FOLLOWUPS = 2;
  * and supports up to 2 follow-up questions.
  * Also renders Jugaad (traditional) remedies dynamically.
  */
-export default function AiAdvisory({ disease, confidence, severity, jugaadRemedies }) {
+export default function AiAdvisory({ disease, confidence, severity, modelKey, jugaadRemedies }) {
     const [advisory, setAdvisory] = useState(null);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState(null);
     const [lang, setLang] = useState("english");
 
     // Follow-up chat state
+    const [sessionId, setSessionId] = useState(null);
     const [chatHistory, setChatHistory] = useState([]);
     const [followUps, setFollowUps] = useState([]);
     const [followUpCount, setFollowUpCount] = useState(0);
@@ -30,14 +31,17 @@ export default function AiAdvisory({ disease, confidence, severity, jugaadRemedi
         setLoading(true);
         setError(null);
 
-        fetchAdvisory(disease, confidence, severity)
+        fetchAdvisory(disease, confidence, severity, modelKey)
             .then((data) => {
                 if (!cancelled) {
                     setAdvisory(data);
-                    // Seed chat history with the initial prompt/response for follow-ups
+                    // Chat history lives server-side; the local copy is only sent if the
+                    // session is gone (another worker, restart or expiry)
+                    const { session_id, ...reply } = data;
+                    setSessionId(session_id);
                     setChatHistory([
                         { role: "user", content: `Disease: ${disease}, Confidence: ${(confidence * 100).toFixed(1)}%, Severity: ${severity.toFixed(1)}%` },
-                        { role: "model", content: JSON.stringify(data) },
+                        { role: "model", content: JSON.stringify(reply) },
                     ]);
                 }
             })
@@ -45,7 +49,7 @@ export default function AiAdvisory({ disease, confidence, severity, jugaadRemedi
             .finally(() => { if (!cancelled) setLoading(false); });
 
         return () => { cancelled = true; };
-    }, [disease, confidence, severity]);
+    }, [disease, confidence, severity, modelKey]);
 
     // Scroll to bottom when new follow-up arrives
     useEffect(() => {
@@ -64,15 +68,13 @@ export default function AiAdvisory({ disease, confidence, severity, jugaadRemedi
         setFollowUps((prev) => [...prev, { role: "user", content: q }]);
 
         try {
-            const result = await sendFollowUp(chatHistory, q);
+            const result = await sendFollowUp(sessionId, chatHistory, q);
 
-            // Update history for future follow-ups
             setChatHistory((prev) => [
                 ...prev,
                 { role: "user", content: q },
                 { role: "model", content: JSON.stringify(result) },
             ]);
-
             setFollowUps((prev) => [...prev, { role: "model", content: result }]);
             setFollowUpCount((c) => c + 1);
         } catch (err) {
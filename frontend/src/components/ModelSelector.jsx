@@ -1,6 +1,7 @@
 import { useState } from "react";
 
 const MODELS = [
+    { value: "auto", label: "Auto", hindi: "स्वचालित", tip: "Detects the crop for you" },
     { value: "general", label: "General", hindi: "सामान्य", tip: "Other plants" },
     { value: "soybean", label: "Soybean", hindi: "सोयाबीन", tip: "ResNet specialist" },
     { value: "wheat", label: "Wheat", hindi: "गेहूं", tip: "EfficientNet specialist" },
@@ -16,7 +17,7 @@ export default function ModelSelector({ value, onChange, disabled }) {
             <label className="block text-cream font-medium mb-3 ml-1 text-sm tracking-wide">
                 Select your crop type / अपनी फसल चुनें:
             </label>
-            <div className="grid grid-cols-2 sm:grid-cols-4 gap-3">
+            <div className="grid grid-cols-2 sm:grid-cols-5 gap-3">
                 {MODELS.map((m) => {
                     const isSelected = m.value === value;
                     return (
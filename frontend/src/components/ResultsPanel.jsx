@@ -147,6 +147,7 @@ export default function ResultsPanel({ result, loading, error, onRetry, preview,
                     disease={result.disease}
                     confidence={result.confidence}
                     severity={severity}
+                    modelKey={result.model_used}
                     jugaadRemedies={result.jugaad_remedies}
                 />
             )}
@@ -31,6 +31,13 @@ export async function predictDisease(file, modelKey = "general", lat = null, lon
         xhr.addEventListener("load", () => {
             if (xhr.status >= 200 && xhr.status < 300) {
                 resolve(JSON.parse(xhr.responseText));
+                return;
+            }
+            // 422 with status "retake_photo": the image quality gate explains what to fix
+            let body = null;
+            try { body = JSON.parse(xhr.responseText); } catch { /* not JSON */ }
+            if (body && body.status === "retake_photo") {
+                reject(new Error(body.english.message));
             } else {
                 reject(new Error(`Server error: ${xhr.status}`));
             }
@@ -50,22 +57,31 @@ export async function fetchRemedy(diseaseClass) {
     return res.json();
 }
 
-export async function fetchAdvisory(disease, confidence, severity) {
+export async function fetchAdvisory(disease, confidence, severity, modelKey = "general") {
     const res = await fetch(`${BASE}/chat/advisory`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ disease, confidence, severity }),
+        body: JSON.stringify({ disease, confidence, severity, model_key: modelKey }),
     });
     if (!res.ok) throw new Error(`Advisory failed: ${res.status}`);
     return res.json();
 }
 
-export async function sendFollowUp(history, question) {
-    const res = await fetch(`${BASE}/chat/followup`, {
+async function postFollowUp(payload) {
+    return fetch(`${BASE}/chat/followup`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ history, question }),
+        body: JSON.stringify(payload),
     });
+}
+
+export async function sendFollowUp(sessionId, history, question) {
+    let res = sessionId ? await postFollowUp({ session_id: sessionId, question }) : null;
+    // Sessions are per worker unless CHAT_SESSION_BACKEND is shared; fall back
+    // to sending the conversation when this one is unknown
+    if (!res || res.status === 404) {
+        res = await postFollowUp({ history, question });
+    }
     if (res.status === 429) {
         const data = await res.json();
         throw new Error(data.detail || "Follow-up limit reached.");